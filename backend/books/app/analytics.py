@@ -0,0 +1,273 @@
+"""
+This module maintains the circulation rollups of the books service and answers analytics queries from them.
+
+Aggregating ``transactions`` for every report would cost time proportional to the whole rental
+history. Instead, ``book_daily_stats`` holds one row per book and UTC day with the rentals,
+returns and total loan duration of that day. Renting and returning upsert the matching rows in
+the same database transaction as the inventory change, so the rollups are always in step with
+the transactions. Reports then read at most one row per book and day of their window, however
+many transactions led to them.
+
+The rollups can be rebuilt from the full history, for instance after upgrading a database that
+already holds transactions, while the service keeps running:
+
+    python -m app.analytics
+"""
+
+import argparse
+import asyncio
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import BigInteger, Date, cast, delete, func, literal, literal_column, or_, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from . import models
+from .database import AsyncSessionLocal
+
+ROLLUP_COUNTERS = ("rentals", "returns", "loan_seconds")
+ROLLUP_COLUMNS = ["book_id", "day", *ROLLUP_COUNTERS]
+REBUILD_BATCH_SIZE = 1000
+
+def stat_day(timestamp):
+    """
+    Get the UTC day a timestamp is counted on.
+
+    Args:
+        timestamp (datetime): The timestamp. Naive timestamps are taken to be in UTC.
+
+    Returns:
+        date: The day.
+    """
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.date()
+
+def window_start(days):
+    """
+    Get the first day of a window that ends today.
+
+    Args:
+        days (int): The length of the window, in days, today included.
+
+    Returns:
+        date: The first day of the window.
+    """
+    return datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+
+def stats_upsert_statement(dialect_name):
+    """
+    Build an INSERT statement for rollup rows that adds to the counters of existing rows.
+
+    Args:
+        dialect_name (str): The name of the database dialect the statement will run on.
+
+    Returns:
+        Insert: The upsert statement, to be executed with a list of parameter sets holding every counter.
+    """
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    stats = models.BookDailyStats
+    stmt = dialect_insert(stats)
+    return stmt.on_conflict_do_update(
+        index_elements=[stats.book_id, stats.day],
+        set_={counter: getattr(stats, counter) + stmt.excluded[counter] for counter in ROLLUP_COUNTERS},
+    )
+
+async def _add_to_rollups(db, counts):
+    if not counts:
+        return
+    rows = [
+        {"book_id": book_id, "day": day, **{counter: values.get(counter, 0) for counter in ROLLUP_COUNTERS}}
+        for (book_id, day), values in sorted(counts.items())
+    ]
+    await db.execute(stats_upsert_statement(db.bind.dialect.name), rows)
+
+async def record_rentals(db, transactions):
+    """
+    Count new rentals in the rollups.
+
+    Args:
+        db (AsyncSession): The database session holding the uncommitted rentals.
+        transactions (iterable[models.Transaction]): The created transactions.
+    """
+    counts = defaultdict(lambda: defaultdict(int))
+    for transaction in transactions:
+        if transaction.book_id is not None:
+            counts[transaction.book_id, stat_day(transaction.rented_at)]["rentals"] += 1
+    await _add_to_rollups(db, counts)
+
+async def record_returns(db, transactions):
+    """
+    Count returns and the duration of the loans they end in the rollups.
+
+    Args:
+        db (AsyncSession): The database session holding the uncommitted returns.
+        transactions (iterable[models.Transaction]): The closed transactions.
+    """
+    counts = defaultdict(lambda: defaultdict(int))
+    for transaction in transactions:
+        if transaction.book_id is not None:
+            values = counts[transaction.book_id, stat_day(transaction.returned_at)]
+            values["returns"] += 1
+            values["loan_seconds"] += max(0, round((transaction.returned_at - transaction.rented_at).total_seconds()))
+    await _add_to_rollups(db, counts)
+
+async def top_books(db, days, limit):
+    """
+    Get the most rented books of a window.
+
+    Args:
+        db (AsyncSession): The database session.
+        days (int): The length of the window, in days, today included.
+        limit (int): The maximum number of books to return.
+
+    Returns:
+        list[dict]: The books and their rental counts, most rented first.
+    """
+    stats = models.BookDailyStats
+    rentals = func.sum(stats.rentals)
+    result = await db.execute(
+        select(stats.book_id, models.Book.title, models.Book.author, rentals.label("rentals"))
+        .join(models.Book, models.Book.id == stats.book_id)
+        .where(stats.day >= window_start(days))
+        .group_by(stats.book_id, models.Book.title, models.Book.author)
+        .having(rentals > 0)
+        .order_by(rentals.desc(), stats.book_id)
+        .limit(limit)
+    )
+    return [row._asdict() for row in result.all()]
+
+async def daily_circulation(db, days, book_id=None):
+    """
+    Get the rentals and returns of every day of a window.
+
+    Args:
+        db (AsyncSession): The database session.
+        days (int): The length of the window, in days, today included.
+        book_id (int): Only count this book, if given.
+
+    Returns:
+        list[dict]: One entry per day, oldest first, including days without any activity.
+    """
+    stats = models.BookDailyStats
+    start = window_start(days)
+    query = (
+        select(stats.day, func.sum(stats.rentals), func.sum(stats.returns))
+        .where(stats.day >= start)
+        .group_by(stats.day)
+    )
+    if book_id is not None:
+        query = query.where(stats.book_id == book_id)
+    totals = {day: (rentals, returns) for day, rentals, returns in (await db.execute(query)).all()}
+    circulation = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        rentals, returns = totals.get(day, (0, 0))
+        circulation.append({"day": day, "rentals": rentals, "returns": returns})
+    return circulation
+
+async def loan_duration(db, days, book_id=None):
+    """
+    Get the average duration of the loans that ended in a window.
+
+    Args:
+        db (AsyncSession): The database session.
+        days (int): The length of the window, in days, today included.
+        book_id (int): Only count this book, if given.
+
+    Returns:
+        dict: The number of returns and the average loan duration in seconds.
+    """
+    stats = models.BookDailyStats
+    query = select(
+        func.coalesce(func.sum(stats.returns), 0), func.coalesce(func.sum(stats.loan_seconds), 0)
+    ).where(stats.day >= window_start(days))
+    if book_id is not None:
+        query = query.where(stats.book_id == book_id)
+    returns, loan_seconds = (await db.execute(query)).one()
+    return {"returns": returns, "average_seconds": float(loan_seconds) / returns if returns else None}
+
+def _utc_day(column, dialect_name):
+    if dialect_name == "postgresql":
+        # A literal rather than a bound parameter, so that the expression can be grouped by.
+        return cast(func.timezone(literal_column("'UTC'"), column), Date)
+    return func.date(column)
+
+def _seconds_between(start, end, dialect_name):
+    if dialect_name == "postgresql":
+        return func.extract("epoch", end - start)
+    return (func.julianday(end) - func.julianday(start)) * 86400
+
+def _corrections(book_ids, dialect_name):
+    transactions = models.Transaction
+    stats = models.BookDailyStats
+    in_batch = transactions.book_id.between(*book_ids)
+    rented_day = _utc_day(transactions.rented_at, dialect_name)
+    returned_day = _utc_day(transactions.returned_at, dialect_name)
+    # Each loan is rounded to whole seconds, as when it is counted incrementally.
+    loan_seconds = func.sum(func.round(_seconds_between(transactions.rented_at, transactions.returned_at, dialect_name)))
+    counts = union_all(
+        select(transactions.book_id, rented_day.label("day"), func.count().label("rentals"), literal(0).label("returns"), literal(0).label("loan_seconds"))
+        .where(in_batch)
+        .group_by(transactions.book_id, rented_day),
+        select(transactions.book_id, returned_day, literal(0), func.count(), cast(loan_seconds, BigInteger))
+        .where(in_batch, transactions.returned_at.is_not(None))
+        .group_by(transactions.book_id, returned_day),
+        select(stats.book_id, stats.day, -stats.rentals, -stats.returns, -stats.loan_seconds)
+        .where(stats.book_id.between(*book_ids)),
+    ).subquery()
+    sums = [cast(func.sum(counts.c[counter]), BigInteger) for counter in ROLLUP_COUNTERS]
+    return (
+        select(counts.c.book_id, counts.c.day, *sums)
+        .group_by(counts.c.book_id, counts.c.day)
+        .having(or_(*(total != 0 for total in sums)))
+    )
+
+async def rebuild_rollups(db, batch_size=REBUILD_BATCH_SIZE):
+    """
+    Bring the rollups in line with the full transaction history, committing one range of books at a time.
+
+    Rollup rows are not overwritten. For each range of books, one statement computes the
+    difference between the counts of the transactions and the rollups as of its snapshot, and
+    adds it to the rows as rentals and returns do. Rentals and returns committed meanwhile add
+    their own counts to the same rows, so they are counted exactly once without locking the
+    rollups, and each range only holds the row locks of the rows it corrects until it commits.
+
+    Args:
+        db (AsyncSession): The database session.
+        batch_size (int): The number of book IDs covered by each statement.
+
+    Returns:
+        int: The number of rollup rows corrected.
+    """
+    dialect_name = db.bind.dialect.name
+    stats = models.BookDailyStats
+    last_book_id = max(
+        await db.scalar(select(func.coalesce(func.max(models.Transaction.book_id), 0))),
+        await db.scalar(select(func.coalesce(func.max(stats.book_id), 0))),
+    )
+    corrected = 0
+    for first in range(1, last_book_id + 1, batch_size):
+        book_ids = (first, first + batch_size - 1)
+        result = await db.execute(
+            stats_upsert_statement(dialect_name).from_select(ROLLUP_COLUMNS, _corrections(book_ids, dialect_name))
+        )
+        corrected += result.rowcount
+        # Rows whose activity was all corrected away are dropped; a concurrent upsert recreates them.
+        await db.execute(
+            delete(stats).where(stats.book_id.between(*book_ids), *(getattr(stats, counter) == 0 for counter in ROLLUP_COUNTERS))
+        )
+        await db.commit()
+    return corrected
+
+async def rebuild():
+    async with AsyncSessionLocal() as db:
+        return await rebuild_rollups(db)
+
+def main(argv=None):
+    argparse.ArgumentParser(description="Rebuild the circulation rollups from the full transaction history.").parse_args(argv)
+    rows = asyncio.run(rebuild())
+    print(f"corrected {rows} rollup rows")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
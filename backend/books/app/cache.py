@@ -0,0 +1,351 @@
+"""
+This module provides a read-through cache of catalog reads for the books service.
+
+``CatalogCache`` keeps the serialized results of ``read_book`` and ``read_books`` so that hot
+titles and the first catalog pages are not queried again on every request. Entries live in a
+pluggable key-value backend: an in-process LRU by default, or Redis so that every worker shares
+entries and invalidations. ``FakeRedisClient`` mimics the subset of the Redis client the cache
+uses and can stand in for a server locally, for example in tests.
+
+Writes invalidate what they change: a book's detail entry is deleted, and list pages are
+invalidated together by bumping a generation number that is part of their keys. When several
+requests miss on the same key at once, only the first one queries the database and the others
+wait for its result. If that request is cancelled, one of the waiting requests runs the load
+again in its place.
+
+Entries are only filled from the primary, never from a replica that may lag behind a write
+that was just invalidated. Every invalidation also bumps a counter kept in the backend, so that
+a load that raced with a write in any worker is not stored, or is dropped right after.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from pydantic import TypeAdapter
+from . import schemas
+
+BOOK_ADAPTER = TypeAdapter(schemas.Book)
+BOOK_LIST_ADAPTER = TypeAdapter(list[schemas.Book])
+
+class InMemoryCache:
+    """
+    A thread-safe, bounded, in-process key-value store with per-entry expiry and LRU eviction.
+
+    Counters written with ``incr`` are kept apart from the entries and are never evicted.
+
+    Args:
+        maxsize (int): The maximum number of entries to keep.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl if ttl is not None else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._counters.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+class FakeRedisClient:
+    """
+    An in-process stand-in for the Redis client methods used by ``RedisCache``.
+
+    Values are stored as bytes and expire like Redis keys set with ``ex``.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is not None and time.monotonic() >= entry[0]:
+            del self._entries[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return entry[1] if entry is not None else None
+
+    def set(self, key, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode()
+        elif isinstance(value, int):
+            value = str(value).encode()
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ex if ex is not None else None, value)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._entries.pop(key, None) is not None for key in keys)
+
+    def incr(self, key):
+        with self._lock:
+            entry = self._live(key)
+            value = int(entry[1]) + 1 if entry is not None else 1
+            self._entries[key] = (entry[0] if entry is not None else None, str(value).encode())
+            return value
+
+class RedisCache:
+    """
+    A key-value store backed by a Redis server, shared by every worker that connects to it.
+
+    Args:
+        url (str): The Redis connection URL, e.g. ``redis://cache:6379/0``. Ignored if ``client`` is given.
+        prefix (str): A prefix for all keys written by this service.
+        client: An existing Redis client, or a ``FakeRedisClient``.
+    """
+
+    def __init__(self, url=None, prefix="books:", client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError as exc:
+                raise RuntimeError("The redis package is required for the redis cache backend") from exc
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode() if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)) if ttl is not None else None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+class CatalogCache:
+    """
+    Caches book details and list pages on top of a key-value backend.
+
+    Args:
+        backend: The key-value store, or None to disable caching.
+        ttl (float): The number of seconds an entry may be served from the cache.
+        primary_session (callable): Given the request's session, returns an async context manager
+            yielding a session on the primary, which loads that fill the cache go through.
+            Loads use the request's session if it is not given.
+    """
+
+    def __init__(self, backend, ttl=30, primary_session=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.primary_session = primary_session
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._loading = {}
+
+    def _generation(self, name):
+        return int(self.backend.get(f"generation:{name}") or 0)
+
+    def _invalidations(self):
+        # Shared by every worker using the backend, unlike a counter kept in this process.
+        return int(self.backend.get("invalidations") or 0)
+
+    async def _fetch(self, loader, session):
+        if self.primary_session is None:
+            return await loader(session)
+        async with self.primary_session(session) as primary:
+            return await loader(primary)
+
+    def book_key(self, book_id):
+        """
+        Build the cache key of a book's details.
+
+        Args:
+            book_id (int): The ID of the book.
+
+        Returns:
+            str: The cache key, or None if caching is disabled.
+        """
+        if self.backend is None:
+            return None
+        return f"book:{self._generation('books')}:{book_id}"
+
+    def page_key(self, skip, limit, cursor):
+        """
+        Build the cache key of a page of books.
+
+        Args:
+            skip (int): The number of books skipped.
+            limit (int): The page size.
+            cursor (str): The keyset cursor, if any.
+
+        Returns:
+            str: The cache key, or None if caching is disabled.
+        """
+        if self.backend is None:
+            return None
+        return f"books:{self._generation('pages')}:{skip}:{limit}:{cursor or ''}"
+
+    def get(self, key, adapter):
+        """
+        Look up a cached value.
+
+        Args:
+            key (str): The cache key, or None if caching is disabled.
+            adapter (TypeAdapter): The adapter that decodes the stored value.
+
+        Returns:
+            The cached value, or None on a miss.
+        """
+        if key is None:
+            return None
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return adapter.validate_json(value)
+
+    async def load(self, key, adapter, loader, session):
+        """
+        Load a value from the database and cache it, sharing the load with concurrent callers.
+
+        Args:
+            key (str): The cache key, or None if caching is disabled.
+            adapter (TypeAdapter): The adapter that validates the loaded rows and encodes them.
+            loader (callable): A coroutine function that queries the database through the session it is given.
+            session (AsyncSession): The request's session. With caching enabled, loads go to the primary instead.
+
+        Returns:
+            The loaded value validated by ``adapter``, or None if the loader found nothing.
+        """
+        if key is None:
+            rows = await loader(session)
+            return adapter.validate_python(rows, from_attributes=True) if rows is not None else None
+        pending = self._loading.get(key)
+        while pending is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # The request running the load was cancelled, not this one: take the load over.
+                if not pending.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            pending = self._loading.get(key)
+
+        pending = asyncio.get_running_loop().create_future()
+        self._loading[key] = pending
+        invalidations = self._invalidations()
+        try:
+            rows = await self._fetch(loader, session)
+            value = adapter.validate_python(rows, from_attributes=True) if rows is not None else None
+            if value is not None and invalidations == self._invalidations():
+                self.backend.set(key, adapter.dump_json(value), self.ttl)
+                # A write that invalidated between the check and the store may have missed the
+                # entry; writers bump the counter before deleting, so checking again catches it.
+                if invalidations != self._invalidations():
+                    self.backend.delete(key)
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as exc:
+            pending.set_exception(exc)
+            # Mark the exception as retrieved in case no other caller was waiting for it.
+            pending.exception()
+            raise
+        else:
+            pending.set_result(value)
+            return value
+        finally:
+            del self._loading[key]
+
+    def invalidate_books(self, *book_ids):
+        """
+        Drop the cached details of the given books and every cached list page.
+
+        Args:
+            *book_ids (int): The IDs of the books that changed.
+        """
+        if self.backend is None:
+            return
+        self.backend.incr("invalidations")
+        for book_id in set(book_ids):
+            self.backend.delete(self.book_key(book_id))
+        self.backend.incr("generation:pages")
+
+    def invalidate_all(self):
+        """
+        Drop every cached book and list page, for writes that may change any book.
+        """
+        if self.backend is None:
+            return
+        self.backend.incr("invalidations")
+        self.backend.incr("generation:books")
+        self.backend.incr("generation:pages")
+
+    def stats(self):
+        """
+        Report the cache's counters.
+
+        Returns:
+            dict: The hit, miss and coalesced-miss counts since the process started.
+        """
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced}
+
+def create_catalog_cache(primary_session=None):
+    """
+    Build the catalog cache configured by the environment.
+
+    ``BOOK_CACHE_BACKEND`` selects ``memory`` (the default), ``redis`` (using ``BOOK_CACHE_URL``),
+    ``fake-redis`` or ``none``. ``BOOK_CACHE_TTL`` sets the entry lifetime in seconds and
+    ``BOOK_CACHE_SIZE`` bounds the in-process store.
+
+    Args:
+        primary_session (callable): Opens a session on the primary for loads that fill the cache.
+
+    Returns:
+        CatalogCache: The configured cache.
+    """
+    kind = os.getenv("BOOK_CACHE_BACKEND", "memory").lower()
+    ttl = float(os.getenv("BOOK_CACHE_TTL", "30"))
+    if kind == "none":
+        backend = None
+    elif kind == "redis":
+        backend = RedisCache(os.getenv("BOOK_CACHE_URL", "redis://localhost:6379/0"))
+    elif kind == "fake-redis":
+        backend = RedisCache(client=FakeRedisClient())
+    elif kind == "memory":
+        backend = InMemoryCache(maxsize=int(os.getenv("BOOK_CACHE_SIZE", "10000")))
+    else:
+        raise ValueError(f"Unknown BOOK_CACHE_BACKEND: {kind}")
+    return CatalogCache(backend, ttl=ttl, primary_session=primary_session)
@@ -0,0 +1,267 @@
+"""
+This module maintains the catalog change log of the books service and reads it back as a feed.
+
+Every write to a book appends a row to the append-only ``book_changes`` table in the same
+database transaction, recording the book's ID, whether it was upserted or deleted, and its
+inventory count after the change. Clients keep the ID of the last change they have seen, as an
+opaque cursor, and ask only for the changes after it instead of downloading the catalog again.
+
+Concurrent writers do not commit in the order of their change IDs, so a reader must never move
+its cursor past a change that a transaction still in progress may commit later. On Postgres,
+each entry records the ID of the transaction that wrote it, cursors are (transaction ID, change
+ID) pairs, and readers only return entries written by transactions older than the oldest one
+still running, ``pg_snapshot_xmin(pg_current_snapshot())``. Those transactions have all ended,
+and any entry that becomes visible later belongs to a newer transaction, which sorts after every
+cursor already handed out. Writers are not serialized; a long-running writer only holds back
+the feed until it ends. SQLite serializes writers, so there entries are read in ID order.
+
+Writers also wake the ``change_notifier`` of their process after committing, which lets change
+streams served by that process push new changes without polling the database.
+"""
+
+import asyncio
+import json
+from sqlalchemy import BigInteger, Text, cast, func, insert, literal, select, tuple_
+from . import models
+from .pagination import decode_cursor, encode_cursor
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+STREAM_BATCH_SIZE = 500
+STREAM_HEARTBEAT_SECONDS = 15
+
+def _transaction_id(db):
+    # xid8 has no direct cast to bigint, but its text form is a plain integer.
+    if db.bind.dialect.name == "postgresql":
+        return cast(cast(func.pg_current_xact_id(), Text), BigInteger)
+    return literal(0)
+
+def _visible(query, db):
+    # Keep only the entries of transactions older than every one still running.
+    if db.bind.dialect.name != "postgresql":
+        return query
+    watermark = cast(cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text), BigInteger)
+    return query.where(models.BookChange.txid < watermark)
+
+def change_cursor(entry):
+    """
+    Build the cursor that points at a change log entry.
+
+    Args:
+        entry (models.BookChange): The log entry.
+
+    Returns:
+        str: The cursor.
+    """
+    return encode_cursor(entry.id, entry.txid)
+
+def decode_change_cursor(cursor):
+    """
+    Decode a change feed cursor.
+
+    Args:
+        cursor (str): The cursor.
+
+    Returns:
+        tuple[int, int]: The transaction ID and change ID of the last entry already seen.
+
+    Raises:
+        HTTPException: If the cursor is malformed.
+    """
+    return decode_cursor(cursor, key_type=int)
+
+async def record_upserts(db, book_ids):
+    """
+    Log that books were created or updated, with their current inventory counts.
+
+    Call this as the last statement before committing the transaction that changed the books.
+
+    Args:
+        db (AsyncSession): The database session holding the uncommitted changes.
+        book_ids (iterable[int]): The IDs of the changed books.
+    """
+    book_ids = list(set(book_ids))
+    if not book_ids:
+        return
+    await db.execute(
+        insert(models.BookChange).from_select(
+            ["book_id", "operation", "inventory_count", "txid"],
+            select(models.Book.id, literal(UPSERT), models.Book.inventory_count, _transaction_id(db))
+            .where(models.Book.id.in_(book_ids))
+            .order_by(models.Book.id),
+        )
+    )
+
+async def record_deletions(db, book_ids):
+    """
+    Log that books were deleted.
+
+    Call this as the last statement before committing the transaction that deleted the books.
+
+    Args:
+        db (AsyncSession): The database session holding the uncommitted deletions.
+        book_ids (iterable[int]): The IDs of the deleted books.
+    """
+    book_ids = sorted(set(book_ids))
+    if not book_ids:
+        return
+    await db.execute(
+        insert(models.BookChange).values(txid=_transaction_id(db)),
+        [{"book_id": book_id, "operation": DELETE, "inventory_count": None} for book_id in book_ids],
+    )
+
+async def latest_cursor(db):
+    """
+    Get the cursor that points at the newest change readers may see.
+
+    Args:
+        db (AsyncSession): The database session.
+
+    Returns:
+        str: The cursor.
+    """
+    newest = await db.scalar(_visible(
+        select(models.BookChange).order_by(models.BookChange.txid.desc(), models.BookChange.id.desc()).limit(1), db
+    ))
+    return change_cursor(newest) if newest is not None else encode_cursor(0, 0)
+
+async def read_changes(db, since, limit):
+    """
+    Read the changes logged after a cursor.
+
+    Args:
+        db (AsyncSession): The database session.
+        since (str): The cursor of the last change already seen.
+        limit (int): The maximum number of log entries to read.
+
+    Returns:
+        list[models.BookChange]: The log entries after the cursor, in order.
+    """
+    result = await db.scalars(_visible(
+        select(models.BookChange)
+        .where(tuple_(models.BookChange.txid, models.BookChange.id) > tuple_(*decode_change_cursor(since)))
+        .order_by(models.BookChange.txid, models.BookChange.id)
+        .limit(limit),
+        db,
+    ))
+    return result.all()
+
+async def changes_since(db, since, limit):
+    """
+    Summarize what changed in the catalog after a cursor.
+
+    Each changed book is reported once, with its current state: the book itself if it still
+    exists, or a tombstone if it has been deleted.
+
+    Args:
+        db (AsyncSession): The database session.
+        since (str): The cursor of the last change already seen.
+        limit (int): The maximum number of log entries to consume.
+
+    Returns:
+        dict: The changes, the cursor to pass next time and whether more changes are waiting.
+    """
+    entries = await read_changes(db, since, limit)
+    if not entries:
+        return {"changes": [], "cursor": since, "has_more": False}
+    book_ids = list(dict.fromkeys(entry.book_id for entry in reversed(entries)))
+    result = await db.scalars(select(models.Book).where(models.Book.id.in_(book_ids)))
+    books = {book.id: book for book in result.all()}
+    changes = [
+        {"book_id": book_id, "operation": UPSERT, "book": books[book_id]}
+        if book_id in books else
+        {"book_id": book_id, "operation": DELETE, "book": None}
+        for book_id in reversed(book_ids)
+    ]
+    return {"changes": changes, "cursor": change_cursor(entries[-1]), "has_more": len(entries) >= limit}
+
+class ChangeNotifier:
+    """
+    Wakes the change streams of this process when a write has been committed.
+
+    ``version`` counts notifications, so that a stream that read the log and then waits can
+    tell whether a change was committed in between.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._event = asyncio.Event()
+
+    def notify(self):
+        """
+        Wake every stream currently waiting for changes.
+        """
+        self.version += 1
+        self._event.set()
+        self._event = asyncio.Event()
+
+    async def wait(self, version, timeout):
+        """
+        Wait for a change committed in this process after ``version``, or for the timeout.
+
+        Writes made by other processes are only noticed when the timeout expires, so it bounds
+        how late a stream can report them.
+
+        Args:
+            version (int): The notifier version seen before the log was last read.
+            timeout (float): The longest time to wait, in seconds.
+
+        Returns:
+            bool: True if a change was committed, False on timeout.
+        """
+        if self.version != version:
+            return True
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+change_notifier = ChangeNotifier()
+
+def format_event(entry):
+    """
+    Encode a change log entry as a Server-Sent Event.
+
+    Args:
+        entry (models.BookChange): The log entry.
+
+    Returns:
+        bytes: The event, whose ID is the cursor of the entry.
+    """
+    data = json.dumps(
+        {"book_id": entry.book_id, "operation": entry.operation, "inventory_count": entry.inventory_count},
+        separators=(",", ":"),
+    )
+    return f"id: {change_cursor(entry)}\nevent: {entry.operation}\ndata: {data}\n\n".encode()
+
+async def stream_changes(session_factory, since, heartbeat=STREAM_HEARTBEAT_SECONDS):
+    """
+    Stream change log entries as Server-Sent Events, starting after a cursor.
+
+    The log is read with a short-lived session each time, so an idle stream holds no database
+    connection. A comment line is sent when nothing has changed for ``heartbeat`` seconds,
+    which keeps proxies from closing the connection.
+
+    Args:
+        session_factory (callable): Returns an async context manager yielding the session to read with.
+        since (str): The cursor of the last change already seen.
+        heartbeat (float): The longest time between two messages, in seconds.
+
+    Yields:
+        bytes: The encoded events.
+    """
+    cursor = since
+    while True:
+        version = change_notifier.version
+        async with session_factory() as db:
+            entries = await read_changes(db, cursor, STREAM_BATCH_SIZE)
+        for entry in entries:
+            yield format_event(entry)
+        if entries:
+            cursor = change_cursor(entries[-1])
+        if len(entries) >= STREAM_BATCH_SIZE:
+            continue
+        if not await change_notifier.wait(version, heartbeat):
+            yield b": keep-alive\n\n"
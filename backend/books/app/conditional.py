@@ -0,0 +1,168 @@
+"""
+This module implements conditional GET support (ETag and Last-Modified) for the books service.
+
+Validators are derived from ``modified_at``, which the database refreshes on every change to a
+book. A single book is validated by its ID and ``modified_at``; a page of books by the number of
+rows in the page window, the lowest and highest ID in it and the latest ``modified_at``, which an
+aggregate over the window computes without loading the rows. Clients that send ``If-None-Match``
+or ``If-Modified-Since`` get an empty ``304 Not Modified`` response when nothing has changed.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Response
+from sqlalchemy import func, select
+
+# Tells browsers and service workers to keep responses private and revalidate them before reuse.
+CACHE_CONTROL = "private, no-cache"
+
+def _as_utc(moment):
+    if moment is None:
+        return None
+    if isinstance(moment, str):
+        moment = datetime.fromisoformat(moment)
+    if moment.tzinfo is None:
+        # Naive timestamps are written by the database clock, which is UTC.
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+def make_etag(*parts):
+    """
+    Build a strong entity tag from the values that identify a representation.
+
+    Args:
+        *parts: The values the representation depends on.
+
+    Returns:
+        str: The quoted entity tag.
+    """
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+def book_validators(book_id, modified_at):
+    """
+    Compute the validators of a single book.
+
+    Args:
+        book_id (int): The ID of the book.
+        modified_at (datetime): When the book was last modified.
+
+    Returns:
+        tuple[str, datetime]: The entity tag and last modification time.
+    """
+    last_modified = _as_utc(modified_at)
+    return make_etag("book", book_id, last_modified), last_modified
+
+def page_validators(count, min_id, max_id, modified_at):
+    """
+    Compute the validators of a page of books.
+
+    Args:
+        count (int): The number of books in the page.
+        min_id (int): The lowest book ID in the page.
+        max_id (int): The highest book ID in the page.
+        modified_at (datetime): The latest modification time of the books in the page.
+
+    Returns:
+        tuple[str, datetime]: The entity tag and last modification time.
+    """
+    last_modified = _as_utc(modified_at)
+    return make_etag("books", count, min_id, max_id, last_modified), last_modified
+
+def rows_page_validators(rows):
+    """
+    Compute the validators of a page of books that has already been loaded.
+
+    Args:
+        rows (list[models.Book]): The books in the page.
+
+    Returns:
+        tuple[str, datetime]: The entity tag and last modification time.
+    """
+    if not rows:
+        return page_validators(0, None, None, None)
+    return page_validators(
+        len(rows),
+        min(row.id for row in rows),
+        max(row.id for row in rows),
+        max(_as_utc(row.modified_at) for row in rows),
+    )
+
+def page_validator_query(page):
+    """
+    Build a query that aggregates the validators of a page without loading its rows.
+
+    Args:
+        page (Select): The paginated select statement, selecting ``id`` and ``modified_at`` columns.
+
+    Returns:
+        Select: A statement returning the page's row count, lowest and highest ID and latest ``modified_at``.
+    """
+    window = page.subquery()
+    return select(func.count(), func.min(window.c.id), func.max(window.c.id), func.max(window.c.modified_at))
+
+def is_conditional(request):
+    """
+    Check whether a request carries conditional GET headers.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        bool: True if the request sends ``If-None-Match`` or ``If-Modified-Since``.
+    """
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+def _etag_matches(header, etag):
+    if header.strip() == "*":
+        return True
+    # GET uses the weak comparison, so a W/ prefix on either side does not prevent a match.
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+def is_not_modified(request, etag, last_modified):
+    """
+    Evaluate a request's conditional headers against a representation's validators.
+
+    ``If-None-Match`` takes precedence; ``If-Modified-Since`` is only considered without it.
+
+    Args:
+        request (Request): The incoming request.
+        etag (str): The current entity tag.
+        last_modified (datetime): The current last modification time, if known.
+
+    Returns:
+        bool: True if the client's copy is still current.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = _as_utc(parsedate_to_datetime(if_modified_since))
+    except (TypeError, ValueError):
+        return False
+    return last_modified.replace(microsecond=0) <= since
+
+def conditional_response(request, response, etag, last_modified):
+    """
+    Add validators to a response and answer the request with 304 if the client's copy is current.
+
+    Args:
+        request (Request): The incoming request.
+        response (Response): The outgoing response, which receives the validator headers.
+        etag (str): The current entity tag.
+        last_modified (datetime): The current last modification time, if known.
+
+    Returns:
+        Response: A ``304 Not Modified`` response, or None if the full representation must be sent.
+    """
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    response.headers.update(headers)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return None
@@ -2,25 +2,214 @@
 This module sets up the database connection and session management for the books service.
 
 It uses SQLAlchemy to create a database engine, session factory, and a base class for declarative models.
-The database URL is loaded from environment variables for security.
+The request handlers use an asyncio engine so that database round trips do not block the event loop,
+while the synchronous engine is kept for schema creation and command-line tooling.
+The database URL and connection pool settings are loaded from environment variables.
+
+Read-only endpoints can be served by replicas listed in ``DATABASE_READ_URL`` (comma-separated).
+``get_read_db`` picks a replica in turn, skips replicas it recently failed to connect to and falls
+back to the primary when none is reachable. For ``READ_YOUR_WRITES_SECONDS`` after a user commits
+a write, their reads go to the primary so that they see their own changes despite replication lag.
+Pins are kept per process.
+
+With ``TRANSACTIONS_PARTITIONED`` enabled on Postgres, the transactions table is created as a
+table partitioned by month of ``rented_at``; see ``app.partitions``. The setting only applies to
+new databases, since an existing table cannot be turned into a partitioned one in place.
 """
 
+import itertools
 import os
+import threading
+import time
+from contextlib import asynccontextmanager
+import jwt
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from .pool import InstrumentedAsyncAdaptedQueuePool, InstrumentedQueuePool, engine_options, instrument_pool
 
 # Load environment variables
 load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Maps synchronous driver URL prefixes to their asyncio counterparts.
+ASYNC_DRIVERS = {
+    "postgresql://": "postgresql+asyncpg://",
+    "postgresql+psycopg2://": "postgresql+asyncpg://",
+    "sqlite://": "sqlite+aiosqlite://",
+}
+
+def to_async_url(url):
+    """
+    Derive an asyncio driver URL from a synchronous database URL.
+
+    Args:
+        url (str): The synchronous database URL.
+
+    Returns:
+        str: The equivalent URL using an asyncio driver, or the URL unchanged
+        if it already names a driver that is not known to be synchronous.
+    """
+    for prefix, async_prefix in ASYNC_DRIVERS.items():
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+SQLALCHEMY_ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(SQLALCHEMY_DATABASE_URL)
+SQLALCHEMY_READ_DATABASE_URLS = [
+    to_async_url(url.strip()) for url in os.getenv("DATABASE_READ_URL", "").split(",") if url.strip()
+]
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+# Declarative partitioning is only available on Postgres.
+TRANSACTIONS_PARTITIONED = (
+    os.getenv("TRANSACTIONS_PARTITIONED", "false").lower() in ("1", "true", "yes")
+    and SQLALCHEMY_DATABASE_URL.startswith("postgresql")
+)
+
+engine = instrument_pool(create_engine(
+    SQLALCHEMY_DATABASE_URL, **engine_options(InstrumentedQueuePool, SQLALCHEMY_DATABASE_URL)
+))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = instrument_pool(create_async_engine(
+    SQLALCHEMY_ASYNC_DATABASE_URL, **engine_options(InstrumentedAsyncAdaptedQueuePool, SQLALCHEMY_ASYNC_DATABASE_URL)
+))
+
+class PrimarySession(Session):
+    """
+    The session class of request sessions on the primary, whose commits pin the writer to the primary.
+    """
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False, sync_session_class=PrimarySession
+)
+
+read_engines = [
+    instrument_pool(create_async_engine(url, **engine_options(InstrumentedAsyncAdaptedQueuePool, url)))
+    for url in SQLALCHEMY_READ_DATABASE_URLS
+]
+ReadSessionLocals = [
+    async_sessionmaker(bind=read_engine, autoflush=False, expire_on_commit=False) for read_engine in read_engines
+]
+
 Base = declarative_base()
 
+class ReadRouter:
+    """
+    Chooses which replicas may serve a read and remembers which users must read from the primary.
+
+    Args:
+        replica_count (int): The number of configured replicas.
+        pin_seconds (float): How long a user's reads go to the primary after they commit a write.
+        retry_seconds (float): How long a replica that failed to connect is skipped.
+    """
+
+    def __init__(self, replica_count, pin_seconds, retry_seconds):
+        self.replica_count = replica_count
+        self.pin_seconds = pin_seconds
+        self.retry_seconds = retry_seconds
+        self._next = itertools.count()
+        self._down_until = [0.0] * replica_count
+        self._pins = {}
+        self._lock = threading.Lock()
+
+    def pin(self, key):
+        """
+        Send a user's reads to the primary for the pinning window.
+
+        Args:
+            key (str): The user's pin key.
+        """
+        if self.pin_seconds <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._pins) >= 10000:
+                self._pins = {pinned: until for pinned, until in self._pins.items() if until > now}
+            self._pins[key] = now + self.pin_seconds
+
+    def is_pinned(self, key):
+        """
+        Check whether a user recently wrote and must read from the primary.
+
+        Args:
+            key (str): The user's pin key, or None for anonymous requests.
+
+        Returns:
+            bool: True if the user is pinned to the primary.
+        """
+        if key is None:
+            return False
+        with self._lock:
+            return self._pins.get(key, 0.0) > time.monotonic()
+
+    def candidates(self, key):
+        """
+        List the replicas to try for a read, in order.
+
+        Replicas are rotated between calls to spread the load, and replicas that recently
+        failed are left out.
+
+        Args:
+            key (str): The user's pin key, or None for anonymous requests.
+
+        Returns:
+            list[int]: The indexes of the replicas to try; empty if the read must go to the primary.
+        """
+        if self.replica_count == 0 or self.is_pinned(key):
+            return []
+        start = next(self._next)
+        now = time.monotonic()
+        order = ((start + offset) % self.replica_count for offset in range(self.replica_count))
+        return [index for index in order if self._down_until[index] <= now]
+
+    def mark_down(self, index):
+        """
+        Skip a replica for the retry window after it failed to connect.
+
+        Args:
+            index (int): The index of the failed replica.
+        """
+        self._down_until[index] = time.monotonic() + self.retry_seconds
+
+read_router = ReadRouter(len(read_engines), READ_YOUR_WRITES_SECONDS, REPLICA_RETRY_SECONDS)
+
+@event.listens_for(PrimarySession, "after_commit")
+def pin_writer(session):
+    """
+    Pin the user whose request committed a write to the primary.
+    """
+    key = session.info.get("pin_key")
+    if key is not None:
+        read_router.pin(key)
+
+def session_pin_key(request):
+    """
+    Identify the user behind a request for read-your-writes pinning.
+
+    The token is not verified here: the key only decides where a read is routed, and the
+    endpoint's own authentication still rejects invalid tokens.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        str: The subject of the request's bearer token, or None if it has none.
+    """
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.decode(token, options={"verify_signature": False}).get("sub")
+    except jwt.InvalidTokenError:
+        return None
+
 def get_db():
     """
     Creates a database session and ensures it's closed after use.
@@ -32,4 +221,66 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db(request: Request):
+    """
+    Creates an asyncio database session on the primary and ensures it's closed after use.
+
+    Args:
+        request (Request): The incoming request, whose user is pinned to the primary if the session commits.
+
+    Yields:
+        AsyncSession: A SQLAlchemy asyncio database session.
+    """
+    async with AsyncSessionLocal(info={"pin_key": session_pin_key(request)}) as db:
+        yield db
+
+async def get_read_db(request: Request):
+    """
+    Creates an asyncio database session for a read-only request and ensures it's closed after use.
+
+    The session is opened on a replica when one is configured and reachable, and on the primary
+    otherwise or while the user is pinned there after a write.
+
+    Args:
+        request (Request): The incoming request.
+
+    Yields:
+        AsyncSession: A SQLAlchemy asyncio database session.
+    """
+    key = session_pin_key(request)
+    for index in read_router.candidates(key):
+        db = ReadSessionLocals[index]()
+        try:
+            await db.connection()
+        except (DBAPIError, OSError):
+            await db.close()
+            read_router.mark_down(index)
+            continue
+        async with db:
+            yield db
+        return
+    async with AsyncSessionLocal(info={"pin_key": key}) as db:
+        yield db
+
+@asynccontextmanager
+async def primary_session(db):
+    """
+    Provide a session on the primary for a read that must not lag behind recent writes.
+
+    Args:
+        db (AsyncSession): The request's session, reused if it is already on the primary.
+
+    Yields:
+        AsyncSession: A session on the primary.
+    """
+    if db.bind is async_engine:
+        yield db
+        return
+    async with AsyncSessionLocal() as primary:
+        yield primary
+
+# Opens a read session outside of dependency injection, for work that outlives the endpoint call
+# such as producing a streamed response body.
+read_session = asynccontextmanager(get_read_db)
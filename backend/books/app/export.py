@@ -0,0 +1,110 @@
+"""
+This module streams the transaction history of the books service as JSON lines or CSV.
+
+Rows are read through a server-side cursor in fixed-size chunks and each chunk is encoded and
+sent before the next one is fetched, so an export holds at most one chunk in memory however many
+transactions it covers. The export opens its own read session, because the response body is
+still being produced after the endpoint has returned.
+"""
+
+import csv
+import io
+import orjson
+from sqlalchemy import select
+from . import models
+
+EXPORT_CHUNK_SIZE = 1000
+
+# Maps each export format to the media type of the response.
+EXPORT_MEDIA_TYPES = {
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+EXPORT_COLUMNS = (
+    models.Transaction.id,
+    models.Transaction.user_id,
+    models.Transaction.book_id,
+    models.Transaction.rented_at,
+    models.Transaction.returned_at,
+    models.Transaction.due_at,
+    models.Transaction.overdue_at,
+)
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+def export_query(since=None, until=None, user_id=None, book_id=None):
+    """
+    Build the query selecting the transactions to export, in ID order.
+
+    Args:
+        since (datetime): Only include transactions rented at or after this time.
+        until (datetime): Only include transactions rented before this time.
+        user_id (int): Only include transactions of this user.
+        book_id (int): Only include transactions of this book.
+
+    Returns:
+        Select: The export query.
+    """
+    query = select(*EXPORT_COLUMNS).order_by(models.Transaction.id)
+    if since is not None:
+        query = query.where(models.Transaction.rented_at >= since)
+    if until is not None:
+        query = query.where(models.Transaction.rented_at < until)
+    if user_id is not None:
+        query = query.where(models.Transaction.user_id == user_id)
+    if book_id is not None:
+        query = query.where(models.Transaction.book_id == book_id)
+    return query
+
+def encode_jsonl(rows):
+    """
+    Encode rows as JSON lines.
+
+    Args:
+        rows (list[Row]): The rows to encode.
+
+    Returns:
+        bytes: One JSON object per row, each terminated by a newline.
+    """
+    return b"".join(orjson.dumps(row._asdict(), option=orjson.OPT_UTC_Z | orjson.OPT_APPEND_NEWLINE) for row in rows)
+
+def encode_csv(rows, header=False):
+    """
+    Encode rows as CSV.
+
+    Args:
+        rows (list[Row]): The rows to encode.
+        header (bool): Whether to start with a header line.
+
+    Returns:
+        bytes: The CSV lines.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    writer.writerows(
+        ["" if value is None else value.isoformat() if hasattr(value, "isoformat") else value for value in row]
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+async def stream_export(session_factory, query, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Stream the rows of an export query as encoded chunks.
+
+    Args:
+        session_factory (callable): Returns an async context manager yielding the session to read with.
+        query (Select): The export query.
+        fmt (str): The export format, ``jsonl`` or ``csv``.
+        chunk_size (int): The number of rows fetched from the cursor and encoded at a time.
+
+    Yields:
+        bytes: The encoded chunks.
+    """
+    if fmt == "csv":
+        yield encode_csv([], header=True)
+    async with session_factory() as db:
+        result = await db.stream(query.execution_options(yield_per=chunk_size))
+        async for rows in result.partitions():
+            yield encode_csv(rows) if fmt == "csv" else encode_jsonl(rows)
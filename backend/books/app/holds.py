@@ -0,0 +1,168 @@
+"""
+This module implements the hold queues of the books service.
+
+A reader who finds a book out of stock places a hold instead of retrying the rental. Holds
+queue per book by ``position``, which only grows, so the next hold to serve is the first
+entry of a partial index over the pending holds of the book.
+
+When a copy comes back, it goes to the oldest pending hold rather than to the shelf: the copy
+is rented to the hold's reader in the same database transaction as the return, and only
+copies nobody is waiting for are put back into inventory. Placing or cancelling a hold and
+handing out copies all lock the book row first, so a hold is never placed on a book whose
+copies are being put back into inventory at the same time, each copy goes to exactly one
+hold, and a hold being served cannot be cancelled.
+"""
+
+from collections import Counter
+from datetime import datetime, timezone
+from fastapi import HTTPException
+from sqlalchemy import case, func, insert, select, union_all, update
+from . import models
+from .analytics import record_rentals
+from .overdue import due_date
+
+async def lock_books(db, book_ids):
+    """
+    Lock the rows of books for the rest of the database transaction.
+
+    Rows are locked in ID order, so that concurrent transactions locking several books cannot deadlock.
+
+    Args:
+        db (AsyncSession): The database session.
+        book_ids (iterable[int]): The IDs of the books to lock.
+
+    Returns:
+        dict[int, int]: The inventory count of each book found, by book ID.
+    """
+    result = await db.execute(
+        select(models.Book.id, models.Book.inventory_count)
+        .where(models.Book.id.in_(sorted(set(book_ids))))
+        .order_by(models.Book.id)
+        .with_for_update()
+    )
+    return dict(result.all())
+
+async def place_hold(db, book_id, user_id):
+    """
+    Queue a reader for the next copy of an out-of-stock book.
+
+    Args:
+        db (AsyncSession): The database session.
+        book_id (int): The ID of the book.
+        user_id (int): The ID of the reader.
+
+    Returns:
+        models.Hold: The created hold.
+
+    Raises:
+        HTTPException: If the book is not found, is in stock, or the reader already holds it.
+    """
+    inventory = await lock_books(db, [book_id])
+    if book_id not in inventory:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Book not found")
+    if inventory[book_id] > 0:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Book is available for rent")
+    pending = await db.scalar(
+        select(models.Hold.id).where(
+            models.Hold.book_id == book_id, models.Hold.user_id == user_id, models.Hold.transaction_id.is_(None)
+        )
+    )
+    if pending is not None:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Book is already on hold for this user")
+    last_position = select(func.coalesce(func.max(models.Hold.position), 0)).where(models.Hold.book_id == book_id)
+    db_hold = await db.scalar(
+        insert(models.Hold)
+        .values(book_id=book_id, user_id=user_id, position=last_position.scalar_subquery() + 1)
+        .returning(models.Hold)
+    )
+    await db.commit()
+    return db_hold
+
+async def cancel_hold(db, hold_id):
+    """
+    Remove a pending hold from its queue.
+
+    Args:
+        db (AsyncSession): The database session.
+        hold_id (int): The ID of the hold.
+
+    Returns:
+        models.Hold: The cancelled hold.
+
+    Raises:
+        HTTPException: If the hold is not found or has already been fulfilled.
+    """
+    db_hold = await db.get(models.Hold, hold_id)
+    if db_hold is None:
+        raise HTTPException(status_code=404, detail="Hold not found")
+    # The hold is checked again with its book locked, so that it is not served while it is cancelled.
+    await lock_books(db, [db_hold.book_id])
+    db_hold = await db.get(models.Hold, hold_id, populate_existing=True)
+    if db_hold is None:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Hold not found")
+    if db_hold.transaction_id is not None:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Hold already fulfilled")
+    await db.delete(db_hold)
+    await db.commit()
+    return db_hold
+
+async def assign_copies(db, counts):
+    """
+    Hand copies of books to their oldest pending holds and put the rest into inventory.
+
+    Each served hold gets a new rental for its reader, and the rentals are counted in the
+    circulation rollups. The caller commits.
+
+    Args:
+        db (AsyncSession): The database session.
+        counts (dict[int, int]): The number of copies to hand out, by book ID.
+
+    Returns:
+        list[models.Transaction]: The rentals created for the served holds.
+    """
+    counts = {book_id: copies for book_id, copies in counts.items() if copies > 0}
+    if not counts:
+        return []
+    await lock_books(db, counts)
+
+    # One index range scan per book, each reading only as many holds as there are copies.
+    queues = [
+        select(models.Hold.id, models.Hold.book_id, models.Hold.user_id)
+        .where(models.Hold.book_id == book_id, models.Hold.transaction_id.is_(None))
+        .order_by(models.Hold.position)
+        .limit(copies)
+        .subquery()
+        for book_id, copies in sorted(counts.items())
+    ]
+    holds = (await db.execute(union_all(*(select(queue) for queue in queues)))).all()
+
+    transactions = []
+    if holds:
+        due_at = due_date()
+        transactions = (await db.scalars(
+            insert(models.Transaction).returning(models.Transaction, sort_by_parameter_order=True),
+            [{"user_id": hold.user_id, "book_id": hold.book_id, "due_at": due_at} for hold in holds],
+        )).all()
+        fulfilled_at = datetime.now(timezone.utc)
+        await db.execute(update(models.Hold), [
+            {"id": hold.id, "transaction_id": transaction.id, "fulfilled_at": fulfilled_at}
+            for hold, transaction in zip(holds, transactions)
+        ])
+        await record_rentals(db, transactions)
+
+    served = Counter(hold.book_id for hold in holds)
+    shelved = {book_id: copies - served[book_id] for book_id, copies in counts.items() if copies > served[book_id]}
+    if shelved:
+        copies = case(shelved, value=models.Book.id)
+        await db.execute(
+            update(models.Book)
+            .where(models.Book.id.in_(shelved))
+            .values(inventory_count=models.Book.inventory_count + copies)
+            .execution_options(synchronize_session=False)
+        )
+    return transactions
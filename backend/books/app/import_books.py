@@ -0,0 +1,292 @@
+"""
+This module bulk-loads books into the catalog from CSV or JSON-lines feeds.
+
+Input is consumed line by line and written in large batches with a single multi-row
+``INSERT ... ON CONFLICT (isbn) DO UPDATE`` per batch, so rows that share an ISBN with
+an existing book update it in place. The existing books of a batch are locked first, and
+copies an update adds to their inventory go to the books' pending holds before the shelf,
+as when a book is edited. Every batch also logs its books in the catalog change log, so
+change feed clients pick up imported books. The same importer backs the
+``POST /api/v1/books/bulk`` endpoint and the command-line tool:
+
+    python -m app.import_books catalog.csv --batch-size 5000
+"""
+
+import argparse
+import asyncio
+import codecs
+import csv
+import json
+import sys
+import time
+from pydantic import ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from . import models, schemas
+from .changes import record_upserts
+from .database import AsyncSessionLocal
+from .holds import assign_copies
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+FORMATS = ("csv", "jsonl")
+
+BOOK_FIELDS = list(schemas.BookCreate.model_fields)
+
+def upsert_books_statement(dialect_name):
+    """
+    Build an INSERT statement for books that updates existing rows with the same ISBN.
+
+    Rows without an ISBN never conflict and are always inserted. An existing book's inventory
+    count is only lowered by the statement: copies added to it are left for the caller to hand
+    out with ``holds.assign_copies``.
+
+    Args:
+        dialect_name (str): The name of the database dialect the statement will run on.
+
+    Returns:
+        Insert: The upsert statement, to be executed with a list of parameter sets.
+    """
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(models.Book)
+    updates = {field: stmt.excluded[field] for field in BOOK_FIELDS if field != "isbn"}
+    least = func.least if dialect_name == "postgresql" else func.min
+    updates["inventory_count"] = least(models.Book.inventory_count, stmt.excluded.inventory_count)
+    updates["modified_at"] = func.now()
+    return stmt.on_conflict_do_update(index_elements=[models.Book.isbn], set_=updates)
+
+class BookImporter:
+    """
+    Accumulates parsed feed lines and writes them to the database in batches.
+
+    Args:
+        db (AsyncSession): The database session to write with.
+        fmt (str): The input format, either ``"csv"`` or ``"jsonl"``.
+        batch_size (int): The number of rows to write per statement.
+        on_batch (callable): Called with each ``schemas.BookImportBatch`` as it is committed.
+    """
+
+    def __init__(self, db, fmt, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported import format: {fmt}")
+        self.db = db
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.on_batch = on_batch
+        self.statement = upsert_books_statement(db.bind.dialect.name)
+        self.header = None
+        self.line_number = 0
+        self.pending = []
+        self.batches = []
+        self.errors = []
+        self.rows_imported = 0
+        self.rows_rejected = 0
+        self.started = time.perf_counter()
+
+    def _parse(self, line):
+        if self.fmt == "jsonl":
+            return json.loads(line)
+        values = next(csv.reader([line]))
+        if self.header is None:
+            self.header = [name.strip() for name in values]
+            return None
+        return dict(zip(self.header, values))
+
+    def _reject(self, error):
+        self.rows_rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(schemas.BookImportError(line=self.line_number, error=error))
+
+    async def add_line(self, line):
+        """
+        Parse one input line and queue it for writing, flushing when a batch is full.
+
+        Invalid lines are counted and reported in the summary rather than aborting the import.
+
+        Args:
+            line (str): One line of the feed, without its line terminator.
+        """
+        self.line_number += 1
+        if not line.strip():
+            return
+        try:
+            raw = self._parse(line)
+            if raw is None:
+                return
+            # Empty CSV cells mean "not provided" for the optional fields.
+            raw = {key: value for key, value in raw.items() if value != ""}
+            book = schemas.BookCreate(**raw)
+        except ValidationError as exc:
+            self._reject("; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in exc.errors()))
+            return
+        except (ValueError, TypeError, AttributeError, csv.Error) as exc:
+            self._reject(str(exc))
+            return
+        self.pending.append(book.dict())
+        if len(self.pending) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        """
+        Write and commit the queued rows as one batch.
+        """
+        if not self.pending:
+            return
+        # A single statement cannot upsert the same key twice, so the last row for an ISBN wins.
+        rows, by_isbn = [], {}
+        for row in self.pending:
+            if row["isbn"] is None:
+                rows.append(row)
+            else:
+                by_isbn[row["isbn"]] = row
+        rows.extend(by_isbn.values())
+        self.pending = []
+
+        started = time.perf_counter()
+        # The books being updated are locked in ID order before their inventory is read, like
+        # ``holds.lock_books`` does, so that returns and holds on them wait for the batch.
+        existing = dict((await self.db.execute(
+            select(models.Book.isbn, models.Book.inventory_count)
+            .where(models.Book.isbn.in_(by_isbn))
+            .order_by(models.Book.id)
+            .with_for_update()
+        )).all())
+        book_ids = (await self.db.scalars(
+            self.statement.returning(models.Book.id, sort_by_parameter_order=True), rows
+        )).all()
+        await assign_copies(self.db, {
+            book_id: row["inventory_count"] - existing[row["isbn"]]
+            for book_id, row in zip(book_ids, rows) if row["isbn"] in existing
+        })
+        await record_upserts(self.db, book_ids)
+        await self.db.commit()
+        seconds = time.perf_counter() - started
+
+        self.rows_imported += len(rows)
+        batch = schemas.BookImportBatch(
+            batch=len(self.batches) + 1,
+            rows=len(rows),
+            seconds=round(seconds, 4),
+            rows_per_sec=round(len(rows) / seconds, 1) if seconds else 0.0,
+        )
+        self.batches.append(batch)
+        if self.on_batch:
+            self.on_batch(batch)
+
+    async def finish(self):
+        """
+        Flush any remaining rows and summarize the import.
+
+        Returns:
+            schemas.BookImportSummary: The totals, per-batch progress and rejected lines.
+        """
+        await self.flush()
+        seconds = time.perf_counter() - self.started
+        return schemas.BookImportSummary(
+            rows_imported=self.rows_imported,
+            rows_rejected=self.rows_rejected,
+            seconds=round(seconds, 4),
+            rows_per_sec=round(self.rows_imported / seconds, 1) if seconds else 0.0,
+            batches=self.batches,
+            errors=self.errors,
+        )
+
+CONTENT_TYPE_FORMATS = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "jsonl",
+    "application/jsonl": "jsonl",
+    "application/json-lines": "jsonl",
+}
+
+def format_from_content_type(content_type):
+    """
+    Map a request Content-Type to an import format.
+
+    Args:
+        content_type (str): The Content-Type header value, possibly with parameters.
+
+    Returns:
+        str: ``"csv"`` or ``"jsonl"``, or None if the media type is not a supported feed format.
+    """
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return CONTENT_TYPE_FORMATS.get(media_type)
+
+async def iter_request_lines(request):
+    """
+    Yield the lines of a request body as it arrives, without buffering the whole body.
+
+    Args:
+        request (Request): The incoming request.
+
+    Yields:
+        str: Each line of the body, without its line terminator.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    async for chunk in request.stream():
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+def detect_format(path):
+    """
+    Guess the input format from a file name.
+
+    Args:
+        path (str): The input file path.
+
+    Returns:
+        str: ``"csv"`` or ``"jsonl"``.
+    """
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+async def import_file(path, fmt, batch_size):
+    """
+    Import a feed file, printing progress after every batch.
+
+    Args:
+        path (str): The input file path, or ``-`` for standard input.
+        fmt (str): The input format.
+        batch_size (int): The number of rows to write per statement.
+
+    Returns:
+        schemas.BookImportSummary: The import summary.
+    """
+    def report(batch):
+        print(f"batch {batch.batch}: {batch.rows} rows in {batch.seconds:.3f}s ({batch.rows_per_sec:.0f} rows/s)")
+
+    stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        async with AsyncSessionLocal() as db:
+            importer = BookImporter(db, fmt, batch_size, on_batch=report)
+            for line in stream:
+                await importer.add_line(line.rstrip("\r\n"))
+            return await importer.finish()
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import books from a CSV or JSON-lines feed.")
+    parser.add_argument("path", help="input file, or - to read standard input")
+    parser.add_argument("--format", choices=FORMATS, help="input format (default: inferred from the file name)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows written per statement")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or detect_format(args.path)
+    summary = asyncio.run(import_file(args.path, fmt, args.batch_size))
+    for error in summary.errors:
+        print(f"line {error.line}: {error.error}", file=sys.stderr)
+    print(
+        f"imported {summary.rows_imported} rows, rejected {summary.rows_rejected}, "
+        f"in {summary.seconds:.2f}s ({summary.rows_per_sec:.0f} rows/s)"
+    )
+    return 1 if summary.rows_rejected else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+"""
+This module implements the inventory-changing operations of the books service.
+
+Renting and returning adjust ``inventory_count`` with conditional ``UPDATE`` statements
+instead of read-modify-write in Python, so concurrent requests for the same title can
+neither lose updates nor rent out more copies than exist. The inventory change and the
+matching ``Transaction`` write are committed together in one database transaction, along with
+the entry of the catalog change log that records the new inventory count and the update of the
+circulation rollups.
+
+The batch operations handle a whole stack of books with a fixed number of statements: one
+``UPDATE`` adjusts the inventory of every title at once, using a ``CASE`` on the book ID for
+the per-title amounts, and the transactions are written with one multi-row statement. Items
+that cannot be processed are reported individually while the rest of the batch goes through.
+
+Returned copies are first handed to the readers holding the book, see ``app.holds``. So are
+copies added by editing a book, which reads the inventory count with the book row locked, so
+that the rentals, returns and holds on the book wait for the edit instead of racing it.
+"""
+
+from collections import Counter
+from fastapi import HTTPException
+from sqlalchemy import case, func, insert, select, update
+from . import models
+from .analytics import record_rentals, record_returns
+from .changes import record_upserts
+from .holds import assign_copies, lock_books
+from .overdue import due_date
+from .partitions import transactions_by_id
+
+async def rent_copy(db, transaction):
+    """
+    Take one copy of a book out of inventory and record the rental, due in ``LOAN_DAYS`` days.
+
+    Args:
+        db (AsyncSession): The database session.
+        transaction (schemas.TransactionCreate): The rental to record.
+
+    Returns:
+        models.Transaction: The created transaction.
+
+    Raises:
+        HTTPException: If the book is not found or no copy is available.
+    """
+    result = await db.execute(
+        update(models.Book)
+        .where(models.Book.id == transaction.book_id, models.Book.inventory_count > 0)
+        .values(inventory_count=models.Book.inventory_count - 1)
+        .returning(models.Book.id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.scalar_one_or_none() is None:
+        book_exists = await db.scalar(select(models.Book.id).where(models.Book.id == transaction.book_id))
+        await db.rollback()
+        if book_exists is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+        raise HTTPException(status_code=400, detail="Book is not available for rent")
+
+    db_transaction = await db.scalar(
+        insert(models.Transaction).values(**transaction.dict(), due_at=due_date()).returning(models.Transaction)
+    )
+    await record_rentals(db, [db_transaction])
+    await record_upserts(db, [transaction.book_id])
+    await db.commit()
+    return db_transaction
+
+async def return_copy(db, transaction_id):
+    """
+    Close an open rental and hand the copy to the next hold on the book, or put it back into inventory.
+
+    Args:
+        db (AsyncSession): The database session.
+        transaction_id (int): The ID of the transaction to close.
+
+    Returns:
+        models.Transaction: The updated transaction.
+
+    Raises:
+        HTTPException: If the transaction is not found or the book has already been returned.
+    """
+    db_transaction = await db.scalar(
+        update(models.Transaction)
+        .where(transactions_by_id([transaction_id]), models.Transaction.returned_at.is_(None))
+        .values(returned_at=func.now())
+        .returning(models.Transaction)
+        .execution_options(synchronize_session=False)
+    )
+    if db_transaction is None:
+        transaction_exists = await db.scalar(
+            select(models.Transaction.id).where(transactions_by_id([transaction_id]))
+        )
+        await db.rollback()
+        if transaction_exists is None:
+            raise HTTPException(status_code=404, detail="Transaction not found")
+        raise HTTPException(status_code=400, detail="Book already returned")
+
+    if db_transaction.book_id is not None:
+        await assign_copies(db, {db_transaction.book_id: 1})
+        await record_returns(db, [db_transaction])
+        await record_upserts(db, [db_transaction.book_id])
+    await db.commit()
+    return db_transaction
+
+def batch_item(status_code, detail=None, **fields):
+    """
+    Build the result of one item of a batch operation.
+
+    Args:
+        status_code (int): The status the item would have had as a single request.
+        detail (str): The error message, for failed items.
+        **fields: The identifying fields and, on success, the transaction.
+
+    Returns:
+        dict: The item result.
+    """
+    return {"status_code": status_code, "detail": detail, **fields}
+
+def batch_result(items):
+    """
+    Summarize the item results of a batch operation.
+
+    Args:
+        items (list[dict]): The item results, in request order.
+
+    Returns:
+        dict: The success and failure counts and the item results.
+    """
+    succeeded = sum(item["status_code"] == 200 for item in items)
+    return {"succeeded": succeeded, "failed": len(items) - succeeded, "items": items}
+
+async def rent_copies(db, user_id, book_ids):
+    """
+    Rent several books for one user in a single database transaction.
+
+    A book listed more than once is rented that many times. A title is only rented if all
+    of the requested copies are available.
+
+    Args:
+        db (AsyncSession): The database session.
+        user_id (int): The ID of the user renting the books.
+        book_ids (list[int]): The IDs of the books to rent.
+
+    Returns:
+        dict: The batch result, with one item per requested book in request order.
+    """
+    counts = Counter(book_ids)
+    copies = case(counts, value=models.Book.id)
+    result = await db.execute(
+        update(models.Book)
+        .where(models.Book.id.in_(counts), models.Book.inventory_count >= copies)
+        .values(inventory_count=models.Book.inventory_count - copies)
+        .returning(models.Book.id)
+        .execution_options(synchronize_session=False)
+    )
+    rented = set(result.scalars().all())
+    unavailable = set(counts) - rented
+    existing = set()
+    if unavailable:
+        existing = set((await db.scalars(select(models.Book.id).where(models.Book.id.in_(unavailable)))).all())
+
+    due_at = due_date()
+    rows = [{"user_id": user_id, "book_id": book_id, "due_at": due_at} for book_id in book_ids if book_id in rented]
+    transactions = []
+    if rows:
+        transactions = (await db.scalars(
+            insert(models.Transaction).returning(models.Transaction, sort_by_parameter_order=True), rows
+        )).all()
+    await record_rentals(db, transactions)
+    await record_upserts(db, rented)
+    await db.commit()
+
+    created = iter(transactions)
+    items = []
+    for book_id in book_ids:
+        if book_id in rented:
+            items.append(batch_item(200, book_id=book_id, transaction=next(created)))
+        elif book_id in existing:
+            items.append(batch_item(400, "Book is not available for rent", book_id=book_id))
+        else:
+            items.append(batch_item(404, "Book not found", book_id=book_id))
+    return batch_result(items)
+
+async def return_copies(db, transaction_ids):
+    """
+    Close several open rentals in a single database transaction.
+
+    The returned copies go to the holds on their books first; the rest are put back into inventory.
+
+    Args:
+        db (AsyncSession): The database session.
+        transaction_ids (list[int]): The IDs of the transactions to close. Repeated IDs are processed once.
+
+    Returns:
+        dict: The batch result, with one item per distinct transaction ID in request order.
+    """
+    transaction_ids = list(dict.fromkeys(transaction_ids))
+    result = await db.scalars(
+        update(models.Transaction)
+        .where(transactions_by_id(transaction_ids), models.Transaction.returned_at.is_(None))
+        .values(returned_at=func.now())
+        .returning(models.Transaction)
+        .execution_options(synchronize_session=False)
+    )
+    returned = {db_transaction.id: db_transaction for db_transaction in result.all()}
+
+    counts = Counter(t.book_id for t in returned.values() if t.book_id is not None)
+    await assign_copies(db, counts)
+    not_open = [transaction_id for transaction_id in transaction_ids if transaction_id not in returned]
+    existing = set()
+    if not_open:
+        existing = set((await db.scalars(
+            select(models.Transaction.id).where(transactions_by_id(not_open))
+        )).all())
+    await record_returns(db, returned.values())
+    await record_upserts(db, counts)
+    await db.commit()
+
+    items = []
+    for transaction_id in transaction_ids:
+        if transaction_id in returned:
+            items.append(batch_item(200, transaction_id=transaction_id, transaction=returned[transaction_id]))
+        elif transaction_id in existing:
+            items.append(batch_item(400, "Book already returned", transaction_id=transaction_id))
+        else:
+            items.append(batch_item(404, "Transaction not found", transaction_id=transaction_id))
+    return batch_result(items)
+
+async def edit_book(db, book_id, book):
+    """
+    Update the fields of a book and hand the copies added to its inventory to its holds first.
+
+    Args:
+        db (AsyncSession): The database session.
+        book_id (int): The ID of the book to update.
+        book (schemas.BookCreate): The updated book data.
+
+    Returns:
+        models.Book: The updated book.
+
+    Raises:
+        HTTPException: If the book is not found.
+    """
+    inventory = await lock_books(db, [book_id])
+    if book_id not in inventory:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Book not found")
+    db_book = await db.get(models.Book, book_id)
+    values = book.dict()
+    added = max(0, values["inventory_count"] - inventory[book_id])
+    if added:
+        values["inventory_count"] = inventory[book_id]
+    for key, value in values.items():
+        setattr(db_book, key, value)
+    await db.flush()
+    await assign_copies(db, {book_id: added})
+    await record_upserts(db, [book_id])
+    await db.commit()
+    await db.refresh(db_book)
+    return db_book
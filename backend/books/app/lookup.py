@@ -0,0 +1,70 @@
+"""
+This module resolves many records by ID with a single query for the books service.
+
+Clients that hydrate lists of transactions would otherwise fetch every book with its own
+request. The batch lookups here take the whole set of IDs at once, query them with one
+``= ANY(array)`` on Postgres (one bind parameter however many IDs) or ``IN`` elsewhere, and
+return the rows in the order the IDs were requested along with the IDs that were not found.
+"""
+
+from fastapi import HTTPException
+from sqlalchemy import ARRAY, Integer, any_, bindparam, select
+from .schemas import MAX_BATCH_GET_IDS
+
+MISSING_IDS_HEADER = "X-Missing-Ids"
+
+def parse_ids(value):
+    """
+    Parse a comma-separated list of IDs from a query parameter.
+
+    Args:
+        value (str): The parameter value, e.g. ``"3,1,2"``.
+
+    Returns:
+        list[int]: The IDs, in the given order.
+
+    Raises:
+        HTTPException: If the value is not a list of integers or holds too many IDs.
+    """
+    try:
+        ids = [int(part) for part in value.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if len(ids) > MAX_BATCH_GET_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_GET_IDS} ids can be requested at once")
+    return ids
+
+def id_filter(column, ids, dialect_name):
+    """
+    Build a filter matching any of the given IDs.
+
+    Args:
+        column (Column): The ID column.
+        ids (list[int]): The IDs to match.
+        dialect_name (str): The name of the database dialect the filter will run on.
+
+    Returns:
+        ColumnElement: The filter expression.
+    """
+    if dialect_name == "postgresql":
+        return column == any_(bindparam("ids", ids, type_=ARRAY(Integer)))
+    return column.in_(ids)
+
+async def fetch_by_ids(db, model, ids):
+    """
+    Load the rows with the given IDs in one query.
+
+    Args:
+        db (AsyncSession): The database session.
+        model (type): The mapped class to load, which must have an ``id`` column.
+        ids (list[int]): The IDs to load. Repeated IDs are returned once.
+
+    Returns:
+        tuple[list, list[int]]: The rows found, in request order, and the IDs that were not found.
+    """
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return [], []
+    result = await db.scalars(select(model).where(id_filter(model.id, ids, db.bind.dialect.name)))
+    found = {row.id: row for row in result.all()}
+    return [found[item_id] for item_id in ids if item_id in found], [item_id for item_id in ids if item_id not in found]
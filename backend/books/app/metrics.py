@@ -0,0 +1,219 @@
+"""
+This module collects request, database and connection pool metrics for the books service.
+
+``MetricsMiddleware`` times every HTTP request by route template and tracks how many are in
+flight, SQLAlchemy engine events count and time the queries each request issues, and
+``PoolCollector`` reports connection pool usage whenever the metrics are scraped. Everything
+is exposed in the Prometheus text format by the ``/metrics`` endpoint.
+
+Scrapers must send ``Authorization: Bearer <METRICS_TOKEN>``. Without ``METRICS_TOKEN`` set,
+every scrape is refused, so the metrics are never published by accident.
+
+Queries slower than ``SLOW_QUERY_MS`` milliseconds (default 500; 0 disables the log) are
+logged with their statement and, unless ``SLOW_QUERY_LOG_PARAMETERS`` is false, their
+parameters.
+"""
+
+import hmac
+import logging
+import os
+import time
+from contextvars import ContextVar
+from dotenv import load_dotenv
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from .pool import pool_status
+
+load_dotenv()
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+SLOW_QUERY_LOG_PARAMETERS = os.getenv("SLOW_QUERY_LOG_PARAMETERS", "true").lower() in ("1", "true", "yes")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Longest parameter representation written to the slow-query log.
+MAX_LOGGED_PARAMETERS = 1000
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling HTTP requests.",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being handled.",
+    ["method"],
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries issued per HTTP request.",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+REQUEST_QUERY_SECONDS = Histogram(
+    "http_request_db_query_duration_seconds",
+    "Time spent in database queries per HTTP request.",
+    ["method", "route"],
+)
+QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Time spent executing individual database queries.",
+)
+
+class QueryStats:
+    """
+    The number and total duration of the queries issued while handling one request.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+# The query statistics of the request being handled, if any.
+current_query_stats = ContextVar("current_query_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started_at"].pop()
+    QUERY_LATENCY.observe(elapsed)
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+    if SLOW_QUERY_MS > 0 and elapsed * 1000 >= SLOW_QUERY_MS:
+        if SLOW_QUERY_LOG_PARAMETERS:
+            logger.warning(
+                "Slow query (%.1f ms): %s; parameters: %.*r",
+                elapsed * 1000, statement, MAX_LOGGED_PARAMETERS, parameters,
+            )
+        else:
+            logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, statement)
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute, so drop its start time here.
+    started = exception_context.connection.info.get("query_started_at") if exception_context.connection else None
+    if started:
+        started.pop()
+
+def instrument_engine(engine):
+    """
+    Count and time the queries executed through an engine.
+
+    Args:
+        engine (Engine): The engine to instrument. For an asyncio engine, pass its ``sync_engine``.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+class PoolCollector:
+    """
+    Reports the usage of connection pools each time the metrics are collected.
+
+    Args:
+        engines (dict): The engines whose pools to report, keyed by pool name.
+    """
+
+    def __init__(self, engines):
+        self.engines = engines
+
+    def collect(self):
+        size = GaugeMetricFamily("db_pool_size", "Connections kept open by the pool.", labels=["pool"])
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Connections currently in use.", labels=["pool"])
+        overflow = GaugeMetricFamily("db_pool_overflow", "Connections open beyond the pool size.", labels=["pool"])
+        utilization = GaugeMetricFamily(
+            "db_pool_utilization", "Share of the pool's connection limit in use.", labels=["pool"]
+        )
+        checkouts = CounterMetricFamily("db_pool_checkouts", "Connections checked out of the pool.", labels=["pool"])
+        wait = CounterMetricFamily(
+            "db_pool_wait_seconds", "Time spent waiting to check out a connection.", labels=["pool"]
+        )
+        for name, engine in self.engines.items():
+            status = pool_status(engine)
+            if status["external_pooler"]:
+                continue
+            size.add_metric([name], status["size"])
+            checked_out.add_metric([name], status["checked_out"])
+            overflow.add_metric([name], status["overflow"])
+            utilization.add_metric([name], status["utilization"])
+            checkouts.add_metric([name], status["checkouts"])
+            wait.add_metric([name], status["wait_seconds_total"])
+        return [size, checked_out, overflow, utilization, checkouts, wait]
+
+def register_pools(engines):
+    """
+    Include the pools of the given engines in the exposed metrics.
+
+    Args:
+        engines (dict): The engines whose pools to report, keyed by pool name.
+    """
+    REGISTRY.register(PoolCollector(engines))
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that records the latency, concurrency and database usage of HTTP requests.
+
+    Requests are labelled with the template of the route that handled them, such as
+    ``/api/v1/books/{book_id}``, so that the number of series stays bounded. Streaming
+    responses are timed until their last chunk has been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_progress.dec()
+            current_query_stats.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(method, route, str(status_code)).observe(elapsed)
+            REQUEST_QUERIES.labels(method, route).observe(stats.count)
+            REQUEST_QUERY_SECONDS.labels(method, route).observe(stats.seconds)
+
+def render_metrics():
+    """
+    Render all collected metrics.
+
+    Returns:
+        tuple[bytes, str]: The metrics in the Prometheus text format and their content type.
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+def is_scrape_authorized(authorization):
+    """
+    Check that a scrape presents the metrics token.
+
+    Args:
+        authorization (str): The Authorization header of the request, if any.
+
+    Returns:
+        bool: True if the header carries ``METRICS_TOKEN`` as a bearer token.
+    """
+    if not METRICS_TOKEN or not authorization:
+        return False
+    scheme, _, token = authorization.partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), METRICS_TOKEN.encode())
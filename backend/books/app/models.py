@@ -1,14 +1,14 @@
 """
 This module defines the database models for the books service.
 
-It includes the Book and Transaction models, which represent the structure of the database tables.
+It includes the Book, Transaction, Hold, BookChange and BookDailyStats models, which represent the structure of the database tables.
 These models use SQLAlchemy's ORM to map Python classes to database tables.
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import DDL, BigInteger, Column, Date, Integer, String, DateTime, ForeignKey, Index, UniqueConstraint, and_, column, event, table, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
-from .database import Base
+from .database import TRANSACTIONS_PARTITIONED, Base
 
 class Book(Base):
     """
@@ -20,6 +20,7 @@ class Book(Base):
         author (str): The author of the book.
         description (str): A description of the book.
         image_path (str): The path to the book's cover image.
+        isbn (str): The book's ISBN, used as the external key when importing catalog feeds.
         inventory_count (int): The number of copies available in the library.
         created_at (datetime): The timestamp when the book was added to the system.
         modified_at (datetime): The timestamp when the book was last modified.
@@ -31,12 +32,37 @@ class Book(Base):
     author = Column(String, index=True)
     description = Column(String)
     image_path = Column(String, nullable=True)
+    isbn = Column(String, unique=True, index=True, nullable=True)
     inventory_count = Column(Integer, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     modified_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     transactions = relationship("Transaction", back_populates="book")
 
+def book_search_vector():
+    """
+    Build the weighted full-text search document for a book.
+
+    The same expression backs the GIN index on ``books`` and the search queries, which is
+    what lets Postgres answer ``@@`` matches from the index. Title words rank above author
+    words, which rank above description words.
+
+    Returns:
+        ColumnElement: A ``tsvector`` expression.
+    """
+    config = text("'english'")
+    weighted = [
+        func.setweight(func.to_tsvector(config, func.coalesce(column, text("''"))), text(f"'{weight}'"))
+        for column, weight in ((Book.title, "A"), (Book.author, "B"), (Book.description, "C"))
+    ]
+    return weighted[0].op("||")(weighted[1]).op("||")(weighted[2])
+
+# Full-text and trigram indexes only exist on Postgres; other databases fall back to LIKE scans.
+event.listen(Book.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+Index("ix_books_search_vector", book_search_vector(), postgresql_using="gin").ddl_if(dialect="postgresql")
+Index("ix_books_title_trgm", Book.title, postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}).ddl_if(dialect="postgresql")
+Index("ix_books_author_trgm", Book.author, postgresql_using="gin", postgresql_ops={"author": "gin_trgm_ops"}).ddl_if(dialect="postgresql")
+
 class Transaction(Base):
     """
     Represents a book rental transaction in the library system.
@@ -47,13 +73,154 @@ class Transaction(Base):
         book_id (int): The ID of the book that was rented.
         rented_at (datetime): The timestamp when the book was rented.
         returned_at (datetime): The timestamp when the book was returned (nullable).
+        due_at (datetime): The timestamp when the book is due back (nullable for loans older than due dates).
+        overdue_at (datetime): The timestamp when the overdue sweeper found the loan overdue (nullable).
+
+    With ``TRANSACTIONS_PARTITIONED``, the table is range-partitioned by ``rented_at`` and, since
+    the primary key of a partitioned table must include the partition key, ``rented_at`` is part
+    of the primary key. Transactions are still identified by ``id`` alone.
     """
     __tablename__ = "transactions"
+    __table_args__ = {"postgresql_partition_by": "RANGE (rented_at)"} if TRANSACTIONS_PARTITIONED else {}
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, index=True)
-    book_id = Column(Integer, ForeignKey("books.id"))
-    rented_at = Column(DateTime(timezone=True), server_default=func.now())
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    user_id = Column(Integer)
+    book_id = Column(Integer, ForeignKey("books.id"), index=True)
+    rented_at = Column(DateTime(timezone=True), server_default=func.now(), primary_key=TRANSACTIONS_PARTITIONED)
     returned_at = Column(DateTime(timezone=True), nullable=True)
+    due_at = Column(DateTime(timezone=True), nullable=True)
+    overdue_at = Column(DateTime(timezone=True), nullable=True)
+
+    book = relationship("Book", back_populates="transactions")
+
+# A user's history is read by user and rental time; the composite index also serves plain user lookups.
+Index("ix_transactions_user_id_rented_at", Transaction.user_id, Transaction.rented_at)
+# Open loans are a small fraction of the history, so they get their own partial indexes.
+Index(
+    "ix_transactions_active_user_id",
+    Transaction.user_id,
+    postgresql_where=Transaction.returned_at.is_(None),
+    sqlite_where=Transaction.returned_at.is_(None),
+)
+Index(
+    "ix_transactions_active_book_id",
+    Transaction.book_id,
+    postgresql_where=Transaction.returned_at.is_(None),
+    sqlite_where=Transaction.returned_at.is_(None),
+)
+
+# Overdue loans are listed, a page after a due date and ID at a time, and counted from the open
+# loans ordered by due date...
+Index(
+    "ix_transactions_active_due_at_id",
+    Transaction.due_at,
+    Transaction.id,
+    postgresql_where=Transaction.returned_at.is_(None),
+    sqlite_where=Transaction.returned_at.is_(None),
+)
+# ...and the sweeper only looks at those it has not stamped yet.
+Index(
+    "ix_transactions_unmarked_due_at",
+    Transaction.due_at,
+    postgresql_where=and_(Transaction.returned_at.is_(None), Transaction.overdue_at.is_(None)),
+    sqlite_where=and_(Transaction.returned_at.is_(None), Transaction.overdue_at.is_(None)),
+)
+
+# The ID of a partitioned transaction does not tell which partition holds it, so the rental time of
+# every transaction is also recorded by ID in a plain table, from which lookups by ID take the
+# partition key; see ``app.partitions.transactions_by_id``. It is written by a trigger, so that
+# every insert is covered.
+transaction_locators = table(
+    "transaction_locators", column("id", Integer), column("rented_at", DateTime(timezone=True))
+)
+
+if TRANSACTIONS_PARTITIONED:
+    event.listen(Transaction.__table__, "after_create", DDL(
+        "CREATE TABLE transaction_locators (id integer PRIMARY KEY, rented_at timestamptz NOT NULL);"
+        "CREATE OR REPLACE FUNCTION locate_transactions() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+        "INSERT INTO transaction_locators (id, rented_at) SELECT id, rented_at FROM inserted; RETURN NULL; END $$;"
+        "CREATE TRIGGER transactions_locate AFTER INSERT ON transactions REFERENCING NEW TABLE AS inserted "
+        "FOR EACH STATEMENT EXECUTE FUNCTION locate_transactions()"
+    ))
+    event.listen(Transaction.__table__, "after_drop", DDL("DROP TABLE IF EXISTS transaction_locators"))
+
+class Hold(Base):
+    """
+    Represents a reader waiting for a copy of an out-of-stock book.
+
+    Attributes:
+        id (int): The unique identifier for the hold.
+        book_id (int): The ID of the book on hold.
+        user_id (int): The ID of the waiting reader.
+        position (int): The place of the hold in the book's queue; lower positions are served first.
+        created_at (datetime): The timestamp when the hold was placed.
+        transaction_id (int): The ID of the rental that served the hold (null while pending).
+            Not a foreign key, since transaction IDs are not unique keys of a partitioned table.
+        fulfilled_at (datetime): The timestamp when the hold was served (nullable).
+    """
+    __tablename__ = "holds"
+    __table_args__ = (UniqueConstraint("book_id", "position"),)
+
+    id = Column(Integer, primary_key=True)
+    book_id = Column(Integer, ForeignKey("books.id"), nullable=False)
+    user_id = Column(Integer, nullable=False)
+    position = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    transaction_id = Column(Integer, nullable=True)
+    fulfilled_at = Column(DateTime(timezone=True), nullable=True)
+
+# The next hold of a book is the first entry of its pending queue.
+Index(
+    "ix_holds_pending_book_id_position",
+    Hold.book_id,
+    Hold.position,
+    postgresql_where=Hold.transaction_id.is_(None),
+    sqlite_where=Hold.transaction_id.is_(None),
+)
+
+class BookChange(Base):
+    """
+    Represents an entry in the append-only log of catalog changes.
+
+    Attributes:
+        id (int): The position of the entry in the log.
+        book_id (int): The ID of the book that changed. Not a foreign key, since deleted books are logged too.
+        operation (str): ``"upsert"`` if the book was created or updated, ``"delete"`` if it was deleted.
+        inventory_count (int): The book's inventory count after the change (null for deletions).
+        changed_at (datetime): The timestamp when the change was logged.
+        txid (int): The ID of the Postgres transaction that logged the change, which orders the
+            feed together with ``id``; 0 on other databases, whose writers are serialized.
+    """
+    __tablename__ = "book_changes"
+
+    id = Column(Integer, primary_key=True)
+    book_id = Column(Integer, nullable=False)
+    operation = Column(String, nullable=False)
+    inventory_count = Column(Integer, nullable=True)
+    changed_at = Column(DateTime(timezone=True), server_default=func.now())
+    txid = Column(BigInteger, nullable=False, server_default="0")
+
+# Feed readers seek to their cursor, which is a (txid, id) pair.
+Index("ix_book_changes_txid_id", BookChange.txid, BookChange.id)
+
+class BookDailyStats(Base):
+    """
+    Represents the circulation of a book on one day, maintained as rentals and returns happen.
+
+    Attributes:
+        book_id (int): The ID of the book. Not a foreign key, so that the history of deleted books is kept.
+        day (date): The UTC day the counts cover.
+        rentals (int): The number of copies rented that day.
+        returns (int): The number of copies returned that day.
+        loan_seconds (int): The total duration, in seconds, of the loans that ended that day.
+    """
+    __tablename__ = "book_daily_stats"
+
+    book_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    rentals = Column(Integer, nullable=False, default=0)
+    returns = Column(Integer, nullable=False, default=0)
+    loan_seconds = Column(BigInteger, nullable=False, default=0)
 
-    book = relationship("Book", back_populates="transactions")
\ No newline at end of file
+# Window queries scan the rollups by day; per-book queries use the primary key.
+Index("ix_book_daily_stats_day", BookDailyStats.day)
@@ -0,0 +1,188 @@
+"""
+This module tracks overdue loans in the books service.
+
+Every rental is due ``LOAN_DAYS`` days after it starts. Open loans are indexed by due date and
+ID through partial indexes that only hold rows with ``returned_at IS NULL``, so listing and
+counting overdue loans reads the overdue part of the index instead of every open loan, and
+pages of overdue loans are read from the index after the cursor's due date and ID.
+
+``OverdueSweeper`` runs as a background task of the service. Every ``OVERDUE_SWEEP_SECONDS``
+(0 disables it), it stamps ``overdue_at`` on the loans that became overdue, in batches of
+``OVERDUE_SWEEP_BATCH_SIZE`` committed one at a time, so that no lock is held for long. On
+Postgres, the batches are claimed with ``FOR UPDATE SKIP LOCKED``, so the sweepers of several
+processes split the work instead of waiting for each other. After each sweep, the number of
+overdue loans is published as the ``books_overdue_loans`` gauge.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from prometheus_client import Counter, Gauge
+from sqlalchemy import func, select, update
+from . import models
+
+load_dotenv()
+
+LOAN_DAYS = float(os.getenv("LOAN_DAYS", "14"))
+OVERDUE_SWEEP_SECONDS = float(os.getenv("OVERDUE_SWEEP_SECONDS", "60"))
+OVERDUE_SWEEP_BATCH_SIZE = int(os.getenv("OVERDUE_SWEEP_BATCH_SIZE", "500"))
+
+logger = logging.getLogger(__name__)
+
+OVERDUE_LOANS = Gauge("books_overdue_loans", "Open loans past their due date, as of the last sweep.")
+OVERDUE_MARKED = Counter("books_overdue_loans_marked", "Loans stamped as overdue by the sweeper.")
+
+def due_date(rented_at=None):
+    """
+    Get the due date of a loan.
+
+    Args:
+        rented_at (datetime): When the loan started. Defaults to now.
+
+    Returns:
+        datetime: When the loan is due.
+    """
+    return (rented_at or datetime.now(timezone.utc)) + timedelta(days=LOAN_DAYS)
+
+def overdue_query(now=None, flagged_since=None):
+    """
+    Build the query selecting the overdue loans, unordered so that it can be paginated.
+
+    Args:
+        now (datetime): The time to compare the due dates with. Defaults to now.
+        flagged_since (datetime): Only select the loans the sweeper stamped overdue at or after this time.
+
+    Returns:
+        Select: The query.
+    """
+    query = select(models.Transaction).where(
+        models.Transaction.returned_at.is_(None),
+        models.Transaction.due_at < (now or datetime.now(timezone.utc)),
+    )
+    if flagged_since is not None:
+        query = query.where(models.Transaction.overdue_at >= flagged_since)
+    return query
+
+async def count_overdue(db, now=None):
+    """
+    Count the overdue loans.
+
+    Args:
+        db (AsyncSession): The database session.
+        now (datetime): The time to compare the due dates with. Defaults to now.
+
+    Returns:
+        int: The number of open loans past their due date.
+    """
+    return await db.scalar(
+        select(func.count())
+        .select_from(models.Transaction)
+        .where(models.Transaction.returned_at.is_(None), models.Transaction.due_at < (now or datetime.now(timezone.utc)))
+    )
+
+async def mark_overdue_batch(db, now, batch_size):
+    """
+    Stamp ``overdue_at`` on one batch of loans that became overdue and commit it.
+
+    Args:
+        db (AsyncSession): The database session.
+        now (datetime): The time to compare the due dates with.
+        batch_size (int): The maximum number of loans to stamp.
+
+    Returns:
+        int: The number of loans stamped.
+    """
+    # The rental times are claimed with the IDs, so that the update of a partitioned table only
+    # searches the partitions holding them.
+    claimed = (
+        select(models.Transaction.id, models.Transaction.rented_at)
+        .where(
+            models.Transaction.returned_at.is_(None),
+            models.Transaction.overdue_at.is_(None),
+            models.Transaction.due_at < now,
+        )
+        .order_by(models.Transaction.due_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    rows = (await db.execute(claimed)).all()
+    if rows:
+        await db.execute(
+            update(models.Transaction)
+            .where(
+                models.Transaction.id.in_([row.id for row in rows]),
+                models.Transaction.rented_at.in_(sorted({row.rented_at for row in rows})),
+                models.Transaction.returned_at.is_(None),
+            )
+            .values(overdue_at=now)
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+    return len(rows)
+
+class OverdueSweeper:
+    """
+    Periodically stamps loans that became overdue and publishes the number of overdue loans.
+
+    Args:
+        session_factory (callable): Returns the sessions to sweep with.
+        interval (float): The time between two sweeps, in seconds.
+        batch_size (int): The maximum number of loans stamped per database transaction.
+    """
+
+    def __init__(self, session_factory, interval=OVERDUE_SWEEP_SECONDS, batch_size=OVERDUE_SWEEP_BATCH_SIZE):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.batch_size = batch_size
+        self.task = None
+
+    async def sweep(self):
+        """
+        Stamp every loan that became overdue, one batch at a time, and publish the overdue count.
+
+        Returns:
+            int: The number of loans stamped.
+        """
+        now = datetime.now(timezone.utc)
+        marked = 0
+        async with self.session_factory() as db:
+            while True:
+                batch = await mark_overdue_batch(db, now, self.batch_size)
+                marked += batch
+                if batch < self.batch_size:
+                    break
+            OVERDUE_LOANS.set(await count_overdue(db, now))
+        OVERDUE_MARKED.inc(marked)
+        return marked
+
+    async def run(self):
+        """
+        Sweep every ``interval`` seconds until cancelled. Failed sweeps are logged and retried.
+        """
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Overdue loan sweep failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """
+        Start sweeping in the background, unless sweeping is disabled.
+        """
+        if self.interval > 0:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """
+        Stop sweeping and wait for the current sweep to be abandoned.
+        """
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
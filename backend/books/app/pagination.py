@@ -0,0 +1,105 @@
+"""
+This module provides keyset (cursor) pagination helpers for the books service.
+
+Cursors are opaque, URL-safe strings that encode the key of the last row of a page.
+Seeking past that key uses the primary key index, so page latency stays flat no matter
+how deep into the result set a client reads.
+"""
+
+import base64
+import binascii
+import json
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(last_id, key=None):
+    """
+    Encode the key of the last row on a page as an opaque cursor.
+
+    Args:
+        last_id (int): The ID of the last row on the page.
+        key: The JSON-serializable value the rows are ordered by before their ID, if they are
+            not ordered by ID alone.
+
+    Returns:
+        str: The opaque cursor.
+    """
+    payload = {"id": last_id} if key is None else {"key": key, "id": last_id}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor, key_type=None):
+    """
+    Decode an opaque cursor back into the key it was created from.
+
+    Args:
+        cursor (str): The opaque cursor.
+        key_type (callable): Converts the encoded ordering value back, for cursors of pages
+            not ordered by ID alone. It may raise ``ValueError`` or ``TypeError``.
+
+    Returns:
+        int | tuple: The ID of the last row on the previous page, or with ``key_type``, its
+        ordering value and ID.
+
+    Raises:
+        HTTPException: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        last_id = payload["id"]
+        key = key_type(payload["key"]) if key_type is not None else None
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return last_id if key_type is None else (key, last_id)
+
+def paginate(query, id_column, skip, limit, cursor, key_column=None, key_type=None):
+    """
+    Apply offset or keyset pagination to a select statement.
+
+    When a cursor is given, rows are selected after the cursor's key and ``skip`` is ignored.
+    Otherwise the legacy ``skip``/``limit`` behaviour is used. Both modes order by ``id_column``,
+    after ``key_column`` if given, so that a cursor can be taken from any page.
+
+    Args:
+        query (Select): The select statement to paginate.
+        id_column (Column): The column the pages are keyed on.
+        skip (int): The number of rows to skip when no cursor is given.
+        limit (int): The maximum number of rows to return.
+        cursor (str): The opaque cursor returned with the previous page, if any.
+        key_column (Column): The column the rows are ordered by before ``id_column``, if any.
+        key_type (callable): Converts the cursor's encoded ``key_column`` value back.
+
+    Returns:
+        Select: The paginated select statement.
+    """
+    if key_column is None:
+        query = query.order_by(id_column).limit(limit)
+        if cursor:
+            return query.where(id_column > decode_cursor(cursor))
+        return query.offset(skip)
+    query = query.order_by(key_column, id_column).limit(limit)
+    if cursor:
+        return query.where(tuple_(key_column, id_column) > tuple_(*decode_cursor(cursor, key_type)))
+    return query.offset(skip)
+
+def set_next_cursor(response, rows, limit, key=None):
+    """
+    Advertise the cursor for the page following ``rows`` in the response headers.
+
+    No header is set when the page is short, since there are no further rows to read.
+
+    Args:
+        response (Response): The response to add the header to.
+        rows (list): The rows of the current page.
+        limit (int): The page size that was requested.
+        key (callable): Gets the JSON-serializable ordering value of a row, for pages ordered
+            by a key column before their ID.
+    """
+    if rows and len(rows) >= limit:
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.id, None if key is None else key(last))
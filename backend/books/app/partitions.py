@@ -0,0 +1,351 @@
+"""
+This module maintains the monthly partitions of the transactions table of the books service.
+
+With ``TRANSACTIONS_PARTITIONED`` enabled on Postgres, ``transactions`` is partitioned by range of
+``rented_at``, one partition per UTC month named ``transactions_pYYYYMM``. Queries that filter on ``rented_at``
+only scan the partitions of the months they cover, and old months can be removed from the
+table as a whole instead of with a slow ``DELETE``.
+
+Transactions looked up by ID alone would be searched for in every partition. Their rental time
+is therefore recorded by ID in ``transaction_locators`` as they are inserted, and
+``transactions_by_id`` reads it first, so that Postgres only searches the partitions holding them.
+
+The service creates the partitions of the coming months at startup, and ``PartitionMaintainer``
+keeps creating them every ``TRANSACTIONS_PARTITION_CHECK_SECONDS`` while it runs. The
+maintenance command does the same and archives old months whose loans have all been returned:
+each is written to a gzipped JSON-lines file, detached from the table without blocking queries
+and dropped.
+
+    python -m app.partitions ensure --months-ahead 3
+    python -m app.partitions archive --keep-months 24 --output-dir /var/backups/transactions
+
+Future partitions must exist before their month starts, since rentals of a month without a
+partition fail, with a 503 from the service; when the service is not running for the whole
+window, run ``ensure`` regularly, for instance daily. There is no default partition, because
+partitions cannot be detached concurrently from a table that has one.
+"""
+
+import argparse
+import asyncio
+import gzip
+import logging
+import os
+import re
+import sys
+from datetime import date, datetime, timezone
+from sqlalchemy import and_, column, delete, func, or_, select, table, text
+from sqlalchemy.exc import DBAPIError
+from . import models
+from .database import TRANSACTIONS_PARTITIONED, engine
+from .export import EXPORT_CHUNK_SIZE, encode_jsonl
+
+MONTHS_AHEAD = int(os.getenv("TRANSACTIONS_PARTITION_MONTHS_AHEAD", "3"))
+PARTITION_CHECK_SECONDS = float(os.getenv("TRANSACTIONS_PARTITION_CHECK_SECONDS", "3600"))
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r"^transactions_p(\d{4})(\d{2})$")
+
+def add_months(month, count):
+    """
+    Move a month forwards or backwards.
+
+    Args:
+        month (date): The first day of the month.
+        count (int): The number of months to move by.
+
+    Returns:
+        date: The first day of the resulting month.
+    """
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def current_month():
+    """
+    Get the current UTC month.
+
+    Returns:
+        date: The first day of the month.
+    """
+    return datetime.now(timezone.utc).date().replace(day=1)
+
+def partition_name(month):
+    """
+    Get the name of the partition of a month.
+
+    Args:
+        month (date): The first day of the month.
+
+    Returns:
+        str: The partition name.
+    """
+    return f"transactions_p{month:%Y%m}"
+
+def list_partitions(connection):
+    """
+    List the monthly partitions of the transactions table.
+
+    Args:
+        connection (Connection): The database connection.
+
+    Returns:
+        list[tuple[str, date]]: The partition names and months, oldest first.
+    """
+    names = connection.scalars(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'transactions'::regclass"
+    ))
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+def ensure_partitions(connection, months_ahead=MONTHS_AHEAD, first_month=None):
+    """
+    Create the monthly partitions that do not exist yet, from a month through the coming months.
+
+    Args:
+        connection (Connection): The database connection. The caller commits.
+        months_ahead (int): The number of months after the current one to create partitions for.
+        first_month (date): The first month to create a partition for. Defaults to the current month.
+
+    Returns:
+        list[str]: The names of the created partitions.
+    """
+    existing = {name for name, _ in list_partitions(connection)}
+    month = first_month or current_month()
+    last_month = add_months(current_month(), months_ahead)
+    created = []
+    while month <= last_month:
+        name = partition_name(month)
+        if name not in existing:
+            if not created:
+                # A new partition gets the foreign key to books, which locks books after transactions,
+                # while rentals lock them the other way around. Locking books first avoids deadlocks.
+                connection.execute(text("LOCK TABLE books IN SHARE ROW EXCLUSIVE MODE"))
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF transactions "
+                f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+            ))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+def is_missing_partition(exc):
+    """
+    Tell whether a database error comes from a row no partition of the transactions table covers.
+
+    Args:
+        exc (Exception): The error.
+
+    Returns:
+        bool: True for a rental of a month without a partition.
+    """
+    return isinstance(exc, DBAPIError) and "no partition of relation" in str(exc.orig)
+
+def transactions_by_id(transaction_ids):
+    """
+    Build the condition that selects transactions by ID.
+
+    On a partitioned table, each ID is matched together with its rental time, read from
+    ``transaction_locators`` by a scalar subquery. Postgres evaluates those before scanning the
+    table and only searches the partitions holding the rental times, whatever plan it picks.
+
+    Args:
+        transaction_ids (list[int]): The IDs of the transactions.
+
+    Returns:
+        ColumnElement: The condition, for the WHERE clause of a SELECT, UPDATE or DELETE of transactions.
+    """
+    if not TRANSACTIONS_PARTITIONED:
+        return models.Transaction.id.in_(transaction_ids)
+    locators = models.transaction_locators
+    return or_(*(
+        and_(
+            models.Transaction.id == transaction_id,
+            models.Transaction.rented_at == select(locators.c.rented_at).where(locators.c.id == transaction_id).scalar_subquery(),
+        )
+        for transaction_id in dict.fromkeys(transaction_ids)
+    ))
+
+def write_archive(connection, name, path, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Write the rows of a partition to a gzipped JSON-lines file, in ID order.
+
+    The file is written under a temporary name and renamed once complete.
+
+    Args:
+        connection (Connection): The database connection.
+        name (str): The partition name.
+        path (str): The path of the archive.
+        chunk_size (int): The number of rows fetched from the cursor and encoded at a time.
+
+    Returns:
+        int: The number of rows written.
+    """
+    columns = models.Transaction.__table__.columns
+    partition = table(name, *(column(c.key, c.type) for c in columns))
+    query = select(*partition.columns).order_by(partition.c.id)
+    rows = 0
+    with gzip.open(path + ".tmp", "wb") as archive:
+        result = connection.execute(query.execution_options(yield_per=chunk_size))
+        for chunk in result.partitions():
+            archive.write(encode_jsonl(chunk))
+            rows += len(chunk)
+    os.replace(path + ".tmp", path)
+    return rows
+
+def detach_partition(connection, name):
+    """
+    Detach a partition from the transactions table without blocking queries on the table.
+
+    ``DETACH PARTITION ... CONCURRENTLY`` cannot run in a transaction, so it is run on a
+    separate connection in autocommit mode. A detach that was interrupted is finished, and tables
+    created before the default partition was removed are detached the blocking way.
+
+    Args:
+        connection (Connection): A database connection, used to find the engine.
+        name (str): The partition name.
+    """
+    with connection.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as autocommit:
+        pending = autocommit.scalar(text(
+            "SELECT i.inhdetachpending FROM pg_inherits i "
+            "WHERE i.inhparent = 'transactions'::regclass AND i.inhrelid = CAST(:name AS regclass)"
+        ), {"name": name})
+        has_default = autocommit.scalar(text(
+            "SELECT EXISTS (SELECT FROM pg_partitioned_table WHERE partrelid = 'transactions'::regclass AND partdefid <> 0)"
+        ))
+        mode = "FINALIZE" if pending else "" if has_default else "CONCURRENTLY"
+        autocommit.execute(text(f"ALTER TABLE transactions DETACH PARTITION {name} {mode}"))
+
+def archive_partitions(connection, keep_months, output_dir, keep_tables=False):
+    """
+    Archive and remove the partitions of the months before the retention window.
+
+    A partition is only archived once all of its loans have been returned. Each one is written
+    to ``<output_dir>/<partition>.jsonl.gz``, detached from the transactions table with
+    ``detach_partition``, removed from the transaction locators and, unless ``keep_tables`` is
+    set, dropped. Every partition is committed separately.
+
+    Args:
+        connection (Connection): The database connection.
+        keep_months (int): The number of months, the current one included, to keep in the table.
+        output_dir (str): The directory to write the archives to.
+        keep_tables (bool): Keep the detached partitions as standalone tables instead of dropping them.
+
+    Returns:
+        list[tuple[str, str]]: The partition names and what happened to them.
+    """
+    cutoff = add_months(current_month(), 1 - keep_months)
+    outcomes = []
+    for name, month in list_partitions(connection):
+        if month >= cutoff:
+            break
+        partition = table(name, column("returned_at"))
+        open_loans = connection.scalar(
+            select(func.count()).select_from(partition).where(partition.c.returned_at.is_(None))
+        )
+        if open_loans:
+            connection.rollback()
+            outcomes.append((name, f"skipped, {open_loans} open loans"))
+            continue
+        path = os.path.join(output_dir, f"{name}.jsonl.gz")
+        rows = write_archive(connection, name, path)
+        connection.commit()
+        detach_partition(connection, name)
+        locators = models.transaction_locators
+        partition = table(name, column("id"))
+        connection.execute(delete(locators).where(locators.c.id == partition.c.id))
+        if not keep_tables:
+            connection.execute(text(f"DROP TABLE {name}"))
+        connection.commit()
+        outcomes.append((name, f"archived {rows} rows to {path}"))
+    return outcomes
+
+class PartitionMaintainer:
+    """
+    Periodically creates the partitions of the coming months while the service runs.
+
+    Args:
+        interval (float): The time between two checks, in seconds. 0 disables the checks.
+        months_ahead (int): The number of months after the current one to keep partitions for.
+    """
+
+    def __init__(self, interval=PARTITION_CHECK_SECONDS, months_ahead=MONTHS_AHEAD):
+        self.interval = interval
+        self.months_ahead = months_ahead
+        self.task = None
+
+    def ensure(self):
+        """
+        Create the missing partitions from the current month through the coming months.
+
+        Returns:
+            list[str]: The names of the created partitions.
+        """
+        with engine.begin() as connection:
+            return ensure_partitions(connection, self.months_ahead)
+
+    async def run(self):
+        """
+        Check every ``interval`` seconds until cancelled. Failed checks are logged and retried.
+        """
+        while True:
+            try:
+                created = await asyncio.to_thread(self.ensure)
+                if created:
+                    logger.info("Created transaction partitions: %s", ", ".join(created))
+            except Exception:
+                logger.exception("Transaction partition check failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """
+        Start checking in the background, unless the table is not partitioned or checks are disabled.
+        """
+        if TRANSACTIONS_PARTITIONED and self.interval > 0:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """
+        Stop checking and wait for the current check to be abandoned.
+        """
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the monthly partitions of the transactions table.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ensure = commands.add_parser("ensure", help="create the partitions of the coming months")
+    ensure.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD, help="months after the current one to cover")
+    ensure.add_argument("--from", dest="first_month", type=lambda value: datetime.strptime(value, "%Y-%m").date(),
+                        help="first month to create, as YYYY-MM (default: the current month)")
+    archive = commands.add_parser("archive", help="archive and remove the partitions of old months")
+    archive.add_argument("--keep-months", type=int, required=True, help="months, the current one included, to keep")
+    archive.add_argument("--output-dir", required=True, help="directory to write the archives to")
+    archive.add_argument("--keep-tables", action="store_true", help="keep detached partitions instead of dropping them")
+    args = parser.parse_args(argv)
+
+    if not TRANSACTIONS_PARTITIONED:
+        print("TRANSACTIONS_PARTITIONED is not enabled for a Postgres database", file=sys.stderr)
+        return 1
+    with engine.connect() as connection:
+        if args.command == "ensure":
+            created = ensure_partitions(connection, args.months_ahead, args.first_month)
+            connection.commit()
+            print(f"created {len(created)} partitions" + (f": {', '.join(created)}" if created else ""))
+        else:
+            os.makedirs(args.output_dir, exist_ok=True)
+            for name, outcome in archive_partitions(connection, args.keep_months, args.output_dir, args.keep_tables):
+                print(f"{name}: {outcome}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+This module builds and serves the "readers also borrowed" recommendations of the books service.
+
+Two books are related when the same readers borrowed both. The rebuild job loads the distinct
+``(user_id, book_id)`` pairs of the whole rental history into a sparse user-by-book matrix
+``B`` and computes the item-item co-occurrence matrix ``Bᵀ·B`` with SciPy, whose entry
+``(i, j)`` counts the readers who borrowed both books. It is computed a block of books at a
+time, and the top neighbours of the books of a block are picked with partial sorts of its rows,
+batched by row length, before the next block is computed. The result is saved as a compact
+CSR-like table of NumPy arrays:
+
+    python -m app.related --output related_books.npz --top-k 20
+
+The service loads the table named by ``RELATED_BOOKS_PATH`` at startup, so that looking up the
+related books is an array search in memory. Passing ``--synthetic N`` builds the table from N
+random transactions instead of the database and reports the wall time and peak memory.
+"""
+
+import argparse
+import os
+import resource
+import sys
+import time
+import numpy as np
+from dotenv import load_dotenv
+from scipy import sparse
+from sqlalchemy import select
+
+load_dotenv()
+
+RELATED_BOOKS_PATH = os.getenv("RELATED_BOOKS_PATH", "related_books.npz")
+DEFAULT_TOP_K = 20
+BUILD_BLOCK_SIZE = 1024
+LOAD_CHUNK_SIZE = 100000
+LENGTH_BUCKET_RATIO = 1.25
+
+class RelatedBooks:
+    """
+    The precomputed neighbours of every book, held in NumPy arrays.
+
+    The neighbours of ``book_ids[i]`` are ``neighbors[indptr[i]:indptr[i + 1]]``, best first,
+    with the number of readers who borrowed both books in ``scores``.
+
+    Args:
+        book_ids (ndarray): The sorted IDs of the books with neighbours.
+        indptr (ndarray): The offsets of each book's neighbours.
+        neighbors (ndarray): The IDs of the neighbouring books.
+        scores (ndarray): The co-borrowing counts of the neighbours.
+    """
+
+    def __init__(self, book_ids, indptr, neighbors, scores):
+        self.book_ids = book_ids
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.scores = scores
+
+    @classmethod
+    def empty(cls):
+        """
+        Create a table without any neighbours.
+
+        Returns:
+            RelatedBooks: The empty table.
+        """
+        return cls(np.empty(0, np.int32), np.zeros(1, np.int64), np.empty(0, np.int32), np.empty(0, np.int32))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a table saved by ``save``.
+
+        Args:
+            path (str): The path of the ``.npz`` file.
+
+        Returns:
+            RelatedBooks: The table, or an empty one if the file does not exist.
+        """
+        if not os.path.exists(path):
+            return cls.empty()
+        with np.load(path) as arrays:
+            return cls(arrays["book_ids"], arrays["indptr"], arrays["neighbors"], arrays["scores"])
+
+    def save(self, path):
+        """
+        Save the table as a compressed ``.npz`` file.
+
+        Args:
+            path (str): The path to write to.
+        """
+        np.savez_compressed(path, book_ids=self.book_ids, indptr=self.indptr, neighbors=self.neighbors, scores=self.scores)
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    def lookup(self, book_id, limit):
+        """
+        Get the neighbours of a book.
+
+        Args:
+            book_id (int): The ID of the book.
+            limit (int): The maximum number of neighbours to return.
+
+        Returns:
+            list[tuple[int, int]]: The neighbouring book IDs and their scores, best first.
+        """
+        index = np.searchsorted(self.book_ids, book_id)
+        if index == len(self.book_ids) or self.book_ids[index] != book_id:
+            return []
+        start = self.indptr[index]
+        end = min(self.indptr[index + 1], start + limit)
+        return list(zip(self.neighbors[start:end].tolist(), self.scores[start:end].tolist()))
+
+def _top_neighbors(cooccurrence, first_row, top_k):
+    # Drop each book's co-occurrence with itself, which sits at column first_row + row.
+    rows = np.repeat(np.arange(cooccurrence.shape[0]), np.diff(cooccurrence.indptr))
+    cooccurrence.data[cooccurrence.indices == rows + first_row] = 0
+    cooccurrence.eliminate_zeros()
+
+    # One integer key ranks the entries of a row by descending score, then by book, and ranks
+    # every entry of a row before those of the next rows. It is followed by a key that ranks last.
+    indptr = cooccurrence.indptr
+    lengths = np.diff(indptr)
+    columns = cooccurrence.shape[1]
+    top_score = int(cooccurrence.data.max()) if cooccurrence.nnz else 0
+    keys = np.empty(cooccurrence.nnz + 1, np.int64)
+    keys[-1] = np.iinfo(np.int64).max
+    row_keys = keys[:-1]
+    row_keys[:] = cooccurrence.data
+    row_keys *= -columns
+    row_keys += cooccurrence.indices
+    row_keys += np.repeat(np.arange(len(lengths), dtype=np.int64) * ((top_score + 1) * columns) + top_score * columns, lengths)
+
+    # Rows with at most top_k entries are kept whole.
+    short_rows = np.flatnonzero(lengths <= top_k)
+    short_lengths = lengths[short_rows]
+    offsets = np.arange(short_lengths.sum()) - np.repeat(np.cumsum(short_lengths) - short_lengths, short_lengths)
+    kept = [np.repeat(indptr[short_rows], short_lengths) + offsets]
+
+    # Longer rows are partitioned together with the rows of about the same length, as windows
+    # as long as the longest of them. Past its end, the window of a row holds keys of the next
+    # rows, which rank after all of its own.
+    long_rows = np.flatnonzero(lengths > top_k)
+    buckets = np.floor(np.log(lengths[long_rows]) / np.log(LENGTH_BUCKET_RATIO)).astype(np.int64)
+    for bucket in np.unique(buckets):
+        bucket_rows = long_rows[buckets == bucket]
+        starts = indptr[bucket_rows, np.newaxis]
+        windows = np.take(keys, starts + np.arange(lengths[bucket_rows].max()), mode="clip")
+        kept.append((starts + np.argpartition(windows, top_k - 1, axis=1)[:, :top_k]).ravel())
+    kept = np.concatenate(kept)
+    kept = kept[np.argsort(keys[kept])]
+    return np.minimum(lengths, top_k), cooccurrence.indices[kept], cooccurrence.data[kept]
+
+def build_related(user_ids, book_ids, top_k=DEFAULT_TOP_K, block_size=BUILD_BLOCK_SIZE):
+    """
+    Compute the top neighbours of every book from who borrowed what.
+
+    The co-occurrence matrix is computed ``block_size`` books at a time, so that only the
+    neighbours kept for the earlier blocks and one block of the full matrix are in memory.
+
+    Args:
+        user_ids (ndarray): The user of each borrowing.
+        book_ids (ndarray): The book of each borrowing. Repeated pairs count once.
+        top_k (int): The number of neighbours to keep per book.
+        block_size (int): The number of books whose co-occurrences are computed at a time.
+
+    Returns:
+        RelatedBooks: The neighbour table.
+    """
+    if len(book_ids) == 0:
+        return RelatedBooks.empty()
+    books, book_index = np.unique(book_ids, return_inverse=True)
+    users, user_index = np.unique(user_ids, return_inverse=True)
+    borrowed = sparse.csr_matrix(
+        (np.ones(len(book_index), np.int32), (user_index, book_index)), shape=(len(users), len(books))
+    )
+    borrowed.sum_duplicates()
+    borrowed.data.fill(1)
+    borrowers = borrowed.T.tocsr()
+
+    counts, neighbors, scores = [], [], []
+    for first_row in range(0, len(books), block_size):
+        block = borrowers[first_row:first_row + block_size] @ borrowed
+        block_counts, block_neighbors, block_scores = _top_neighbors(block, first_row, top_k)
+        counts.append(block_counts)
+        neighbors.append(books[block_neighbors].astype(np.int32))
+        scores.append(block_scores.astype(np.int32))
+    indptr = np.zeros(len(books) + 1, np.int64)
+    np.cumsum(np.concatenate(counts), out=indptr[1:])
+    return RelatedBooks(books.astype(np.int32), indptr, np.concatenate(neighbors), np.concatenate(scores))
+
+def load_borrowing(engine, chunk_size=LOAD_CHUNK_SIZE):
+    """
+    Load the distinct ``(user_id, book_id)`` pairs of the rental history.
+
+    Args:
+        engine (Engine): The database engine to read with.
+        chunk_size (int): The number of rows fetched from the cursor at a time.
+
+    Returns:
+        tuple[ndarray, ndarray]: The user IDs and the book IDs.
+    """
+    # Imported here so that synthetic runs need no database configuration.
+    from . import models
+
+    query = (
+        select(models.Transaction.user_id, models.Transaction.book_id)
+        .where(models.Transaction.user_id.is_not(None), models.Transaction.book_id.is_not(None))
+        .distinct()
+    )
+    chunks = []
+    with engine.connect() as connection:
+        result = connection.execution_options(yield_per=chunk_size).execute(query)
+        for rows in result.partitions():
+            chunks.append(np.array(rows, dtype=np.int64).reshape(-1, 2))
+    pairs = np.concatenate(chunks) if chunks else np.empty((0, 2), np.int64)
+    return pairs[:, 0], pairs[:, 1]
+
+def synthetic_borrowing(transactions, users, books, seed=0):
+    """
+    Generate random borrowings whose book popularity follows a power law, as in real catalogs.
+
+    Args:
+        transactions (int): The number of borrowings.
+        users (int): The number of users.
+        books (int): The number of books.
+        seed (int): The random seed.
+
+    Returns:
+        tuple[ndarray, ndarray]: The user IDs and the book IDs.
+    """
+    rng = np.random.default_rng(seed)
+    popularity = 1.0 / np.arange(1, books + 1) ** 0.8
+    user_ids = rng.integers(1, users + 1, transactions, dtype=np.int32)
+    book_ids = rng.choice(np.arange(1, books + 1, dtype=np.int32), transactions, p=popularity / popularity.sum())
+    return user_ids, book_ids
+
+def peak_memory_mb():
+    """
+    Get the peak resident memory of this process.
+
+    Returns:
+        float: The peak resident set size in MiB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kibibytes, macOS bytes.
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the related books table from the rental history.")
+    parser.add_argument("--output", default=RELATED_BOOKS_PATH, help="path of the table to write")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K, help="neighbours kept per book")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="use N random transactions instead of the database")
+    parser.add_argument("--users", type=int, default=500000, help="number of synthetic users")
+    parser.add_argument("--books", type=int, default=100000, help="number of synthetic books")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.synthetic:
+        user_ids, book_ids = synthetic_borrowing(args.synthetic, args.users, args.books)
+    else:
+        from .database import engine
+
+        user_ids, book_ids = load_borrowing(engine)
+    loaded = time.perf_counter()
+    related = build_related(user_ids, book_ids, args.top_k)
+    built = time.perf_counter()
+    related.save(args.output)
+
+    print(f"loaded {len(book_ids)} borrowings in {loaded - started:.2f}s")
+    print(f"built neighbours of {len(related)} books ({len(related.neighbors)} pairs) in {built - loaded:.2f}s")
+    print(f"total {time.perf_counter() - started:.2f}s, peak memory {peak_memory_mb():.0f} MiB, wrote {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,9 +5,9 @@ These schemas are used to validate incoming data and to define the structure of
 They provide a layer of type checking and data validation between the API and the database models.
 """
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
-from datetime import datetime
+from datetime import date, datetime
 
 class BookBase(BaseModel):
     """
@@ -19,6 +19,7 @@ class BookBase(BaseModel):
     author: str
     description: str
     image_path: Optional[str] = None
+    isbn: Optional[str] = None
     inventory_count: int
 
 class BookCreate(BookBase):
@@ -42,6 +43,134 @@ class Book(BookBase):
     class Config:
         orm_mode = True
 
+# The most IDs a batch lookup may request.
+MAX_BATCH_GET_IDS = 5000
+
+class BatchGetRequest(BaseModel):
+    """
+    Pydantic model for looking up many records by ID at once.
+    """
+    ids: list[int] = Field(..., min_length=1, max_length=MAX_BATCH_GET_IDS)
+
+class BookBatch(BaseModel):
+    """
+    Pydantic model for the result of a batch book lookup.
+
+    ``items`` follows the order of the requested IDs; IDs without a book are listed in ``missing``.
+    """
+    items: list[Book]
+    missing: list[int]
+
+# The most change log entries a change feed request may consume.
+MAX_CHANGES_LIMIT = 1000
+
+class BookChangeEntry(BaseModel):
+    """
+    Pydantic model for one changed book in the catalog change feed.
+
+    ``book`` holds the current state of the book, or is null if the book has been deleted.
+    """
+    book_id: int
+    operation: str
+    book: Optional[Book] = None
+
+class BookChanges(BaseModel):
+    """
+    Pydantic model for a page of the catalog change feed.
+
+    Pass ``cursor`` as ``since`` to get the changes made after this page; ``has_more`` tells
+    whether more changes are already waiting.
+    """
+    changes: list[BookChangeEntry]
+    cursor: str
+    has_more: bool
+
+class BookImportBatch(BaseModel):
+    """
+    Pydantic model for the progress of one batch of a bulk book import.
+    """
+    batch: int
+    rows: int
+    seconds: float
+    rows_per_sec: float
+
+class BookImportError(BaseModel):
+    """
+    Pydantic model for an input line that was rejected by a bulk book import.
+    """
+    line: int
+    error: str
+
+class BookImportSummary(BaseModel):
+    """
+    Pydantic model for the result of a bulk book import.
+
+    Rows that share an ISBN with an existing book update that book instead of creating a new one.
+    """
+    rows_imported: int
+    rows_rejected: int
+    seconds: float
+    rows_per_sec: float
+    batches: list[BookImportBatch]
+    errors: list[BookImportError]
+
+# The longest window, in days, the circulation analytics cover.
+MAX_ANALYTICS_DAYS = 366
+
+class BookPopularity(BaseModel):
+    """
+    Pydantic model for a book's number of rentals over an analytics window.
+    """
+    book_id: int
+    title: str
+    author: str
+    rentals: int
+
+class DailyCirculation(BaseModel):
+    """
+    Pydantic model for the rentals and returns of one day.
+    """
+    day: date
+    rentals: int
+    returns: int
+
+class LoanDuration(BaseModel):
+    """
+    Pydantic model for the duration of the loans that ended in an analytics window.
+
+    ``average_seconds`` is null when no loan ended in the window.
+    """
+    returns: int
+    average_seconds: Optional[float] = None
+
+class CacheStats(BaseModel):
+    """
+    Pydantic model for catalog cache counters.
+
+    ``coalesced`` counts misses that waited for another request's load instead of querying the database.
+    """
+    hits: int
+    misses: int
+    coalesced: int
+
+class PoolStatus(BaseModel):
+    """
+    Pydantic model for the usage and checkout wait statistics of a database connection pool.
+
+    Only ``external_pooler`` is set when pooling is delegated to an external pooler.
+    """
+    external_pooler: bool
+    size: Optional[int] = None
+    max_overflow: Optional[int] = None
+    checked_out: Optional[int] = None
+    checked_in: Optional[int] = None
+    overflow: Optional[int] = None
+    utilization: Optional[float] = None
+    checkouts: Optional[int] = None
+    wait_seconds_total: Optional[float] = None
+    wait_seconds_avg: Optional[float] = None
+    wait_seconds_max: Optional[float] = None
+
 class TransactionBase(BaseModel):
     """
     Base Pydantic model for Transaction data.
@@ -68,6 +197,68 @@ class Transaction(TransactionBase):
     id: int
     rented_at: datetime
     returned_at: Optional[datetime]
+    due_at: Optional[datetime]
+    overdue_at: Optional[datetime]
+
+    class Config:
+        orm_mode = True
+
+class HoldCreate(BaseModel):
+    """
+    Pydantic model for placing a hold on a book.
+    """
+    user_id: int
+
+class Hold(HoldCreate):
+    """
+    Pydantic model for a hold on a book.
+
+    ``transaction_id`` is the rental that served the hold, or null while the hold is pending.
+    """
+    id: int
+    book_id: int
+    position: int
+    created_at: datetime
+    transaction_id: Optional[int]
+    fulfilled_at: Optional[datetime]
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+# The most items a batch rent or return request may contain.
+MAX_BATCH_ITEMS = 100
+
+class BatchRentRequest(BaseModel):
+    """
+    Pydantic model for renting several books for one user at once.
+
+    A book listed more than once is rented that many times.
+    """
+    user_id: int
+    book_ids: list[int] = Field(..., min_length=1, max_length=MAX_BATCH_ITEMS)
+
+class BatchReturnRequest(BaseModel):
+    """
+    Pydantic model for returning several rented books at once.
+    """
+    transaction_ids: list[int] = Field(..., min_length=1, max_length=MAX_BATCH_ITEMS)
+
+class BatchItemResult(BaseModel):
+    """
+    Pydantic model for the outcome of one item of a batch rent or return.
+
+    ``status_code`` and ``detail`` are what the item would have produced as a single request.
+    """
+    book_id: Optional[int] = None
+    transaction_id: Optional[int] = None
+    status_code: int
+    detail: Optional[str] = None
+    transaction: Optional[Transaction] = None
+
+class BatchResult(BaseModel):
+    """
+    Pydantic model for the result of a batch rent or return, with the items in request order.
+    """
+    succeeded: int
+    failed: int
+    items: list[BatchItemResult]
\ No newline at end of file
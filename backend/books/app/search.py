@@ -0,0 +1,72 @@
+"""
+This module builds the catalog search queries for the books service.
+
+On Postgres, matches come from the weighted full-text index (with prefix matching on every
+search term, for autocomplete) and from trigram indexes on title and author (for typo
+tolerance). Other databases, such as the SQLite files used in development, fall back to
+case-insensitive substring matching.
+"""
+
+import re
+from sqlalchemy import case, func, select, text
+from . import models
+
+def to_prefix_tsquery(q):
+    """
+    Turn free text into a ``to_tsquery`` string that prefix-matches every term.
+
+    Args:
+        q (str): The user's search text.
+
+    Returns:
+        str: The query string, e.g. ``"harr:* & pott:*"``, or an empty string if the text
+        contains no searchable terms.
+    """
+    return " & ".join(f"{term}:*" for term in re.findall(r"\w+", q))
+
+def search_books_query(dialect_name, q, limit):
+    """
+    Build a ranked search over book titles, authors and descriptions.
+
+    Args:
+        dialect_name (str): The name of the database dialect the query will run on.
+        q (str): The user's search text.
+        limit (int): The maximum number of books to return.
+
+    Returns:
+        Select: A select statement returning the best matching books first, or None if the
+        text contains no searchable terms.
+    """
+    if dialect_name == "postgresql":
+        tsquery_text = to_prefix_tsquery(q)
+        if not tsquery_text:
+            return None
+        vector = models.book_search_vector()
+        tsquery = func.to_tsquery(text("'english'"), tsquery_text)
+        rank = func.greatest(
+            func.ts_rank(vector, tsquery),
+            func.similarity(models.Book.title, q),
+            func.similarity(models.Book.author, q),
+        )
+        condition = (
+            vector.op("@@")(tsquery)
+            | models.Book.title.op("%")(q)
+            | models.Book.author.op("%")(q)
+        )
+        return select(models.Book).where(condition).order_by(rank.desc(), models.Book.id).limit(limit)
+
+    q = q.strip()
+    if not q:
+        return None
+    rank = case(
+        (models.Book.title.istartswith(q, autoescape=True), 0),
+        (models.Book.title.icontains(q, autoescape=True), 1),
+        (models.Book.author.icontains(q, autoescape=True), 2),
+        else_=3,
+    )
+    condition = (
+        models.Book.title.icontains(q, autoescape=True)
+        | models.Book.author.icontains(q, autoescape=True)
+        | models.Book.description.icontains(q, autoescape=True)
+    )
+    return select(models.Book).where(condition).order_by(rank, models.Book.id).limit(limit)
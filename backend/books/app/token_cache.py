@@ -0,0 +1,77 @@
+"""
+This module provides a process-local cache of verified JWT payloads for the books service.
+
+Decoding a token and checking its HMAC signature on every request is pure overhead once a
+token has been seen, so verified payloads are kept in a bounded LRU keyed by a digest of the
+token. Entries expire at the token's own ``exp`` claim, which means a cached token is never
+accepted for longer than verification itself would have accepted it.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+class TokenCache:
+    """
+    A thread-safe LRU cache of verified token payloads.
+
+    Args:
+        maxsize (int): The maximum number of tokens to remember.
+        default_ttl (float): The lifetime in seconds of entries for tokens without an ``exp`` claim.
+    """
+
+    def __init__(self, maxsize=4096, default_ttl=300):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        """
+        Look up the verified payload of a token.
+
+        Args:
+            token (str): The encoded JWT.
+
+        Returns:
+            dict: The cached payload, or None if the token is unknown or has expired.
+        """
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def set(self, token, payload):
+        """
+        Remember the payload of a token that has just been verified.
+
+        Args:
+            token (str): The encoded JWT.
+            payload (dict): The decoded and verified payload.
+        """
+        if self.maxsize <= 0:
+            return
+        expires_at = payload.get("exp")
+        if not isinstance(expires_at, (int, float)):
+            expires_at = time.time() + self.default_ttl
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,21 @@
+"""
+Benchmarks of the books service.
+
+Each module is a command that seeds a synthetic dataset and reports timings:
+
+    python -m benchmarks.analytics --transactions 50000000
+    python -m benchmarks.async_load
+    python -m benchmarks.pagination --books 1000000
+    python -m benchmarks.pool_sweep --sizes 1 2 5 10 20
+    python -m benchmarks.serialization --rows 100 1000
+
+Benchmarks use the database named by ``DATABASE_URL``, like the service. When it is not set,
+they use a SQLite file in the working directory, so that they run from a checkout without setup.
+"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+os.environ.setdefault("DATABASE_URL", "sqlite:///./benchmark.db")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-of-at-least-32-bytes")
@@ -0,0 +1,170 @@
+"""
+Benchmark of the analytics endpoints' queries on the rollups against aggregating the raw history.
+
+A synthetic history is seeded, the rollups are rebuilt from it with ``app.analytics.rebuild_rollups``,
+and every report is answered both from the rollups, as the endpoints answer it, and by
+aggregating ``transactions`` directly. Both must give the same result, which is checked before
+timing. The rollup queries read at most one row per book and day of their window, so their
+latency should stay flat as the history grows, while the raw aggregations grow with it.
+
+    python -m benchmarks.analytics --transactions 50000000
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, select, text
+from app import models
+from app.analytics import _seconds_between, _utc_day, daily_circulation, loan_duration, rebuild_rollups, top_books, window_start
+from app.database import AsyncSessionLocal, async_engine, engine
+from benchmarks.common import report, seed_books, seed_transactions
+
+def window_since(days):
+    """
+    Get the first instant of a window that ends today.
+
+    Args:
+        days (int): The length of the window, in days, today included.
+
+    Returns:
+        datetime: Midnight UTC of the first day of the window.
+    """
+    return datetime.combine(window_start(days), datetime.min.time(), tzinfo=timezone.utc)
+
+async def raw_top_books(db, days, limit):
+    """
+    Get the most rented books of a window by counting their transactions.
+
+    Args:
+        db (AsyncSession): The database session.
+        days (int): The length of the window, in days, today included.
+        limit (int): The maximum number of books to return.
+
+    Returns:
+        list[dict]: The books and their rental counts, most rented first.
+    """
+    transactions = models.Transaction
+    rentals = func.count()
+    result = await db.execute(
+        select(transactions.book_id, models.Book.title, models.Book.author, rentals.label("rentals"))
+        .join(models.Book, models.Book.id == transactions.book_id)
+        .where(transactions.rented_at >= window_since(days))
+        .group_by(transactions.book_id, models.Book.title, models.Book.author)
+        .order_by(rentals.desc(), transactions.book_id)
+        .limit(limit)
+    )
+    return [row._asdict() for row in result.all()]
+
+async def raw_daily_circulation(db, days):
+    """
+    Get the rentals and returns of every day of a window by counting transactions.
+
+    Args:
+        db (AsyncSession): The database session.
+        days (int): The length of the window, in days, today included.
+
+    Returns:
+        list[dict]: One entry per day, oldest first, including days without any activity.
+    """
+    transactions = models.Transaction
+    dialect_name = db.bind.dialect.name
+    since = window_since(days)
+    totals = {}
+    for column, counter in ((transactions.rented_at, "rentals"), (transactions.returned_at, "returns")):
+        day = _utc_day(column, dialect_name)
+        result = await db.execute(select(day, func.count()).where(column >= since).group_by(day))
+        for row_day, count in result.all():
+            if isinstance(row_day, str):
+                row_day = datetime.strptime(row_day, "%Y-%m-%d").date()
+            totals.setdefault(row_day, {"rentals": 0, "returns": 0})[counter] = count
+    start = window_start(days)
+    circulation = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        circulation.append({"day": day, **totals.get(day, {"rentals": 0, "returns": 0})})
+    return circulation
+
+async def raw_loan_duration(db, days):
+    """
+    Get the average duration of the loans that ended in a window from their transactions.
+
+    Args:
+        db (AsyncSession): The database session.
+        days (int): The length of the window, in days, today included.
+
+    Returns:
+        dict: The number of returns and the average loan duration in seconds.
+    """
+    transactions = models.Transaction
+    seconds = func.round(_seconds_between(transactions.rented_at, transactions.returned_at, db.bind.dialect.name))
+    returns, loan_seconds = (await db.execute(
+        select(func.count(), func.coalesce(func.sum(seconds), 0)).where(transactions.returned_at >= window_since(days))
+    )).one()
+    return {"returns": returns, "average_seconds": float(loan_seconds) / returns if returns else None}
+
+async def time_reports(days, repeat):
+    """
+    Check that both ways of answering each report agree, then time them.
+
+    Args:
+        days (list[int]): The window lengths to report on.
+        repeat (int): The number of times each report is run.
+    """
+    async with AsyncSessionLocal() as db:
+        for window in days:
+            reports = (
+                ("top books", lambda: top_books(db, window, 10), lambda: raw_top_books(db, window, 10)),
+                ("circulation", lambda: daily_circulation(db, window), lambda: raw_daily_circulation(db, window)),
+                ("loan duration", lambda: loan_duration(db, window), lambda: raw_loan_duration(db, window)),
+            )
+            for label, from_rollups, from_history in reports:
+                if await from_rollups() != await from_history():
+                    raise AssertionError(f"The rollups and the history disagree on {label} over {window} days")
+                for source, query in (("rollups", from_rollups), ("raw", from_history)):
+                    samples = []
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        await query()
+                        samples.append(time.perf_counter() - started)
+                    report(f"{label} {window}d {source}", samples)
+
+async def rebuild_and_time(days, repeat):
+    """
+    Rebuild the rollups from the seeded history, then time the reports.
+
+    Args:
+        days (list[int]): The window lengths to report on.
+        repeat (int): The number of times each report is run.
+    """
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        rows = await rebuild_rollups(db)
+        # The planner statistics are refreshed, as autovacuum would do on Postgres.
+        await db.execute(text("ANALYZE"))
+        await db.commit()
+    print(f"rebuilt the rollups ({rows} rows corrected) in {time.perf_counter() - started:.1f}s")
+    await time_reports(days, repeat)
+    await async_engine.dispose()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare analytics answered from the rollups and from the raw history.")
+    parser.add_argument("--transactions", type=int, default=50000000, help="transactions in the history")
+    parser.add_argument("--books", type=int, default=100000, help="books in the catalog")
+    parser.add_argument("--users", type=int, default=500000, help="readers in the synthetic history")
+    parser.add_argument("--years", type=float, default=5, help="length of the history")
+    parser.add_argument("--days", type=int, nargs="+", default=[7, 30, 365], help="report windows, in days")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each report")
+    args = parser.parse_args(argv)
+
+    models.Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    seed_books(engine, args.books)
+    seed_transactions(engine, args.transactions, args.users, args.books, args.years)
+    print(f"seeded in {time.perf_counter() - started:.1f}s")
+    asyncio.run(rebuild_and_time(args.days, args.repeat))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
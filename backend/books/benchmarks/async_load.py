@@ -0,0 +1,186 @@
+"""
+Benchmark of request latency under concurrency with synchronous and asyncio database sessions.
+
+The same page of books is served by two endpoints of a throwaway app: one queries it through a
+synchronous session inside an ``async def`` handler, as the books service did before its
+handlers moved to asyncio sessions, and the other awaits it on the asyncio session the service
+now uses. The app is served by uvicorn on a local port from a child process, requests are sent
+concurrently from this one, and the latency and throughput of each endpoint are reported. While each
+endpoint is under load, a probe keeps calling an endpoint
+that does not touch the database: its latency shows how long the event loop is stalled, which
+is what every other request handled by the worker would wait.
+
+Each request first makes a simulated database round trip of ``--round-trip-ms``: ``pg_sleep`` on
+Postgres, and on SQLite a ``sleep`` run by the driver, on the calling thread for the
+synchronous driver and on its worker thread for aiosqlite, as network I/O would be.
+
+    python -m benchmarks.async_load --requests 2000 --concurrency 50 --round-trip-ms 5
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from contextlib import asynccontextmanager
+import httpx
+import uvicorn
+from fastapi import Depends, FastAPI
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+from app.database import SessionLocal, async_engine, engine, get_async_db
+from benchmarks.common import report, seed_books, start_server
+
+def enable_sqlite_sleep(sync_engine):
+    """
+    Register the ``bench_sleep(seconds)`` SQL function on the SQLite connections of an engine.
+
+    Args:
+        sync_engine (Engine): The engine, or the ``sync_engine`` of an asyncio engine.
+    """
+    @event.listens_for(sync_engine, "connect")
+    def add_sleep(dbapi_connection, connection_record):
+        dbapi_connection.create_function("bench_sleep", 1, lambda seconds: time.sleep(seconds) or 0)
+
+def round_trip_query(dialect_name, seconds):
+    """
+    Build a query that takes a given time on the database side.
+
+    Args:
+        dialect_name (str): The name of the database dialect.
+        seconds (float): How long the query takes.
+
+    Returns:
+        Select: The query.
+    """
+    if dialect_name == "postgresql":
+        return select(func.pg_sleep(seconds))
+    return select(func.bench_sleep(seconds))
+
+def build_app(round_trip_seconds, limit):
+    """
+    Build the app serving the page of books through both kinds of session.
+
+    Args:
+        round_trip_seconds (float): The simulated round trip made before the page query.
+        limit (int): The number of books per page.
+
+    Returns:
+        FastAPI: The app.
+    """
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await async_engine.dispose()
+
+    app = FastAPI(lifespan=lifespan)
+    round_trip = round_trip_query(engine.dialect.name, round_trip_seconds)
+    page = select(models.Book).order_by(models.Book.id).limit(limit)
+
+    @app.get("/sync")
+    async def sync_page():
+        # The session is closed before responding: with a session from a dependency, the
+        # connection would only be released after the response, and once the pool runs dry the
+        # blocked event loop could never run that cleanup.
+        with SessionLocal() as db:
+            db.execute(round_trip)
+            return len(db.execute(page).scalars().all())
+
+    @app.get("/ping")
+    async def ping():
+        return 0
+
+    @app.get("/async")
+    async def async_page(db: AsyncSession = Depends(get_async_db)):
+        await db.execute(round_trip)
+        return len((await db.execute(page)).scalars().all())
+
+    return app
+
+async def load(client, path, requests, concurrency):
+    """
+    Send requests to an endpoint from concurrent clients.
+
+    Args:
+        client (httpx.AsyncClient): The client of the server.
+        path (str): The path of the endpoint.
+        requests (int): The total number of requests.
+        concurrency (int): The number of requests in flight at once.
+
+    Returns:
+        tuple[list[float], float]: The latency of each request and the wall time, in seconds.
+    """
+    remaining = iter(range(requests))
+    latencies = []
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started
+
+async def probe(client, stop, interval=0.01):
+    """
+    Call the endpoint without database work at a steady pace until stopped.
+
+    Args:
+        client (httpx.AsyncClient): The client of the server.
+        stop (asyncio.Event): Set to end the probe.
+        interval (float): The pause between two calls, in seconds.
+
+    Returns:
+        list[float]: The latency of each call, in seconds.
+    """
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/ping")
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+    return latencies
+
+def serve(port, round_trip_seconds, limit):
+    if engine.dialect.name == "sqlite":
+        enable_sqlite_sleep(engine)
+        enable_sqlite_sleep(async_engine.sync_engine)
+    uvicorn.run(build_app(round_trip_seconds, limit), host="127.0.0.1", port=port, log_level="warning")
+
+async def run(args, base_url):
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        for path in ("/sync", "/async"):
+            # Warm up the connection pools before timing.
+            await load(client, path, args.concurrency, args.concurrency)
+            stop = asyncio.Event()
+            probing = asyncio.create_task(probe(client, stop))
+            latencies, elapsed = await load(client, path, args.requests, args.concurrency)
+            stop.set()
+            report(f"{path[1:]} session, {args.concurrency} clients", latencies, elapsed)
+            report(f"  ping during {path[1:]} load", await probing)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare request latency with synchronous and asyncio database sessions.")
+    parser.add_argument("--books", type=int, default=10000, help="books in the catalog")
+    parser.add_argument("--requests", type=int, default=2000, help="requests sent to each endpoint")
+    parser.add_argument("--concurrency", type=int, default=50, help="requests in flight at once")
+    parser.add_argument("--round-trip-ms", type=float, default=5.0, help="simulated database round trip per request")
+    parser.add_argument("--limit", type=int, default=20, help="books per page")
+    args = parser.parse_args(argv)
+
+    models.Base.metadata.create_all(bind=engine)
+    seed_books(engine, args.books)
+    server, base_url = start_server(serve, args.round_trip_ms / 1000, args.limit)
+    try:
+        asyncio.run(run(args, base_url))
+    finally:
+        server.terminate()
+        server.join()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+Helpers shared by the benchmarks: synthetic data, timing reports and a local server.
+
+Synthetic transactions follow the model of ``app.related.synthetic_borrowing``: readers are
+drawn uniformly and book popularity follows a power law.
+"""
+
+import multiprocessing
+import socket
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from sqlalchemy import func, insert, select
+from app import models
+from app.related import synthetic_borrowing
+
+INSERT_CHUNK_SIZE = 50000
+
+def percentile(samples, fraction):
+    """
+    Get a percentile of timing samples.
+
+    Args:
+        samples (list[float]): The samples.
+        fraction (float): The percentile, between 0 and 1.
+
+    Returns:
+        float: The sample at that percentile.
+    """
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def report(label, samples, elapsed=None):
+    """
+    Print the latency distribution of timed operations, and their throughput if the wall time is given.
+
+    Args:
+        label (str): What was timed.
+        samples (list[float]): The duration of each operation, in seconds.
+        elapsed (float): The wall time of the whole run, in seconds.
+    """
+    line = (
+        f"{label:<32} n={len(samples):<7} mean={statistics.fmean(samples) * 1000:8.3f}ms "
+        f"p50={percentile(samples, 0.5) * 1000:8.3f}ms p95={percentile(samples, 0.95) * 1000:8.3f}ms "
+        f"p99={percentile(samples, 0.99) * 1000:8.3f}ms"
+    )
+    if elapsed:
+        line += f" {len(samples) / elapsed:10.1f}/s"
+    print(line)
+
+def insert_chunks(connection, table, rows, chunk_size=INSERT_CHUNK_SIZE):
+    """
+    Insert rows with one batched statement execution per chunk.
+
+    Args:
+        connection (Connection): The database connection. The caller commits.
+        table (Table): The table to insert into.
+        rows (iterable[dict]): The rows.
+        chunk_size (int): The number of rows per statement.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    count = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            connection.execute(insert(table), chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        connection.execute(insert(table), chunk)
+        count += len(chunk)
+    return count
+
+def seed_books(engine, count, seed=0):
+    """
+    Fill the books table up to a number of synthetic books.
+
+    Args:
+        engine (Engine): The synchronous engine to write with.
+        count (int): The number of books the table should hold.
+        seed (int): The random seed.
+
+    Returns:
+        int: The number of books added.
+    """
+    with engine.begin() as connection:
+        existing = connection.scalar(select(func.count()).select_from(models.Book))
+        rng = np.random.default_rng(seed)
+        inventory = rng.integers(0, 10, max(0, count - existing)).tolist()
+        rows = (
+            {
+                "title": f"Synthetic title {number}",
+                "author": f"Author {number % 5000}",
+                "description": f"Description of synthetic book {number}",
+                "isbn": f"bench-{number}",
+                "inventory_count": copies,
+            }
+            for number, copies in enumerate(inventory, start=existing)
+        )
+        return insert_chunks(connection, models.Book.__table__, rows)
+
+def synthetic_transactions(count, users, books, years, seed=0, open_fraction=0.02):
+    """
+    Generate rentals spread evenly over the past years, most of them returned.
+
+    Args:
+        count (int): The number of transactions.
+        users (int): The number of readers.
+        books (int): The number of books; book IDs run from 1 to ``books``.
+        years (float): How far back the history goes.
+        seed (int): The random seed.
+        open_fraction (float): The share of loans that have not been returned.
+
+    Yields:
+        dict: The transaction rows, oldest rental first.
+    """
+    rng = np.random.default_rng(seed)
+    user_ids, book_ids = synthetic_borrowing(count, users, books, seed)
+    now = datetime.now(timezone.utc)
+    span = years * 365 * 86400
+    start = now - timedelta(seconds=span)
+    rented_offsets = np.sort(rng.uniform(0, span, count)).tolist()
+    loan_seconds = (rng.exponential(12 * 86400, count) + 60).astype(np.int64).tolist()
+    is_open = (rng.random(count) < open_fraction).tolist()
+    user_ids, book_ids = user_ids.tolist(), book_ids.tolist()
+    for index in range(count):
+        rented_at = start + timedelta(seconds=rented_offsets[index])
+        returned_at = rented_at + timedelta(seconds=loan_seconds[index])
+        yield {
+            "user_id": user_ids[index],
+            "book_id": book_ids[index],
+            "rented_at": rented_at,
+            "returned_at": None if is_open[index] or returned_at > now else returned_at,
+            "due_at": rented_at + timedelta(days=14),
+        }
+
+def seed_transactions(engine, count, users, books, years, seed=0):
+    """
+    Fill the transactions table up to a number of synthetic transactions.
+
+    Args:
+        engine (Engine): The synchronous engine to write with.
+        count (int): The number of transactions the table should hold.
+        users (int): The number of readers.
+        books (int): The number of books the transactions refer to.
+        years (float): How far back the history goes.
+        seed (int): The random seed.
+
+    Returns:
+        int: The number of transactions added.
+    """
+    with engine.begin() as connection:
+        existing = connection.scalar(select(func.count()).select_from(models.Transaction))
+        missing = max(0, count - existing)
+        if not missing:
+            return 0
+        rows = synthetic_transactions(missing, users, books, years, seed + existing)
+        return insert_chunks(connection, models.Transaction.__table__, rows)
+
+def start_server(target, *args):
+    """
+    Run a server function in a fresh child process on a free local port and wait until it accepts connections.
+
+    The child is spawned rather than forked, so that it reads its configuration from the
+    environment when it imports the service and inherits no open connections.
+
+    Args:
+        target (callable): A module-level function called with the port and ``args``.
+        *args: More arguments for ``target``.
+
+    Returns:
+        tuple[multiprocessing.Process, str]: The server process and its base URL.
+    """
+    with socket.socket() as probe_socket:
+        probe_socket.bind(("127.0.0.1", 0))
+        port = probe_socket.getsockname()[1]
+    server = multiprocessing.get_context("spawn").Process(target=target, args=(port, *args))
+    server.start()
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return server, f"http://127.0.0.1:{port}"
+        except ConnectionRefusedError:
+            if not server.is_alive():
+                raise RuntimeError("The benchmark server failed to start")
+            time.sleep(0.05)
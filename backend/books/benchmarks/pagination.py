@@ -0,0 +1,85 @@
+"""
+Benchmark of page latency at increasing depth with OFFSET and keyset pagination.
+
+Pages of books and of transactions are built with ``app.pagination.paginate``, the way
+``read_books`` and ``read_transactions`` build them, once with ``skip`` and once with the
+cursor of the row just before the page, and timed at each depth.
+
+    python -m benchmarks.pagination --books 1000000 --transactions 2000000
+"""
+
+import argparse
+import sys
+import time
+from sqlalchemy import select
+from app import models
+from app.database import engine
+from app.pagination import encode_cursor, paginate
+from benchmarks.common import report, seed_books, seed_transactions
+
+def depths(total, limit):
+    """
+    Pick page depths spread exponentially over a table, ending with its last page.
+
+    Args:
+        total (int): The number of rows in the table.
+        limit (int): The page size.
+
+    Returns:
+        list[int]: The number of rows before each page.
+    """
+    result = [0]
+    depth = 1000
+    while depth < total - limit:
+        result.append(depth)
+        depth *= 10
+    result.append(max(0, total - limit))
+    return sorted(set(result))
+
+def time_pages(connection, model, total, limit, repeat):
+    """
+    Time the pages of a table at every depth in both pagination modes.
+
+    Args:
+        connection (Connection): The database connection.
+        model (type): The model of the table.
+        total (int): The number of rows in the table.
+        limit (int): The page size.
+        repeat (int): The number of times each page is read.
+    """
+    for depth in depths(total, limit):
+        cursor = None
+        if depth:
+            last_id = connection.scalar(select(model.id).order_by(model.id).offset(depth - 1).limit(1))
+            cursor = encode_cursor(last_id)
+        for mode, skip, page_cursor in (("offset", depth, None), ("keyset", 0, cursor)):
+            query = paginate(select(model), model.id, skip, limit, page_cursor)
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                rows = connection.execute(query).all()
+                samples.append(time.perf_counter() - started)
+            assert len(rows) == min(limit, total - depth)
+            report(f"{model.__tablename__} {mode} depth {depth}", samples)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare page latency at depth with OFFSET and keyset pagination.")
+    parser.add_argument("--books", type=int, default=1000000, help="books in the catalog")
+    parser.add_argument("--transactions", type=int, default=1000000, help="transactions in the history")
+    parser.add_argument("--users", type=int, default=100000, help="readers in the synthetic history")
+    parser.add_argument("--limit", type=int, default=100, help="rows per page")
+    parser.add_argument("--repeat", type=int, default=20, help="reads of each page")
+    args = parser.parse_args(argv)
+
+    models.Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    seed_books(engine, args.books)
+    seed_transactions(engine, args.transactions, args.users, args.books, years=3)
+    print(f"seeded in {time.perf_counter() - started:.1f}s")
+    with engine.connect() as connection:
+        time_pages(connection, models.Book, args.books, args.limit, args.repeat)
+        time_pages(connection, models.Transaction, args.transactions, args.limit, args.repeat)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Benchmark of throughput and checkout waits across connection pool sizes.
+
+For each size in ``--sizes``, the page endpoint of ``benchmarks.async_load`` is served from a
+child process whose asyncio pool is configured through ``DB_POOL_SIZE``, with
+``DB_MAX_OVERFLOW`` set to ``--overflow`` (0 by default, so that the size is the hard limit).
+Concurrent clients load the endpoint, then the pool statistics the service reports on
+``/api/v1/db/stats`` are read from the server, so each size is reported with its throughput,
+latency and the time requests spent waiting for a connection. The size past which throughput
+stops growing while waits vanish is the one to configure, keeping in mind that the database
+serves every worker of every replica.
+
+Each request makes a simulated round trip of ``--round-trip-ms``, as in ``benchmarks.async_load``.
+
+    python -m benchmarks.pool_sweep --sizes 1 2 5 10 20 --concurrency 50 --round-trip-ms 5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import httpx
+import uvicorn
+from app import models
+from app.database import async_engine, engine
+from app.pool import pool_status
+from benchmarks.async_load import build_app, enable_sqlite_sleep, load
+from benchmarks.common import report, seed_books, start_server
+
+def serve(port, round_trip_seconds, limit):
+    if engine.dialect.name == "sqlite":
+        enable_sqlite_sleep(async_engine.sync_engine)
+    app = build_app(round_trip_seconds, limit)
+
+    @app.get("/pool")
+    async def read_pool():
+        return pool_status(async_engine)
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+async def run(args, base_url):
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        # Warm up the pool so that opening connections is not counted as waiting.
+        await load(client, "/async", args.concurrency, args.concurrency)
+        before = (await client.get("/pool")).json()
+        latencies, elapsed = await load(client, "/async", args.requests, args.concurrency)
+        after = (await client.get("/pool")).json()
+    checkouts = after["checkouts"] - before["checkouts"]
+    wait = after["wait_seconds_total"] - before["wait_seconds_total"]
+    return latencies, elapsed, checkouts, wait, after["wait_seconds_max"]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare throughput and pool waits across connection pool sizes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 5, 10, 20], help="pool sizes to try")
+    parser.add_argument("--overflow", type=int, default=0, help="connections allowed beyond the pool size")
+    parser.add_argument("--books", type=int, default=10000, help="books in the catalog")
+    parser.add_argument("--requests", type=int, default=2000, help="requests sent for each size")
+    parser.add_argument("--concurrency", type=int, default=50, help="requests in flight at once")
+    parser.add_argument("--round-trip-ms", type=float, default=5.0, help="simulated database round trip per request")
+    parser.add_argument("--limit", type=int, default=20, help="books per page")
+    args = parser.parse_args(argv)
+
+    models.Base.metadata.create_all(bind=engine)
+    seed_books(engine, args.books)
+    engine.dispose()
+    print(f"{args.concurrency} clients, {args.round_trip_ms} ms round trip, overflow {args.overflow}")
+    for size in args.sizes:
+        # The server process inherits the environment, and reads the pool settings from it on import.
+        os.environ["DB_POOL_SIZE"] = str(size)
+        os.environ["DB_MAX_OVERFLOW"] = str(args.overflow)
+        server, base_url = start_server(serve, args.round_trip_ms / 1000, args.limit)
+        try:
+            latencies, elapsed, checkouts, wait, wait_max = asyncio.run(run(args, base_url))
+        finally:
+            server.terminate()
+            server.join()
+        report(f"pool size {size}", latencies, elapsed)
+        average = wait / checkouts * 1000 if checkouts else 0.0
+        print(f"  pool wait: {checkouts} checkouts, avg {average:.3f}ms, max {wait_max * 1000:.3f}ms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
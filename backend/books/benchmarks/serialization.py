@@ -0,0 +1,132 @@
+"""
+Benchmark of the per-row cost of rendering list responses with and without ``FAST_JSON``.
+
+Pages of synthetic books and transactions are rendered both ways: the default path validates
+the ORM objects against the response model and encodes them as FastAPI does for endpoints
+that return them, and the fast path renders them with ``rows_response``. Both must produce
+the same bytes, which is checked before timing.
+
+    python -m benchmarks.serialization --rows 100 1000 10000
+"""
+
+import argparse
+import asyncio
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from app import models, schemas
+from app.serialization import rows_response
+
+def synthetic_books(count):
+    """
+    Build unsaved books with every response field set.
+
+    Args:
+        count (int): The number of books.
+
+    Returns:
+        list[models.Book]: The books.
+    """
+    created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        models.Book(
+            id=index + 1, title=f"Title {index}", author=f"Author {index % 997}",
+            description="A description of some length, as catalog entries have. " * 3,
+            image_path=f"/images/{index}.jpg", isbn=f"978{index:010d}", inventory_count=index % 7,
+            created_at=created_at + timedelta(seconds=index, microseconds=index % 1000),
+            modified_at=created_at + timedelta(days=1, seconds=index),
+        )
+        for index in range(count)
+    ]
+
+def synthetic_transactions(count):
+    """
+    Build unsaved transactions with every response field set, half of them returned.
+
+    Args:
+        count (int): The number of transactions.
+
+    Returns:
+        list[models.Transaction]: The transactions.
+    """
+    rented_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        models.Transaction(
+            id=index + 1, user_id=index % 5000, book_id=index % 20000,
+            rented_at=rented_at + timedelta(minutes=index),
+            returned_at=rented_at + timedelta(minutes=index, days=9) if index % 2 else None,
+            due_at=rented_at + timedelta(minutes=index, days=14),
+            overdue_at=None,
+        )
+        for index in range(count)
+    ]
+
+def default_body(rows, field, loop):
+    """
+    Render rows as FastAPI renders an endpoint's result with the default response class.
+
+    Args:
+        rows (list): The ORM objects.
+        field (ModelField): The response field of the endpoint.
+        loop (asyncio.AbstractEventLoop): The loop to run FastAPI's serializer on.
+
+    Returns:
+        bytes: The response body.
+    """
+    content = loop.run_until_complete(serialize_response(field=field, response_content=rows))
+    return JSONResponse(content).body
+
+def fast_body(rows, schema):
+    """
+    Render rows with the ``FAST_JSON`` path.
+
+    Args:
+        rows (list): The ORM objects.
+        schema (type[BaseModel]): The response model.
+
+    Returns:
+        bytes: The response body.
+    """
+    return rows_response(rows, schema).body
+
+def time_rendering(label, rows, schema, loop):
+    """
+    Print the per-row rendering time of both paths for a list of rows.
+
+    Args:
+        label (str): What the rows are.
+        rows (list): The ORM objects.
+        schema (type[BaseModel]): The response model.
+        loop (asyncio.AbstractEventLoop): The loop to run FastAPI's serializer on.
+    """
+    field = create_model_field(name="Response", type_=list[schema], mode="serialization")
+    if default_body(rows, field, loop) != fast_body(rows, schema):
+        raise AssertionError(f"FAST_JSON output differs from the default for {label}")
+    number = max(1, 20000 // len(rows))
+    timings = {
+        "default": min(timeit.repeat(lambda: default_body(rows, field, loop), number=number, repeat=5)),
+        "fast": min(timeit.repeat(lambda: fast_body(rows, schema), number=number, repeat=5)),
+    }
+    per_row = {path: seconds / number / len(rows) * 1e6 for path, seconds in timings.items()}
+    print(
+        f"{label + f', {len(rows)} rows':<28} default {per_row['default']:7.2f}us/row  "
+        f"fast {per_row['fast']:7.2f}us/row  {per_row['default'] / per_row['fast']:5.1f}x"
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the per-row cost of default and FAST_JSON list rendering.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000], help="page sizes to render")
+    args = parser.parse_args(argv)
+
+    loop = asyncio.new_event_loop()
+    for count in args.rows:
+        time_rendering("books", synthetic_books(count), schemas.Book, loop)
+        time_rendering("transactions", synthetic_transactions(count), schemas.Transaction, loop)
+    loop.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,23 +5,88 @@ It defines the FastAPI application and all the API endpoints for managing books
 The module includes authentication and authorization checks for protected routes.
 """
 import os
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from datetime import datetime
-from fastapi import FastAPI, Depends, HTTPException, Security
+from typing import Optional
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, Security
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 import jwt
 from dotenv import load_dotenv
 from functools import wraps
 from app import models, schemas
-from app.database import engine, get_db
+from app.analytics import daily_circulation, loan_duration, top_books
+from app.cache import BOOK_ADAPTER, BOOK_LIST_ADAPTER, create_catalog_cache
+from app.changes import change_notifier, changes_since, decode_change_cursor, latest_cursor, record_deletions, record_upserts, stream_changes
+from app.conditional import book_validators, conditional_response, is_conditional, page_validator_query, page_validators, rows_page_validators
+from app.database import TRANSACTIONS_PARTITIONED, AsyncSessionLocal, async_engine, engine, get_async_db, get_read_db, primary_session, read_engines, read_session
+from app.export import EXPORT_MEDIA_TYPES, export_query, stream_export
+from app.holds import cancel_hold, place_hold
+from app.import_books import DEFAULT_BATCH_SIZE, FORMATS, BookImporter, format_from_content_type, iter_request_lines
+from app.inventory import edit_book, rent_copies, rent_copy, return_copies, return_copy
+from app.lookup import MISSING_IDS_HEADER, fetch_by_ids, parse_ids
+from app.metrics import MetricsMiddleware, instrument_engine, is_scrape_authorized, register_pools, render_metrics
+from app.pagination import NEXT_CURSOR_HEADER, paginate, set_next_cursor
+from app.overdue import OverdueSweeper, overdue_query
+from app.partitions import PartitionMaintainer, ensure_partitions, is_missing_partition, transactions_by_id
+from app.pool import pool_status
+from app.related import DEFAULT_TOP_K, RELATED_BOOKS_PATH, RelatedBooks
+from app.search import search_books_query
+from app.serialization import DEFAULT_RESPONSE_CLASS, FAST_JSON, rows_response
+from app.token_cache import TokenCache
 
 
 load_dotenv()
 
 models.Base.metadata.create_all(bind=engine)
+if TRANSACTIONS_PARTITIONED:
+    with engine.begin() as connection:
+        ensure_partitions(connection)
 
-app = FastAPI()
+overdue_sweeper = OverdueSweeper(AsyncSessionLocal)
+partition_maintainer = PartitionMaintainer()
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Run the background tasks of the service while it is up.
+    """
+    overdue_sweeper.start()
+    partition_maintainer.start()
+    yield
+    await partition_maintainer.stop()
+    await overdue_sweeper.stop()
+
+app = FastAPI(default_response_class=DEFAULT_RESPONSE_CLASS, lifespan=lifespan)
+
+# Every engine requests may use, keyed by the pool name reported in the statistics.
+request_engines = {"primary": async_engine}
+request_engines.update((f"replica-{index}", read_engine) for index, read_engine in enumerate(read_engines))
+
+for request_engine in request_engines.values():
+    instrument_engine(request_engine.sync_engine)
+register_pools(request_engines)
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(DBAPIError)
+async def missing_partition_handler(request: Request, exc: DBAPIError):
+    """
+    Answer rentals of a month the transactions table has no partition for with a 503.
+
+    Other database errors are not handled here and still fail the request.
+    """
+    if not is_missing_partition(exc):
+        raise exc
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "No transactions partition covers the current month; run python -m app.partitions ensure"},
+    )
 
 # Define the allowed origins
 origins = [
@@ -36,6 +101,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all HTTP methods (GET, POST, etc.)
     allow_headers=["*"],  # Allow all headers
+    expose_headers=[NEXT_CURSOR_HEADER, MISSING_IDS_HEADER, "ETag"],  # Let browsers read the custom response headers
 )
 
 security = HTTPBearer()
@@ -43,10 +109,32 @@ security = HTTPBearer()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 
+catalog_cache = create_catalog_cache(primary_session)
+
+related_books = RelatedBooks.load(RELATED_BOOKS_PATH)
+
+def publish_book_changes(*book_ids):
+    """
+    Announce committed changes to books: drop them from the cache and wake the change streams.
+
+    Args:
+        *book_ids (int): The IDs of the changed books.
+    """
+    catalog_cache.invalidate_books(*book_ids)
+    change_notifier.notify()
+
+token_cache = TokenCache(maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "4096")))
+
+# The credentials verified for the request being handled and their payload, shared by stacked auth decorators.
+request_auth = ContextVar("request_auth", default=None)
+
 def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)):
     """
     Verifies the JWT token provided in the request.
 
+    Payloads of tokens that have already been verified are served from the token cache
+    until the token expires.
+
     Args:
         credentials (HTTPAuthorizationCredentials): The credentials containing the JWT token.
 
@@ -56,15 +144,41 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Security(security))
     Raises:
         HTTPException: If the token is invalid or expired.
     """
+    token = credentials.credentials
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        print(SECRET_KEY)
-        return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
     except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail=f"Invalid token with secret KEY {SECRET_KEY}")
+        raise HTTPException(status_code=401, detail="Invalid token")
+    token_cache.set(token, payload)
+    return payload
+
+def request_payload(credentials: HTTPAuthorizationCredentials):
+    """
+    Returns the verified token payload for the current request.
+
+    The token is verified at most once per request, however many auth decorators are stacked
+    on the endpoint.
+
+    Args:
+        credentials (HTTPAuthorizationCredentials): The credentials of the current request.
+
+    Returns:
+        dict: The decoded payload of the JWT token.
+
+    Raises:
+        HTTPException: If the token is invalid or expired.
+    """
+    current = request_auth.get()
+    if current is not None and current[0] is credentials:
+        return current[1]
+    payload = verify_token(credentials)
+    request_auth.set((credentials, payload))
+    return payload
 
 def is_authenticated(func):
     """
@@ -83,7 +197,7 @@ def is_authenticated(func):
         credentials = kwargs.get('credentials')
         if not credentials:
             raise HTTPException(status_code=401, detail="Authentication credentials missing")
-        verify_token(credentials)
+        request_payload(credentials)
         #kwargs['user_payload'] = payload
         return await func(*args, **kwargs)
     return wrapper
@@ -106,7 +220,7 @@ def is_admin_or_librarian(func):
         credentials = kwargs.get('credentials')
         if not credentials:
             raise HTTPException(status_code=401, detail="Authentication credentials missing")
-        user_payload=verify_token(credentials)
+        user_payload=request_payload(credentials)
         if not user_payload:
             raise HTTPException(status_code=401, detail="Authentication required")
         user_type = user_payload.get("user_type")
@@ -115,10 +229,34 @@ def is_admin_or_librarian(func):
         return await func(*args, **kwargs)
     return wrapper
 
+def is_admin(func):
+    """
+    Decorator to check if the user is an administrator.
+
+    This decorator checks the user type in the JWT payload and allows access only to
+    administrators.
+
+    Args:
+        func (callable): The function to be decorated.
+
+    Returns:
+        callable: The wrapped function.
+    """
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        credentials = kwargs.get('credentials')
+        if not credentials:
+            raise HTTPException(status_code=401, detail="Authentication credentials missing")
+        user_payload = request_payload(credentials)
+        if user_payload.get("user_type") != "administrator":
+            raise HTTPException(status_code=403, detail="Not authorized")
+        return await func(*args, **kwargs)
+    return wrapper
+
 @app.post("/api/v1/books/", response_model=schemas.Book)
 @is_authenticated
 @is_admin_or_librarian
-async def create_book(book: schemas.BookCreate, db: Session = Depends(get_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+async def create_book(book: schemas.BookCreate, db: AsyncSession = Depends(get_async_db), credentials: HTTPAuthorizationCredentials = Security(security)):
     """
     Create a new book entry.
 
@@ -126,7 +264,7 @@ async def create_book(book: schemas.BookCreate, db: Session = Depends(get_db), c
 
     Args:
         book (schemas.BookCreate): The book data to be created.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
         credentials (HTTPAuthorizationCredentials): The authentication credentials.
 
     Returns:
@@ -134,41 +272,233 @@ async def create_book(book: schemas.BookCreate, db: Session = Depends(get_db), c
     """
     db_book = models.Book(**book.dict())
     db.add(db_book)
-    db.commit()
-    db.refresh(db_book)
+    await db.flush()
+    await record_upserts(db, [db_book.id])
+    await db.commit()
+    await db.refresh(db_book)
+    publish_book_changes(db_book.id)
     return db_book
 
+@app.post("/api/v1/books/bulk", response_model=schemas.BookImportSummary)
+@is_authenticated
+@is_admin_or_librarian
+async def bulk_import_books(request: Request, fmt: Optional[str] = Query(None, alias="format"), batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=50000), db: AsyncSession = Depends(get_async_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Import many books from a CSV or JSON-lines request body.
+
+    This endpoint is protected and only accessible to administrators and librarians.
+    The body is read as a stream and written in batches, so feeds of any size can be uploaded.
+    Rows with the ISBN of an existing book update that book. Invalid rows are skipped and
+    reported in the summary.
+
+    Args:
+        request (Request): The incoming request whose body holds the feed.
+        fmt (str): The feed format, ``csv`` or ``jsonl``. Defaults to the one implied by the Content-Type header.
+        batch_size (int): The number of rows written per statement.
+        db (AsyncSession): The database session.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        schemas.BookImportSummary: The totals, per-batch progress and rejected lines.
+
+    Raises:
+        HTTPException: If the feed format is not supported.
+    """
+    fmt = fmt or format_from_content_type(request.headers.get("content-type"))
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=415, detail="Feed must be CSV (text/csv) or JSON lines (application/x-ndjson)")
+    importer = BookImporter(db, fmt, batch_size)
+    try:
+        async for line in iter_request_lines(request):
+            await importer.add_line(line)
+        return await importer.finish()
+    finally:
+        # Rows are upserted by ISBN, so any cached book may have changed.
+        catalog_cache.invalidate_all()
+        change_notifier.notify()
+
 @app.get("/api/v1/books/", response_model=list[schemas.Book])
 @is_authenticated
-async def read_books(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+async def read_books(request: Request, response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, ids: Optional[str] = None, db: AsyncSession = Depends(get_read_db), credentials: HTTPAuthorizationCredentials = Security(security)):
     """
     Retrieve a list of books.
 
     This endpoint is protected and accessible to all authenticated users.
+    Pages are ordered by ID. When a full page is returned, the cursor for the next page
+    is sent in the ``X-Next-Cursor`` response header.
+    Pages are served from the catalog cache when possible. With ``FAST_JSON`` enabled, the
+    page is rendered with orjson without validating the rows against the response model.
+    The page carries ``ETag`` and ``Last-Modified`` validators; conditional requests whose
+    copy is still current are answered with 304 from an aggregate over the page window,
+    without loading the books.
+
+    When ``ids`` is given, the listed books are returned instead of a page, in the order
+    requested, and the IDs without a book are sent in the ``X-Missing-Ids`` response header.
 
     Args:
-        skip (int): The number of books to skip (for pagination).
+        request (Request): The incoming request, checked for conditional headers.
+        response (Response): The outgoing response, used to set the next-page cursor and validators.
+        skip (int): The number of books to skip (for pagination). Ignored when a cursor is given.
         limit (int): The maximum number of books to return.
-        db (Session): The database session.
+        cursor (str): The cursor returned with the previous page (for keyset pagination).
+        ids (str): Comma-separated IDs of the books to look up, instead of paging.
+        db (AsyncSession): The database session.
         credentials (HTTPAuthorizationCredentials): The authentication credentials.
 
     Returns:
         list[schemas.Book]: A list of book entries.
     """
-    books = db.query(models.Book).offset(skip).limit(limit).all()
+    if ids is not None:
+        books, missing = await fetch_by_ids(db, models.Book, parse_ids(ids))
+        if missing:
+            response.headers[MISSING_IDS_HEADER] = ",".join(map(str, missing))
+        return books
+
+    cache_key = catalog_cache.page_key(skip, limit, cursor)
+    books = catalog_cache.get(cache_key, BOOK_LIST_ADAPTER)
+    if books is None:
+        if is_conditional(request):
+            window = paginate(select(models.Book.id, models.Book.modified_at), models.Book.id, skip, limit, cursor)
+            validators = page_validators(*(await db.execute(page_validator_query(window))).one())
+            not_modified = conditional_response(request, response, *validators)
+            if not_modified is not None:
+                return not_modified
+
+        async def load_books(session):
+            result = await session.execute(paginate(select(models.Book), models.Book.id, skip, limit, cursor))
+            return result.scalars().all()
+
+        books = await catalog_cache.load(cache_key, BOOK_LIST_ADAPTER, load_books, db)
+    set_next_cursor(response, books, limit)
+    not_modified = conditional_response(request, response, *rows_page_validators(books))
+    if not_modified is not None:
+        return not_modified
+    if FAST_JSON:
+        return rows_response(books, schemas.Book, response)
     return books
 
+@app.post("/api/v1/books/batch-get", response_model=schemas.BookBatch)
+@is_authenticated
+async def batch_get_books(lookup: schemas.BatchGetRequest, db: AsyncSession = Depends(get_read_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Look up many books by ID with a single query.
+
+    This endpoint is protected and accessible to all authenticated users.
+
+    Args:
+        lookup (schemas.BatchGetRequest): The IDs of the books to look up.
+        db (AsyncSession): The database session.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        schemas.BookBatch: The books found, in the order requested, and the IDs without a book.
+    """
+    books, missing = await fetch_by_ids(db, models.Book, lookup.ids)
+    return {"items": books, "missing": missing}
+
+@app.get("/api/v1/books/changes", response_model=schemas.BookChanges)
+@is_authenticated
+async def read_book_changes(since: Optional[str] = None, limit: int = Query(500, ge=1, le=schemas.MAX_CHANGES_LIMIT), db: AsyncSession = Depends(get_read_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Get the catalog changes made after a cursor.
+
+    This endpoint is protected and accessible to all authenticated users.
+    Clients sync the catalog once, then keep the returned cursor and pass it back as ``since``
+    to fetch only what changed in the meantime. Each changed book is listed once with its
+    current state, or as a tombstone if it was deleted. Without ``since``, no changes are
+    returned, only the cursor of the latest change to start from.
+
+    Args:
+        since (str): The cursor returned by the previous call.
+        limit (int): The maximum number of change log entries to consume.
+        db (AsyncSession): The database session.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        schemas.BookChanges: The changed books, the next cursor and whether more changes are waiting.
+
+    Raises:
+        HTTPException: If the cursor is invalid.
+    """
+    if since is None:
+        return {"changes": [], "cursor": await latest_cursor(db), "has_more": False}
+    return await changes_since(db, since, limit)
+
+@app.get("/api/v1/books/changes/stream")
+@is_authenticated
+async def stream_book_changes(request: Request, since: Optional[str] = None, db: AsyncSession = Depends(get_read_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Stream catalog and inventory changes as Server-Sent Events.
+
+    This endpoint is protected and accessible to all authenticated users.
+    Every entry of the change log is sent as an event named after the operation, carrying the
+    book ID and its new inventory count, with the entry's cursor as the event ID. A client that
+    reconnects with the ``Last-Event-ID`` header resumes right after the last event it received.
+
+    Args:
+        request (Request): The incoming request, used to open the read sessions.
+        since (str): The cursor to start after. Defaults to ``Last-Event-ID``, then to the latest change.
+        db (AsyncSession): The database session.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        StreamingResponse: The event stream.
+
+    Raises:
+        HTTPException: If the cursor is invalid.
+    """
+    since = since or request.headers.get("last-event-id")
+    if since is None:
+        since = await latest_cursor(db)
+    else:
+        decode_change_cursor(since)
+    return StreamingResponse(
+        stream_changes(lambda: read_session(request), since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/v1/books/search", response_model=list[schemas.Book])
+@is_authenticated
+async def search_books(q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=100), db: AsyncSession = Depends(get_read_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Search the catalog by title, author and description.
+
+    This endpoint is protected and accessible to all authenticated users.
+    Every search term is matched as a prefix, so partial input can be used for autocomplete,
+    and titles and authors that are close to the query text also match, so minor typos are tolerated.
+
+    Args:
+        q (str): The search text.
+        limit (int): The maximum number of books to return.
+        db (AsyncSession): The database session.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        list[schemas.Book]: The matching books, best matches first.
+    """
+    query = search_books_query(db.bind.dialect.name, q, limit)
+    if query is None:
+        return []
+    result = await db.execute(query)
+    return result.scalars().all()
+
 @app.get("/api/v1/books/{book_id}", response_model=schemas.Book)
 @is_authenticated
-async def read_book(book_id: int, db: Session = Depends(get_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+async def read_book(book_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_read_db), credentials: HTTPAuthorizationCredentials = Security(security)):
     """
     Retrieve a specific book by ID.
 
     This endpoint is protected and accessible to all authenticated users.
+    The book is served from the catalog cache when possible.
+    The book carries ``ETag`` and ``Last-Modified`` validators; conditional requests whose
+    copy is still current are answered with 304 after reading only ``modified_at``.
 
     Args:
         book_id (int): The ID of the book to retrieve.
-        db (Session): The database session.
+        request (Request): The incoming request, checked for conditional headers.
+        response (Response): The outgoing response, used to set the validators.
+        db (AsyncSession): The database session.
         credentials (HTTPAuthorizationCredentials): The authentication credentials.
 
     Returns:
@@ -177,15 +507,131 @@ async def read_book(book_id: int, db: Session = Depends(get_db), credentials: HT
     Raises:
         HTTPException: If the book is not found.
     """
-    db_book = db.query(models.Book).filter(models.Book.id == book_id).first()
+    cache_key = catalog_cache.book_key(book_id)
+    db_book = catalog_cache.get(cache_key, BOOK_ADAPTER)
+    if db_book is None:
+        if is_conditional(request):
+            modified_at = await db.scalar(select(models.Book.modified_at).where(models.Book.id == book_id))
+            if modified_at is not None:
+                not_modified = conditional_response(request, response, *book_validators(book_id, modified_at))
+                if not_modified is not None:
+                    return not_modified
+        db_book = await catalog_cache.load(cache_key, BOOK_ADAPTER, lambda session: session.get(models.Book, book_id), db)
     if db_book is None:
         raise HTTPException(status_code=404, detail="Book not found")
+    not_modified = conditional_response(request, response, *book_validators(db_book.id, db_book.modified_at))
+    if not_modified is not None:
+        return not_modified
     return db_book
 
+@app.get("/api/v1/books/{book_id}/loans", response_model=list[schemas.Transaction])
+@is_authenticated
+@is_admin_or_librarian
+async def read_book_loans(book_id: int, db: AsyncSession = Depends(get_read_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Retrieve the open loans of a book, that is, who currently has a copy.
+
+    This endpoint is protected and only accessible to administrators and librarians.
+
+    Args:
+        book_id (int): The ID of the book.
+        db (AsyncSession): The database session.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        list[schemas.Transaction]: The book's unreturned transactions, oldest first.
+
+    Raises:
+        HTTPException: If the book is not found.
+    """
+    result = await db.execute(
+        select(models.Transaction)
+        .where(models.Transaction.book_id == book_id, models.Transaction.returned_at.is_(None))
+        .order_by(models.Transaction.id)
+    )
+    loans = result.scalars().all()
+    if not loans and await db.get(models.Book, book_id) is None:
+        raise HTTPException(status_code=404, detail="Book not found")
+    return loans
+
+@app.get("/api/v1/books/{book_id}/related", response_model=list[schemas.Book])
+@is_authenticated
+async def read_related_books(book_id: int, limit: int = Query(10, ge=1, le=DEFAULT_TOP_K), db: AsyncSession = Depends(get_read_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Get the books most often borrowed by the readers of a book.
+
+    This endpoint is protected and accessible to all authenticated users.
+    The related books are looked up in the table precomputed by ``python -m app.related``
+    and loaded at startup; only the records of the books found are read from the database.
+    Books without recorded co-borrowings have no related books.
+
+    Args:
+        book_id (int): The ID of the book.
+        limit (int): The maximum number of related books to return.
+        db (AsyncSession): The database session.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        list[schemas.Book]: The related books, most often co-borrowed first.
+    """
+    neighbors = related_books.lookup(book_id, limit)
+    books, _ = await fetch_by_ids(db, models.Book, [neighbor_id for neighbor_id, _ in neighbors])
+    return books
+
+@app.post("/api/v1/books/{book_id}/holds", response_model=schemas.Hold)
+@is_authenticated
+async def create_hold(book_id: int, hold: schemas.HoldCreate, db: AsyncSession = Depends(get_async_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Place a hold on an out-of-stock book.
+
+    This endpoint is protected and accessible to all authenticated users.
+    Holds are served in the order they were placed: the next returned copy is rented to the
+    reader of the oldest pending hold, whose ``transaction_id`` then points to the rental.
+
+    Args:
+        book_id (int): The ID of the book to hold.
+        hold (schemas.HoldCreate): The reader placing the hold.
+        db (AsyncSession): The database session.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        schemas.Hold: The created hold.
+
+    Raises:
+        HTTPException: If the book is not found, is available for rent, or the reader already holds it.
+    """
+    return await place_hold(db, book_id, hold.user_id)
+
+@app.get("/api/v1/books/{book_id}/holds", response_model=list[schemas.Hold])
+@is_authenticated
+@is_admin_or_librarian
+async def read_book_holds(book_id: int, limit: int = Query(100, ge=1, le=1000), db: AsyncSession = Depends(get_read_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Retrieve the pending holds on a book, in the order they will be served.
+
+    This endpoint is protected and only accessible to administrators and librarians.
+
+    Args:
+        book_id (int): The ID of the book.
+        limit (int): The maximum number of holds to return.
+        db (AsyncSession): The database session.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        list[schemas.Hold]: The pending holds.
+    """
+    result = await db.scalars(
+        select(models.Hold)
+        .where(models.Hold.book_id == book_id, models.Hold.transaction_id.is_(None))
+        .order_by(models.Hold.position)
+        .limit(limit)
+    )
+    return result.all()
+
 @app.put("/api/v1/books/{book_id}", response_model=schemas.Book)
 @is_authenticated
 @is_admin_or_librarian
-async def update_book(book_id: int, book: schemas.BookCreate, db: Session = Depends(get_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+async def update_book(book_id: int, book: schemas.BookCreate, db: AsyncSession = Depends(get_async_db), credentials: HTTPAuthorizationCredentials = Security(security)):
     """
     Update a book entry.
 
@@ -194,7 +640,7 @@ async def update_book(book_id: int, book: schemas.BookCreate, db: Session = Depe
     Args:
         book_id (int): The ID of the book to update.
         book (schemas.BookCreate): The updated book data.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
         credentials (HTTPAuthorizationCredentials): The authentication credentials.
 
     Returns:
@@ -203,19 +649,14 @@ async def update_book(book_id: int, book: schemas.BookCreate, db: Session = Depe
     Raises:
         HTTPException: If the book is not found.
     """
-    db_book = db.query(models.Book).filter(models.Book.id == book_id).first()
-    if db_book is None:
-        raise HTTPException(status_code=404, detail="Book not found")
-    for key, value in book.dict().items():
-        setattr(db_book, key, value)
-    db.commit()
-    db.refresh(db_book)
+    db_book = await edit_book(db, book_id, book)
+    publish_book_changes(book_id)
     return db_book
 
 @app.delete("/api/v1/books/{book_id}", response_model=schemas.Book)
 @is_authenticated
 @is_admin_or_librarian
-async def delete_book(book_id: int, db: Session = Depends(get_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+async def delete_book(book_id: int, db: AsyncSession = Depends(get_async_db), credentials: HTTPAuthorizationCredentials = Security(security)):
     """
     Delete a book entry.
 
@@ -223,7 +664,7 @@ async def delete_book(book_id: int, db: Session = Depends(get_db), credentials:
 
     Args:
         book_id (int): The ID of the book to delete.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
         credentials (HTTPAuthorizationCredentials): The authentication credentials.
 
     Returns:
@@ -232,16 +673,25 @@ async def delete_book(book_id: int, db: Session = Depends(get_db), credentials:
     Raises:
         HTTPException: If the book is not found.
     """
-    db_book = db.query(models.Book).filter(models.Book.id == book_id).first()
+    # The transactions are loaded up front so that the ORM can detach them
+    # from the book without lazy loading inside the event loop.
+    result = await db.execute(
+        select(models.Book).options(selectinload(models.Book.transactions)).filter(models.Book.id == book_id)
+    )
+    db_book = result.scalars().first()
     if db_book is None:
         raise HTTPException(status_code=404, detail="Book not found")
-    db.delete(db_book)
-    db.commit()
+    await db.execute(delete(models.Hold).where(models.Hold.book_id == book_id))
+    await db.delete(db_book)
+    await db.flush()
+    await record_deletions(db, [book_id])
+    await db.commit()
+    publish_book_changes(book_id)
     return db_book
 
 @app.post("/api/v1/transactions/rent", response_model=schemas.Transaction)
 @is_authenticated
-async def rent_book(transaction: schemas.TransactionCreate, db: Session = Depends(get_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+async def rent_book(transaction: schemas.TransactionCreate, db: AsyncSession = Depends(get_async_db), credentials: HTTPAuthorizationCredentials = Security(security)):
     """
     Rent a book.
 
@@ -249,7 +699,7 @@ async def rent_book(transaction: schemas.TransactionCreate, db: Session = Depend
 
     Args:
         transaction (schemas.TransactionCreate): The transaction data.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
         credentials (HTTPAuthorizationCredentials): The authentication credentials.
 
     Returns:
@@ -258,22 +708,13 @@ async def rent_book(transaction: schemas.TransactionCreate, db: Session = Depend
     Raises:
         HTTPException: If the book is not found or not available for rent.
     """
-    db_book = db.query(models.Book).filter(models.Book.id == transaction.book_id).first()
-    if db_book is None:
-        raise HTTPException(status_code=404, detail="Book not found")
-    if db_book.inventory_count <= 0:
-        raise HTTPException(status_code=400, detail="Book is not available for rent")
-    
-    db_transaction = models.Transaction(**transaction.dict())
-    db_book.inventory_count -= 1
-    db.add(db_transaction)
-    db.commit()
-    db.refresh(db_transaction)
+    db_transaction = await rent_copy(db, transaction)
+    publish_book_changes(db_transaction.book_id)
     return db_transaction
 
 @app.put("/api/v1/transactions/{transaction_id}/return", response_model=schemas.Transaction)
 @is_authenticated
-async def return_book(transaction_id: int, db: Session = Depends(get_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+async def return_book(transaction_id: int, db: AsyncSession = Depends(get_async_db), credentials: HTTPAuthorizationCredentials = Security(security)):
     """
     Return a rented book.
 
@@ -281,7 +722,7 @@ async def return_book(transaction_id: int, db: Session = Depends(get_db), creden
 
     Args:
         transaction_id (int): The ID of the transaction to update.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
         credentials (HTTPAuthorizationCredentials): The authentication credentials.
 
     Returns:
@@ -290,43 +731,225 @@ async def return_book(transaction_id: int, db: Session = Depends(get_db), creden
     Raises:
         HTTPException: If the transaction is not found or the book has already been returned.
     """
-    db_transaction = db.query(models.Transaction).filter(models.Transaction.id == transaction_id).first()
-    if db_transaction is None:
-        raise HTTPException(status_code=404, detail="Transaction not found")
-    if db_transaction.returned_at is not None:
-        raise HTTPException(status_code=400, detail="Book already returned")
-    
-    db_transaction.returned_at = datetime.utcnow()
-    db_book = db.query(models.Book).filter(models.Book.id == db_transaction.book_id).first()
-    db_book.inventory_count += 1
-    db.commit()
-    db.refresh(db_transaction)
+    db_transaction = await return_copy(db, transaction_id)
+    if db_transaction.book_id is not None:
+        publish_book_changes(db_transaction.book_id)
     return db_transaction
 
+@app.post("/api/v1/transactions/rent/batch", response_model=schemas.BatchResult)
+@is_authenticated
+async def rent_books(batch: schemas.BatchRentRequest, db: AsyncSession = Depends(get_async_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Rent several books for one user in a single request and database transaction.
+
+    This endpoint is protected and accessible to all authenticated users.
+    Books that cannot be rented are reported in their item without failing the rest of the batch.
+
+    Args:
+        batch (schemas.BatchRentRequest): The user and the books to rent.
+        db (AsyncSession): The database session.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        schemas.BatchResult: The outcome of each requested book, with the created transactions.
+    """
+    result = await rent_copies(db, batch.user_id, batch.book_ids)
+    publish_book_changes(*(item["book_id"] for item in result["items"] if item["status_code"] == 200))
+    return result
+
+@app.put("/api/v1/transactions/return/batch", response_model=schemas.BatchResult)
+@is_authenticated
+async def return_books(batch: schemas.BatchReturnRequest, db: AsyncSession = Depends(get_async_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Return several rented books in a single request and database transaction.
+
+    This endpoint is protected and accessible to all authenticated users.
+    Transactions that cannot be closed are reported in their item without failing the rest of the batch.
+
+    Args:
+        batch (schemas.BatchReturnRequest): The transactions to close.
+        db (AsyncSession): The database session.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        schemas.BatchResult: The outcome of each transaction, with the updated transactions.
+    """
+    result = await return_copies(db, batch.transaction_ids)
+    publish_book_changes(*(
+        item["transaction"].book_id for item in result["items"]
+        if item["status_code"] == 200 and item["transaction"].book_id is not None
+    ))
+    return result
+
+def transactions_query(user_id=None, book_id=None, active=None, since=None, until=None):
+    """
+    Build the query of the transactions matching the given filters.
+
+    Args:
+        user_id (int): Only return transactions of this user.
+        book_id (int): Only return transactions of this book.
+        active (bool): Only return open loans if true, or only returned books if false.
+        since (datetime): Only return transactions rented at or after this time.
+        until (datetime): Only return transactions rented before this time.
+
+    Returns:
+        Select: The query of the matching transactions.
+    """
+    query = select(models.Transaction)
+    if since is not None:
+        query = query.where(models.Transaction.rented_at >= since)
+    if until is not None:
+        query = query.where(models.Transaction.rented_at < until)
+    if user_id is not None:
+        query = query.where(models.Transaction.user_id == user_id)
+    if book_id is not None:
+        query = query.where(models.Transaction.book_id == book_id)
+    if active is not None:
+        query = query.where(models.Transaction.returned_at.is_(None) if active else models.Transaction.returned_at.is_not(None))
+    return query
+
 @app.get("/api/v1/transactions/", response_model=list[schemas.Transaction])
 @is_authenticated
 @is_admin_or_librarian
-async def read_transactions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+async def read_transactions(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, user_id: Optional[int] = None, book_id: Optional[int] = None, active: Optional[bool] = None, since: Optional[datetime] = None, until: Optional[datetime] = None, db: AsyncSession = Depends(get_read_db), credentials: HTTPAuthorizationCredentials = Security(security)):
     """
     Retrieve a list of transactions.
 
     This endpoint is protected and only accessible to administrators and librarians.
+    Pages are ordered by ID. When a full page is returned, the cursor for the next page
+    is sent in the ``X-Next-Cursor`` response header. With ``FAST_JSON`` enabled, the page is
+    rendered with orjson without validating the rows against the response model.
+    When the transactions table is partitioned, ``since`` and ``until`` limit the scan to
+    the partitions of the months they cover.
+
+    Args:
+        response (Response): The outgoing response, used to set the next-page cursor.
+        skip (int): The number of transactions to skip (for pagination). Ignored when a cursor is given.
+        limit (int): The maximum number of transactions to return.
+        cursor (str): The cursor returned with the previous page (for keyset pagination).
+        user_id (int): Only return transactions of this user.
+        book_id (int): Only return transactions of this book.
+        active (bool): Only return open loans if true, or only returned books if false.
+        since (datetime): Only return transactions rented at or after this time.
+        until (datetime): Only return transactions rented before this time.
+        db (AsyncSession): The database session.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        list[schemas.Transaction]: A list of transaction entries.
+    """
+    query = transactions_query(user_id=user_id, book_id=book_id, active=active, since=since, until=until)
+    result = await db.execute(paginate(query, models.Transaction.id, skip, limit, cursor))
+    transactions = result.scalars().all()
+    set_next_cursor(response, transactions, limit)
+    if FAST_JSON:
+        return rows_response(transactions, schemas.Transaction, response)
+    return transactions
+
+@app.get("/api/v1/transactions/mine", response_model=list[schemas.Transaction])
+@is_authenticated
+async def read_my_transactions(response: Response, limit: int = 100, cursor: Optional[str] = None, active: Optional[bool] = None, since: Optional[datetime] = None, until: Optional[datetime] = None, db: AsyncSession = Depends(get_read_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Retrieve the transactions of the signed-in user.
+
+    This endpoint is protected and accessible to all authenticated users, who only see their own
+    loans: the user is the ``user_id`` claim of the access token. Pages are ordered by ID and
+    the cursor for the next page is sent in the ``X-Next-Cursor`` response header.
 
     Args:
-        skip (int): The number of transactions to skip (for pagination).
+        response (Response): The outgoing response, used to set the next-page cursor.
         limit (int): The maximum number of transactions to return.
-        db (Session): The database session.
+        cursor (str): The cursor returned with the previous page (for keyset pagination).
+        active (bool): Only return open loans if true, or only returned books if false.
+        since (datetime): Only return transactions rented at or after this time.
+        until (datetime): Only return transactions rented before this time.
+        db (AsyncSession): The database session.
         credentials (HTTPAuthorizationCredentials): The authentication credentials.
 
     Returns:
         list[schemas.Transaction]: A list of transaction entries.
+
+    Raises:
+        HTTPException: If the token was issued without a user ID.
     """
-    transactions = db.query(models.Transaction).offset(skip).limit(limit).all()
+    user_id = request_payload(credentials).get("user_id")
+    if user_id is None:
+        # Tokens issued before the claim was added; signing in again issues one that has it.
+        raise HTTPException(status_code=401, detail="Token has no user ID, sign in again")
+    query = transactions_query(user_id=user_id, active=active, since=since, until=until)
+    result = await db.execute(paginate(query, models.Transaction.id, 0, limit, cursor))
+    transactions = result.scalars().all()
+    set_next_cursor(response, transactions, limit)
+    if FAST_JSON:
+        return rows_response(transactions, schemas.Transaction, response)
     return transactions
 
+@app.get("/api/v1/transactions/overdue", response_model=list[schemas.Transaction])
+@is_authenticated
+@is_admin_or_librarian
+async def read_overdue_transactions(response: Response, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None, flagged_since: Optional[datetime] = None, db: AsyncSession = Depends(get_read_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Retrieve the open loans that are past their due date, earliest due first.
+
+    This endpoint is protected and only accessible to administrators and librarians.
+    The loans are read in order from the partial index of open loans by due date and ID. Pass the
+    ``X-Next-Cursor`` header of a page as ``cursor`` to read the next one.
+
+    Args:
+        response (Response): The response, used to advertise the next page's cursor.
+        skip (int): The number of overdue loans to skip (legacy pagination, ignored with ``cursor``).
+        limit (int): The maximum number of overdue loans to return.
+        cursor (str): The cursor of the previous page, for keyset pagination.
+        flagged_since (datetime): Only return the loans the overdue sweeper found overdue at or after this time.
+        db (AsyncSession): The database session.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        list[schemas.Transaction]: The overdue loans.
+    """
+    query = paginate(
+        overdue_query(flagged_since=flagged_since), models.Transaction.id, skip, limit, cursor,
+        key_column=models.Transaction.due_at, key_type=datetime.fromisoformat,
+    )
+    transactions = (await db.scalars(query)).all()
+    set_next_cursor(response, transactions, limit, key=lambda transaction: transaction.due_at.isoformat())
+    if FAST_JSON:
+        return rows_response(transactions, schemas.Transaction, response)
+    return transactions
+
+@app.get("/api/v1/transactions/export")
+@is_authenticated
+@is_admin_or_librarian
+async def export_transactions(request: Request, fmt: str = Query("jsonl", alias="format", pattern="^(jsonl|csv)$"), since: Optional[datetime] = None, until: Optional[datetime] = None, user_id: Optional[int] = None, book_id: Optional[int] = None, credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Export transactions as a stream of JSON lines or CSV.
+
+    This endpoint is protected and only accessible to administrators and librarians.
+    Rows are read through a server-side cursor and sent as they are fetched, so memory use
+    stays constant however many transactions are exported.
+
+    Args:
+        request (Request): The incoming request, used to open the read session.
+        fmt (str): The export format, ``jsonl`` (the default) or ``csv``.
+        since (datetime): Only export transactions rented at or after this time.
+        until (datetime): Only export transactions rented before this time.
+        user_id (int): Only export transactions of this user.
+        book_id (int): Only export transactions of this book.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        StreamingResponse: The exported transactions, in ID order.
+    """
+    query = export_query(since, until, user_id, book_id)
+    return StreamingResponse(
+        stream_export(lambda: read_session(request), query, fmt),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="transactions.{fmt}"'},
+    )
+
 @app.get("/api/v1/transactions/{transaction_id}", response_model=schemas.Transaction)
 @is_authenticated
-async def read_transaction(transaction_id: int, db: Session = Depends(get_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+async def read_transaction(transaction_id: int, db: AsyncSession = Depends(get_read_db), credentials: HTTPAuthorizationCredentials = Security(security)):
     """
     Retrieve a specific transaction by ID.
 
@@ -334,7 +957,7 @@ async def read_transaction(transaction_id: int, db: Session = Depends(get_db), c
 
     Args:
         transaction_id (int): The ID of the transaction to retrieve.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
         credentials (HTTPAuthorizationCredentials): The authentication credentials.
 
     Returns:
@@ -343,7 +966,171 @@ async def read_transaction(transaction_id: int, db: Session = Depends(get_db), c
     Raises:
         HTTPException: If the transaction is not found.
     """
-    db_transaction = db.query(models.Transaction).filter(models.Transaction.id == transaction_id).first()
+    # Transactions are identified by ID alone, even where rented_at is part of the primary key.
+    db_transaction = await db.scalar(select(models.Transaction).where(transactions_by_id([transaction_id])))
     if db_transaction is None:
         raise HTTPException(status_code=404, detail="Transaction not found")
-    return db_transaction
\ No newline at end of file
+    return db_transaction
+
+@app.get("/api/v1/holds/{hold_id}", response_model=schemas.Hold)
+@is_authenticated
+async def read_hold(hold_id: int, db: AsyncSession = Depends(get_read_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Retrieve a hold, to see whether it has been served.
+
+    This endpoint is protected and accessible to all authenticated users.
+
+    Args:
+        hold_id (int): The ID of the hold.
+        db (AsyncSession): The database session.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        schemas.Hold: The hold.
+
+    Raises:
+        HTTPException: If the hold is not found.
+    """
+    db_hold = await db.get(models.Hold, hold_id)
+    if db_hold is None:
+        raise HTTPException(status_code=404, detail="Hold not found")
+    return db_hold
+
+@app.delete("/api/v1/holds/{hold_id}", response_model=schemas.Hold)
+@is_authenticated
+async def delete_hold(hold_id: int, db: AsyncSession = Depends(get_async_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Cancel a pending hold.
+
+    This endpoint is protected and accessible to all authenticated users.
+
+    Args:
+        hold_id (int): The ID of the hold.
+        db (AsyncSession): The database session.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        schemas.Hold: The cancelled hold.
+
+    Raises:
+        HTTPException: If the hold is not found or has already been served.
+    """
+    return await cancel_hold(db, hold_id)
+
+@app.get("/api/v1/analytics/top-books", response_model=list[schemas.BookPopularity])
+@is_authenticated
+@is_admin_or_librarian
+async def read_top_books(days: int = Query(7, ge=1, le=schemas.MAX_ANALYTICS_DAYS), limit: int = Query(10, ge=1, le=100), db: AsyncSession = Depends(get_read_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Get the most rented books of the last days.
+
+    This endpoint is protected and only accessible to administrators and librarians.
+    It is answered from the daily circulation rollups, not from the transaction history.
+
+    Args:
+        days (int): The length of the window, in days, today included.
+        limit (int): The maximum number of books to return.
+        db (AsyncSession): The database session.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        list[schemas.BookPopularity]: The books and their rental counts, most rented first.
+    """
+    return await top_books(db, days, limit)
+
+@app.get("/api/v1/analytics/circulation", response_model=list[schemas.DailyCirculation])
+@is_authenticated
+@is_admin_or_librarian
+async def read_circulation(days: int = Query(30, ge=1, le=schemas.MAX_ANALYTICS_DAYS), book_id: Optional[int] = None, db: AsyncSession = Depends(get_read_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Get the rentals and returns per day of the last days.
+
+    This endpoint is protected and only accessible to administrators and librarians.
+    It is answered from the daily circulation rollups, not from the transaction history.
+
+    Args:
+        days (int): The length of the window, in days, today included.
+        book_id (int): Only count this book, if given.
+        db (AsyncSession): The database session.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        list[schemas.DailyCirculation]: One entry per day, oldest first.
+    """
+    return await daily_circulation(db, days, book_id)
+
+@app.get("/api/v1/analytics/loan-duration", response_model=schemas.LoanDuration)
+@is_authenticated
+@is_admin_or_librarian
+async def read_loan_duration(days: int = Query(30, ge=1, le=schemas.MAX_ANALYTICS_DAYS), book_id: Optional[int] = None, db: AsyncSession = Depends(get_read_db), credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Get the average duration of the loans that ended in the last days.
+
+    This endpoint is protected and only accessible to administrators and librarians.
+    It is answered from the daily circulation rollups, not from the transaction history.
+
+    Args:
+        days (int): The length of the window, in days, today included.
+        book_id (int): Only count this book, if given.
+        db (AsyncSession): The database session.
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        schemas.LoanDuration: The number of returns and the average loan duration in seconds.
+    """
+    return await loan_duration(db, days, book_id)
+
+@app.get("/api/v1/cache/stats", response_model=schemas.CacheStats)
+@is_authenticated
+@is_admin
+async def read_cache_stats(credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Retrieve the catalog cache's hit, miss and coalesced-miss counters for this worker.
+
+    This endpoint is protected and only accessible to administrators.
+
+    Args:
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        schemas.CacheStats: The cache counters.
+    """
+    return catalog_cache.stats()
+
+@app.get("/api/v1/db/stats", response_model=dict[str, schemas.PoolStatus])
+@is_authenticated
+@is_admin
+async def read_db_stats(credentials: HTTPAuthorizationCredentials = Security(security)):
+    """
+    Retrieve connection pool usage and checkout wait statistics.
+
+    This endpoint is protected and only accessible to administrators.
+
+    Args:
+        credentials (HTTPAuthorizationCredentials): The authentication credentials.
+
+    Returns:
+        dict[str, schemas.PoolStatus]: The statistics of each database pool, keyed by pool name.
+    """
+    return {name: pool_status(request_engine) for name, request_engine in request_engines.items()}
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics(authorization: Optional[str] = Header(default=None)):
+    """
+    Expose request, database and connection pool metrics in the Prometheus text format.
+
+    Scrapers authenticate with the ``METRICS_TOKEN`` bearer token rather than a user token.
+
+    Args:
+        authorization (Optional[str]): The Authorization header of the scrape.
+
+    Returns:
+        Response: The current metrics.
+
+    Raises:
+        HTTPException: If the scrape does not present the metrics token.
+    """
+    if not is_scrape_authorized(authorization):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+    content, media_type = render_metrics()
+    return Response(content=content, media_type=media_type)
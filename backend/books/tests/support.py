@@ -0,0 +1,77 @@
+"""
+Helpers shared by the tests of the books service.
+"""
+
+import time
+from contextlib import contextmanager
+import jwt
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from app import models
+from app.database import SQLALCHEMY_ASYNC_DATABASE_URL, async_engine, engine
+from main import ALGORITHM, SECRET_KEY
+
+def create_book(inventory_count, **fields):
+    """
+    Insert a book directly into the database.
+
+    Args:
+        inventory_count (int): The number of copies on the shelf.
+        **fields: Other column values.
+
+    Returns:
+        int: The ID of the book.
+    """
+    with engine.begin() as connection:
+        return connection.scalar(
+            insert(models.Book)
+            .values(title="Test book", author="Test author", inventory_count=inventory_count, **fields)
+            .returning(models.Book.id)
+        )
+
+def auth_headers(user_type, username="tester", user_id=None):
+    """
+    Build the Authorization header of a request made by a user of the given type.
+
+    Args:
+        user_type (str): The user type carried by the access token.
+        username (str): The subject of the token.
+        user_id (int): The user ID carried by the token, left out when None.
+
+    Returns:
+        dict: The request headers.
+    """
+    payload = {"sub": username, "user_type": user_type, "type": "access", "exp": int(time.time()) + 3600}
+    if user_id is not None:
+        payload["user_id"] = user_id
+    return {"Authorization": f"Bearer {jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)}"}
+
+def new_sessionmaker():
+    """
+    Create a session factory with its own engine, for use from a single thread and event loop.
+
+    Returns:
+        tuple[AsyncEngine, async_sessionmaker]: The engine, to dispose after use, and the session factory.
+    """
+    async_engine = create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL, poolclass=NullPool)
+    return async_engine, async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+@contextmanager
+def captured_statements():
+    """
+    Capture the statements the application runs on the async engine.
+
+    Yields:
+        list[tuple[str, object]]: The statements and their parameters, in execution order.
+    """
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", capture)
@@ -0,0 +1,33 @@
+"""
+Tests of the access rules of the operational endpoints.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from app import metrics
+from main import app
+from tests.support import auth_headers
+
+@pytest.fixture
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.mark.parametrize("path", ["/api/v1/cache/stats", "/api/v1/db/stats"])
+def test_stats_are_restricted_to_administrators(client, path):
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers=auth_headers("member")).status_code == 403
+    assert client.get(path, headers=auth_headers("librarian")).status_code == 403
+    assert client.get(path, headers=auth_headers("administrator")).status_code == 200
+
+def test_metrics_require_the_scrape_token(client, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "")
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 401
+
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "scrape-token")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics", headers=auth_headers("administrator")).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+    assert response.status_code == 200
+    assert "http_request_duration_seconds" in response.text
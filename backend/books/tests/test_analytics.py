@@ -0,0 +1,85 @@
+"""
+Tests of the circulation rollups: their incremental upkeep and their rebuild next to running writers.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import delete, insert, select, update
+from app import models, schemas
+from app.analytics import rebuild_rollups, record_rentals
+from app.database import engine
+from app.inventory import rent_copy, return_copy
+from tests.support import create_book, new_sessionmaker
+
+def run(coroutine_function):
+    async def with_sessions():
+        async_engine, session_factory = new_sessionmaker()
+        try:
+            return await coroutine_function(session_factory)
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(with_sessions())
+
+def rollups():
+    stats = models.BookDailyStats
+    with engine.connect() as connection:
+        return connection.execute(
+            select(stats.book_id, stats.day, stats.rentals, stats.returns, stats.loan_seconds).order_by(stats.book_id, stats.day)
+        ).all()
+
+def test_rebuild_corrects_drifted_rollups_to_the_incremental_counts():
+    first_book_id, second_book_id = create_book(3), create_book(3)
+
+    async def circulate(session_factory):
+        for book_id in (first_book_id, first_book_id, second_book_id):
+            async with session_factory() as db:
+                rental = await rent_copy(db, schemas.TransactionCreate(user_id=1, book_id=book_id))
+        async with session_factory() as db:
+            await return_copy(db, rental.id)
+
+    run(circulate)
+    incremental = rollups()
+    stats = models.BookDailyStats
+    with engine.begin() as connection:
+        connection.execute(update(stats).where(stats.book_id == first_book_id).values(rentals=7))
+        connection.execute(delete(stats).where(stats.book_id == second_book_id))
+        connection.execute(insert(stats).values(book_id=first_book_id, day=datetime(2020, 1, 1).date(), rentals=1, returns=0, loan_seconds=0))
+
+    async def rebuild(session_factory):
+        async with session_factory() as db:
+            return await rebuild_rollups(db, batch_size=1)
+
+    assert run(rebuild) == 3
+    assert rollups() == incremental
+    assert [(row.rentals, row.returns) for row in incremental] == [(2, 0), (1, 1)]
+    assert run(rebuild) == 0
+
+@pytest.mark.skipif(engine.dialect.name != "postgresql", reason="SQLite serializes writers")
+def test_rental_committed_during_a_rebuild_is_counted_once():
+    book_id = create_book(3)
+
+    async def scenario(session_factory):
+        async with session_factory() as db:
+            await rent_copy(db, schemas.TransactionCreate(user_id=1, book_id=book_id))
+        async with session_factory() as db:
+            await db.execute(update(models.BookDailyStats).values(rentals=5))
+            await db.commit()
+        async with session_factory() as writer, session_factory() as rebuilder:
+            # The writer's rental holds the lock of the rollup row the rebuild has to correct.
+            rented_at = datetime.now(timezone.utc)
+            rental = await writer.scalar(
+                insert(models.Transaction)
+                .values(user_id=2, book_id=book_id, rented_at=rented_at, due_at=rented_at + timedelta(days=14))
+                .returning(models.Transaction)
+            )
+            await record_rentals(writer, [rental])
+            rebuild = asyncio.create_task(rebuild_rollups(rebuilder))
+            await asyncio.sleep(0.5)
+            assert not rebuild.done()
+            await writer.commit()
+            return await rebuild
+
+    assert run(scenario) == 1
+    assert [row.rentals for row in rollups()] == [2]
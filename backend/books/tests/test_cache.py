@@ -0,0 +1,105 @@
+"""
+Tests of the catalog cache's consistency with writes made by other workers, and of loads
+shared by concurrent requests.
+
+Two ``CatalogCache`` instances sharing one ``FakeRedisClient`` stand for two workers sharing Redis.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from app.cache import BOOK_ADAPTER, CatalogCache, FakeRedisClient, RedisCache
+
+BOOK = {
+    "id": 1, "title": "Cached", "author": "Author", "description": "", "inventory_count": 3,
+    "created_at": "2024-01-01T00:00:00", "modified_at": "2024-01-01T00:00:00",
+}
+
+def book_row(**fields):
+    return BOOK_ADAPTER.validate_python({**BOOK, **fields})
+
+def shared_caches(backend=None):
+    backend = backend or RedisCache(client=FakeRedisClient())
+    return CatalogCache(backend), CatalogCache(backend)
+
+def test_load_that_raced_with_another_workers_write_is_not_stored():
+    worker, other_worker = shared_caches()
+    key = worker.book_key(1)
+
+    async def loader(session):
+        # The row is read, then another worker commits a change to it and invalidates.
+        row = book_row(title="Before the write")
+        other_worker.invalidate_books(1)
+        return row
+
+    value = asyncio.run(worker.load(key, BOOK_ADAPTER, loader, None))
+    assert value.title == "Before the write"
+    assert worker.get(key, BOOK_ADAPTER) is None
+
+def test_invalidation_between_check_and_store_drops_the_entry():
+    class InvalidatingOnSet(RedisCache):
+        def set(self, key, value, ttl=None):
+            other_worker.invalidate_books(1)
+            super().set(key, value, ttl)
+
+    backend = InvalidatingOnSet(client=FakeRedisClient())
+    worker, other_worker = shared_caches(backend)
+    key = worker.book_key(1)
+
+    async def loader(session):
+        return book_row()
+
+    asyncio.run(worker.load(key, BOOK_ADAPTER, loader, None))
+    assert backend.get(key) is None
+
+def test_load_without_a_concurrent_write_is_stored():
+    worker, other_worker = shared_caches()
+    key = worker.book_key(1)
+
+    async def loader(session):
+        return book_row()
+
+    asyncio.run(worker.load(key, BOOK_ADAPTER, loader, None))
+    assert other_worker.get(key, BOOK_ADAPTER).title == "Cached"
+
+def test_cache_fills_go_to_the_primary():
+    used = []
+
+    @asynccontextmanager
+    async def primary_session(session):
+        yield "primary"
+
+    async def loader(session):
+        used.append(session)
+        return book_row()
+
+    cache = CatalogCache(RedisCache(client=FakeRedisClient()), primary_session=primary_session)
+    asyncio.run(cache.load(cache.book_key(1), BOOK_ADAPTER, loader, "replica"))
+    disabled = CatalogCache(None, primary_session=primary_session)
+    asyncio.run(disabled.load(disabled.book_key(1), BOOK_ADAPTER, loader, "replica"))
+    # Uncached reads keep using the request's session, which may be on a replica.
+    assert used == ["primary", "replica"]
+
+def test_waiters_take_over_the_load_of_a_cancelled_request():
+    cache = CatalogCache(RedisCache(client=FakeRedisClient()))
+    key = cache.book_key(1)
+    sessions = []
+
+    async def loader(session):
+        sessions.append(session)
+        await asyncio.sleep(10 if session == "cancelled" else 0.01)
+        return book_row()
+
+    async def scenario():
+        first = asyncio.create_task(cache.load(key, BOOK_ADAPTER, loader, "cancelled"))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(cache.load(key, BOOK_ADAPTER, loader, f"waiter {n}")) for n in range(2)]
+        await asyncio.sleep(0)
+        first.cancel()
+        values = await asyncio.gather(*waiters)
+        return first.cancelled(), values
+
+    cancelled, values = asyncio.run(scenario())
+    assert cancelled and [value.title for value in values] == ["Cached", "Cached"]
+    # One waiter ran the load again and the other one waited for it.
+    assert sessions == ["cancelled", "waiter 0"]
+    assert cache.get(key, BOOK_ADAPTER).title == "Cached"
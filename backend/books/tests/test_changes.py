@@ -0,0 +1,95 @@
+"""
+Tests of the catalog change feed's cursor under concurrent writers.
+"""
+
+import asyncio
+import pytest
+from sqlalchemy import text, update
+from app import models, schemas
+from app.changes import changes_since, latest_cursor, record_upserts
+from app.database import engine
+from app.inventory import rent_copy
+from tests.support import create_book, new_sessionmaker
+
+def run(coroutine_function):
+    async def with_sessions():
+        async_engine, session_factory = new_sessionmaker()
+        try:
+            return await coroutine_function(session_factory)
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(with_sessions())
+
+async def change_book(db, book_id, inventory_count):
+    await db.execute(update(models.Book).where(models.Book.id == book_id).values(inventory_count=inventory_count))
+    await record_upserts(db, [book_id])
+
+def test_feed_returns_changes_after_the_cursor_once():
+    book_id = create_book(2)
+
+    async def scenario(session_factory):
+        async with session_factory() as db:
+            start = await latest_cursor(db)
+        async with session_factory() as db:
+            await rent_copy(db, schemas.TransactionCreate(user_id=1, book_id=book_id))
+        async with session_factory() as db:
+            first = await changes_since(db, start, 100)
+            second = await changes_since(db, first["cursor"], 100)
+            latest = await latest_cursor(db)
+        return first, second, latest
+
+    first, second, latest = run(scenario)
+    assert [(change["book_id"], change["book"].inventory_count) for change in first["changes"]] == [(book_id, 1)]
+    assert second["changes"] == [] and second["cursor"] == first["cursor"]
+    assert latest == first["cursor"]
+
+@pytest.mark.skipif(engine.dialect.name != "postgresql", reason="SQLite serializes writers")
+def test_change_committed_late_with_a_lower_id_is_not_skipped():
+    late_book_id, early_book_id = create_book(1), create_book(1)
+
+    async def scenario(session_factory):
+        async with session_factory() as db:
+            start = await latest_cursor(db)
+        async with session_factory() as early, session_factory() as late:
+            # The transaction that commits first was assigned its transaction ID first, but the
+            # one that commits last logs its change first, and so with the lower change ID.
+            await early.execute(text("SELECT pg_current_xact_id()"))
+            await late.execute(text("SELECT pg_current_xact_id()"))
+            await change_book(late, late_book_id, 5)
+            await change_book(early, early_book_id, 7)
+            await early.commit()
+            async with session_factory() as reader:
+                while_late_runs = await changes_since(reader, start, 100)
+            await late.commit()
+        async with session_factory() as reader:
+            after_both = await changes_since(reader, while_late_runs["cursor"], 100)
+        return while_late_runs, after_both
+
+    while_late_runs, after_both = run(scenario)
+    # A cursor keyed on the change ID alone would have skipped the late change.
+    assert [change["book_id"] for change in while_late_runs["changes"]] == [early_book_id]
+    assert [change["book_id"] for change in after_both["changes"]] == [late_book_id]
+
+@pytest.mark.skipif(engine.dialect.name != "postgresql", reason="SQLite serializes writers")
+def test_changes_of_running_transactions_hold_back_the_feed():
+    first_book_id, second_book_id = create_book(1), create_book(1)
+
+    async def scenario(session_factory):
+        async with session_factory() as db:
+            start = await latest_cursor(db)
+        async with session_factory() as running, session_factory() as committed:
+            await change_book(running, first_book_id, 3)
+            await change_book(committed, second_book_id, 4)
+            await committed.commit()
+            async with session_factory() as reader:
+                held_back = await changes_since(reader, start, 100)
+                held_back_latest = await latest_cursor(reader)
+            await running.commit()
+        async with session_factory() as reader:
+            released = await changes_since(reader, start, 100)
+        return start, held_back, held_back_latest, released
+
+    start, held_back, held_back_latest, released = run(scenario)
+    assert held_back["changes"] == [] and held_back_latest == start
+    assert sorted(change["book_id"] for change in released["changes"]) == sorted([first_book_id, second_book_id])
@@ -0,0 +1,94 @@
+"""
+Tests of the hold queues against the other writers of a book's inventory: imports and returns.
+"""
+
+import asyncio
+import json
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+import main
+from app import models, schemas
+from app.database import engine
+from app.holds import assign_copies, cancel_hold, place_hold
+from tests.support import auth_headers, create_book, new_sessionmaker
+
+def run(coroutine_function):
+    async def with_sessions():
+        async_engine, session_factory = new_sessionmaker()
+        try:
+            return await coroutine_function(session_factory)
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(with_sessions())
+
+def holds(book_id):
+    with engine.connect() as connection:
+        return connection.execute(select(models.Hold).where(models.Hold.book_id == book_id).order_by(models.Hold.position)).all()
+
+def test_imported_copies_serve_pending_holds_before_the_shelf():
+    book_id = create_book(0, description="", isbn="9780441013593")
+
+    async def hold(session_factory):
+        async with session_factory() as db:
+            await place_hold(db, book_id, 7)
+
+    run(hold)
+    feed = [{"title": "Dune", "author": "Frank Herbert", "description": "Arrakis", "isbn": "9780441013593", "inventory_count": 2}]
+    with TestClient(main.app) as client:
+        response = client.post(
+            "/api/v1/books/bulk", content="\n".join(map(json.dumps, feed)),
+            headers={**auth_headers("librarian"), "Content-Type": "application/x-ndjson"},
+        )
+        assert response.status_code == 200 and response.json()["rows_imported"] == 1
+        [served] = holds(book_id)
+        loan = client.get(f"/api/v1/transactions/{served.transaction_id}", headers=auth_headers("librarian")).json()
+        assert (loan["user_id"], loan["book_id"], loan["returned_at"]) == (7, book_id, None)
+        # One of the two imported copies went to the hold, the other one is on the shelf.
+        book = client.get(f"/api/v1/books/{book_id}", headers=auth_headers("member")).json()
+        assert book["inventory_count"] == 1
+
+def test_import_lowers_the_inventory_of_an_existing_book():
+    book_id = create_book(4, description="", isbn="9780441013594")
+    feed = "title,author,description,isbn,inventory_count\nDune,Frank Herbert,Arrakis,9780441013594,1\n"
+    with TestClient(main.app) as client:
+        response = client.post("/api/v1/books/bulk", content=feed, headers={**auth_headers("librarian"), "Content-Type": "text/csv"})
+        assert response.status_code == 200
+        assert client.get(f"/api/v1/books/{book_id}", headers=auth_headers("member")).json()["inventory_count"] == 1
+
+@pytest.mark.skipif(engine.dialect.name != "postgresql", reason="SQLite serializes writers")
+def test_hold_served_while_it_is_cancelled_is_kept():
+    book_id = create_book(0)
+
+    async def scenario(session_factory):
+        async with session_factory() as db:
+            db_hold = await place_hold(db, book_id, 7)
+        async with session_factory() as returner, session_factory() as canceller:
+            # A returned copy is being handed to the hold, with the book locked until the return commits.
+            await assign_copies(returner, {book_id: 1})
+            cancel = asyncio.create_task(cancel_hold(canceller, db_hold.id))
+            await asyncio.sleep(0.5)
+            assert not cancel.done()
+            await returner.commit()
+            with pytest.raises(HTTPException) as error:
+                await cancel
+        return error.value
+
+    error = run(scenario)
+    assert (error.status_code, error.detail) == (400, "Hold already fulfilled")
+    [served] = holds(book_id)
+    assert served.transaction_id is not None
+
+def test_pending_hold_is_cancelled():
+    book_id = create_book(0)
+
+    async def scenario(session_factory):
+        async with session_factory() as db:
+            db_hold = await place_hold(db, book_id, 7)
+        async with session_factory() as db:
+            return await cancel_hold(db, db_hold.id)
+
+    assert run(scenario).user_id == 7
+    assert holds(book_id) == []
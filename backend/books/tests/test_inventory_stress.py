@@ -0,0 +1,232 @@
+"""
+Stress tests of the atomic rent and return paths under concurrent requests.
+
+Worker threads each run their own event loop and database connections and rent (and return)
+copies of the same books at once, place holds on them and edit their inventory. The inventory
+must end up exactly where the successful operations put it, and the hold queues consistent
+with it. The throughput is printed; run with ``-s`` to see it.
+"""
+
+import asyncio
+import threading
+import time
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select, update
+from app import models, schemas
+from app.database import engine
+from app.holds import place_hold
+from app.inventory import edit_book, rent_copies, rent_copy, return_copy
+from tests.support import create_book, new_sessionmaker
+
+THREADS = 8
+
+def run_threads(worker, threads=THREADS):
+    """
+    Run a coroutine function in several threads at once, each with its own event loop.
+
+    Args:
+        worker (callable): A coroutine function taking the thread's index.
+        threads (int): The number of threads.
+
+    Returns:
+        tuple[list, float]: The results in thread order and the wall time in seconds.
+    """
+    results = [None] * threads
+    errors = []
+    start = threading.Barrier(threads)
+
+    def target(index):
+        try:
+            start.wait()
+            results[index] = asyncio.run(worker(index))
+        except BaseException as exc:
+            errors.append(exc)
+
+    pool = [threading.Thread(target=target, args=(index,)) for index in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        raise errors[0]
+    return results, elapsed
+
+def inventory(book_id):
+    with engine.connect() as connection:
+        return connection.scalar(select(models.Book.inventory_count).where(models.Book.id == book_id))
+
+def open_loans(book_id):
+    with engine.connect() as connection:
+        return connection.scalar(
+            select(func.count())
+            .select_from(models.Transaction)
+            .where(models.Transaction.book_id == book_id, models.Transaction.returned_at.is_(None))
+        )
+
+def test_concurrent_rentals_never_oversell():
+    initial = 50
+    attempts = 25
+    book_id = create_book(initial)
+
+    async def worker(index):
+        async_engine, session_factory = new_sessionmaker()
+        rented = 0
+        try:
+            for _ in range(attempts):
+                async with session_factory() as db:
+                    try:
+                        await rent_copy(db, schemas.TransactionCreate(user_id=index, book_id=book_id))
+                        rented += 1
+                    except HTTPException as exc:
+                        assert exc.status_code == 400
+        finally:
+            await async_engine.dispose()
+        return rented
+
+    results, elapsed = run_threads(worker)
+    rented = sum(results)
+    print(f"\n{THREADS * attempts} rental attempts on one title: {rented} rented, {THREADS * attempts / elapsed:.1f} attempts/s")
+    assert rented == initial
+    assert inventory(book_id) == initial - rented == 0
+    assert open_loans(book_id) == rented
+
+def test_concurrent_rentals_and_returns_keep_count():
+    initial = 20
+    rounds = 15
+    book_ids = [create_book(initial) for _ in range(3)]
+
+    async def worker(index):
+        async_engine, session_factory = new_sessionmaker()
+        rented = returned = 0
+        try:
+            for round_number in range(rounds):
+                book_id = book_ids[(index + round_number) % len(book_ids)]
+                async with session_factory() as db:
+                    try:
+                        loan = await rent_copy(db, schemas.TransactionCreate(user_id=index, book_id=book_id))
+                    except HTTPException as exc:
+                        assert exc.status_code == 400
+                        continue
+                rented += 1
+                # Every other loan is kept, so that the books run low while others come back.
+                if round_number % 2:
+                    async with session_factory() as db:
+                        await return_copy(db, loan.id)
+                    returned += 1
+        finally:
+            await async_engine.dispose()
+        return rented, returned
+
+    results, elapsed = run_threads(worker)
+    rented = sum(result[0] for result in results)
+    returned = sum(result[1] for result in results)
+    print(f"\n{rented} rentals and {returned} returns on {len(book_ids)} titles: {(rented + returned) / elapsed:.1f} operations/s")
+    assert sum(inventory(book_id) for book_id in book_ids) == len(book_ids) * initial - rented + returned
+    for book_id in book_ids:
+        assert inventory(book_id) >= 0
+        assert inventory(book_id) + open_loans(book_id) == initial
+
+def test_concurrent_batch_rentals_never_oversell():
+    initial = 30
+    book_ids = [create_book(initial) for _ in range(2)]
+
+    async def worker(index):
+        async_engine, session_factory = new_sessionmaker()
+        rented = 0
+        try:
+            for _ in range(10):
+                async with session_factory() as db:
+                    result = await rent_copies(db, index, book_ids)
+                rented += result["succeeded"]
+        finally:
+            await async_engine.dispose()
+        return rented
+
+    results, elapsed = run_threads(worker)
+    rented = sum(results)
+    print(f"\n{rented} copies rented in batches: {rented / elapsed:.1f} rentals/s")
+    assert rented == len(book_ids) * initial
+    for book_id in book_ids:
+        assert inventory(book_id) == 0
+        assert open_loans(book_id) == initial
+
+def test_concurrent_returns_holds_and_edits_serve_each_hold_once():
+    rounds = 15
+    book_id = create_book(2)
+
+    async def worker(index):
+        async_engine, session_factory = new_sessionmaker()
+        operations = 0
+        try:
+            for round_number in range(rounds):
+                if index % 4 == 0:
+                    # A librarian sets the stock, sometimes below what is on the shelf.
+                    edited = schemas.BookCreate(title="Test book", author="Test author", description="", inventory_count=round_number % 3)
+                    async with session_factory() as db:
+                        await edit_book(db, book_id, edited)
+                    operations += 1
+                    continue
+                async with session_factory() as db:
+                    try:
+                        loan = await rent_copy(db, schemas.TransactionCreate(user_id=index, book_id=book_id))
+                    except HTTPException as exc:
+                        assert exc.status_code == 400
+                        loan = None
+                if loan is None:
+                    async with session_factory() as db:
+                        try:
+                            await place_hold(db, book_id, index)
+                        except HTTPException as exc:
+                            # The book came back in stock, or the reader is still waiting.
+                            assert exc.status_code == 409
+                else:
+                    async with session_factory() as db:
+                        await return_copy(db, loan.id)
+                operations += 2
+        finally:
+            await async_engine.dispose()
+        return operations
+
+    results, elapsed = run_threads(worker)
+    print(f"\n{sum(results)} rentals, returns, holds and edits on one title: {sum(results) / elapsed:.1f} operations/s")
+    hold, transaction = models.Hold, models.Transaction
+    with engine.connect() as connection:
+        holds = connection.execute(select(hold).where(hold.book_id == book_id).order_by(hold.position)).all()
+        served = connection.execute(
+            select(hold.user_id, transaction.user_id, transaction.book_id)
+            .join(transaction, transaction.id == hold.transaction_id)
+        ).all()
+    assert [row.position for row in holds] == list(range(1, len(holds) + 1))
+    fulfilled = [row.transaction_id for row in holds if row.transaction_id is not None]
+    assert len(fulfilled) == len(set(fulfilled)) == len(served)
+    assert all(hold_user == loan_user and loan_book == book_id for hold_user, loan_user, loan_book in served)
+    # Copies only sit on the shelf when nobody is waiting for them.
+    assert inventory(book_id) >= 0
+    assert inventory(book_id) == 0 or all(row.transaction_id is not None for row in holds)
+
+@pytest.mark.skipif(engine.dialect.name != "postgresql", reason="SQLite serializes writers")
+def test_edit_counts_a_copy_returned_while_it_waits():
+    book_id = create_book(1)
+    edited = schemas.BookCreate(title="Test book", author="Test author", description="", inventory_count=3)
+
+    async def scenario():
+        async_engine, session_factory = new_sessionmaker()
+        try:
+            async with session_factory() as returner, session_factory() as editor:
+                # The return of a copy holds the lock of the book row until it commits.
+                await returner.execute(
+                    update(models.Book).where(models.Book.id == book_id).values(inventory_count=models.Book.inventory_count + 1)
+                )
+                edit = asyncio.create_task(edit_book(editor, book_id, edited))
+                await asyncio.sleep(0.5)
+                assert not edit.done()
+                await returner.commit()
+                return await edit
+        finally:
+            await async_engine.dispose()
+
+    assert asyncio.run(scenario()).inventory_count == 3
+    assert inventory(book_id) == 3
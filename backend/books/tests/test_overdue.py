@@ -0,0 +1,67 @@
+"""
+Tests of the overdue loans listing: its keyset pages and the filter on when loans were found overdue.
+"""
+
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+import main
+from app import models
+from app.database import engine
+from app.pagination import NEXT_CURSOR_HEADER
+from tests.support import auth_headers, create_book
+
+DUE_AT = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+@pytest.fixture
+def loans():
+    """
+    Seed open loans whose due dates tie by threes, half of them stamped overdue on a later day, and returned ones.
+
+    Returns:
+        list[dict]: The open loans, earliest due first, with their IDs.
+    """
+    book_id = create_book(1)
+    rows = []
+    for loan in range(12):
+        due_at = DUE_AT + timedelta(days=loan // 3)
+        rows.append({
+            "user_id": loan + 1, "book_id": book_id, "rented_at": due_at - timedelta(days=14), "due_at": due_at,
+            "overdue_at": None if loan % 2 else due_at + timedelta(days=1),
+        })
+    with engine.begin() as connection:
+        ids = connection.scalars(insert(models.Transaction).returning(models.Transaction.id), rows).all()
+        connection.execute(insert(models.Transaction).values(
+            user_id=99, book_id=book_id, rented_at=DUE_AT - timedelta(days=14), due_at=DUE_AT, returned_at=DUE_AT,
+        ))
+    return [{**row, "id": transaction_id} for row, transaction_id in zip(rows, ids)]
+
+def read_pages(client, **params):
+    pages = []
+    while True:
+        response = client.get("/api/v1/transactions/overdue", params={"limit": 5, **params}, headers=auth_headers("librarian"))
+        assert response.status_code == 200
+        pages.append([transaction["id"] for transaction in response.json()])
+        params["cursor"] = response.headers.get(NEXT_CURSOR_HEADER)
+        if params["cursor"] is None:
+            return pages
+
+def test_pages_read_every_overdue_loan_once_in_due_order(loans):
+    with TestClient(main.app) as client:
+        pages = read_pages(client)
+    expected = [loan["id"] for loan in sorted(loans, key=lambda loan: (loan["due_at"], loan["id"]))]
+    assert [len(page) for page in pages] == [5, 5, 2]
+    assert [transaction_id for page in pages for transaction_id in page] == expected
+
+def test_flagged_since_only_returns_loans_stamped_from_then_on(loans):
+    flagged_since = DUE_AT + timedelta(days=2)
+    with TestClient(main.app) as client:
+        pages = read_pages(client, flagged_since=flagged_since.isoformat())
+    expected = [loan["id"] for loan in loans if loan["overdue_at"] is not None and loan["overdue_at"] >= flagged_since]
+    assert [transaction_id for page in pages for transaction_id in page] == expected
+
+def test_malformed_cursor_is_rejected(loans):
+    with TestClient(main.app) as client:
+        response = client.get("/api/v1/transactions/overdue?cursor=not-a-cursor", headers=auth_headers("librarian"))
+    assert response.status_code == 400
@@ -0,0 +1,184 @@
+"""
+Tests of the partitioned transactions table on a history of several years.
+
+They only run with ``TRANSACTIONS_PARTITIONED`` set on a Postgres test database. The statements
+the endpoints run are captured and explained on the same database, with ``EXPLAIN ANALYZE`` to
+tell the partitions Postgres searched from those it pruned at run time.
+"""
+
+import asyncio
+import gzip
+import re
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import column, insert, select, table, text
+import main
+from app import models
+from app.database import TRANSACTIONS_PARTITIONED, engine
+from app.export import encode_jsonl
+from app.partitions import PartitionMaintainer, add_months, archive_partitions, current_month, ensure_partitions, list_partitions, partition_name
+from tests.conftest import FIRST_TEST_MONTH
+from tests.support import auth_headers, captured_statements, create_book, new_sessionmaker
+
+pytestmark = pytest.mark.skipif(not TRANSACTIONS_PARTITIONED, reason="the transactions table is not partitioned")
+
+FIRST_MONTH = datetime(2021, 1, 1, tzinfo=timezone.utc)
+MONTHS = 36
+LOANS_PER_MONTH = 50
+
+# Every partition is listed as a target of an UPDATE, so only the scans tell which ones were searched.
+SCANNED_PARTITION = re.compile(r"Scan (?:.* )?on (transactions_p\d{6}) ")
+
+@pytest.fixture
+def history():
+    """
+    Seed three years of loans, all returned but one per month, plus one open loan from the first year.
+
+    Returns:
+        dict: The rental month of every transaction ID, and the IDs of the open loans.
+    """
+    book_ids = [create_book(5) for _ in range(20)]
+    rows = []
+    for month in range(MONTHS):
+        started = add_months(FIRST_MONTH.date(), month)
+        for loan in range(LOANS_PER_MONTH):
+            rented_at = datetime.combine(started, datetime.min.time(), tzinfo=timezone.utc) + timedelta(hours=loan * 12)
+            rows.append({
+                "user_id": loan + 1,
+                "book_id": book_ids[loan % len(book_ids)],
+                "rented_at": rented_at,
+                "due_at": rented_at + timedelta(days=14),
+                "returned_at": None if loan == 0 and month in (2, MONTHS - 1) else rented_at + timedelta(days=3),
+            })
+    transactions = models.Transaction
+    with engine.begin() as connection:
+        inserted = connection.execute(
+            insert(transactions).returning(transactions.id, transactions.rented_at, transactions.returned_at),
+            rows,
+        ).all()
+        connection.execute(text("ANALYZE transactions"))
+        connection.execute(text("ANALYZE transaction_locators"))
+    yield {
+        "months": {row.id: row.rented_at.date().replace(day=1) for row in inserted},
+        "open": [row.id for row in inserted if row.returned_at is None],
+    }
+    # The archive test drops the partitions of the first year.
+    with engine.begin() as connection:
+        ensure_partitions(connection, first_month=FIRST_TEST_MONTH)
+
+def request(method, path, **kwargs):
+    with TestClient(main.app) as client, captured_statements() as statements:
+        response = client.request(method, path, headers=auth_headers("librarian"), **kwargs)
+    return response, statements
+
+def transactions_statement(statements, verb):
+    return next(
+        (statement, parameters) for statement, parameters in statements
+        if statement.lstrip().upper().startswith(verb) and re.search(r"\btransactions\b", statement.split("WHERE")[0])
+    )
+
+def scanned_partitions(statement, parameters, analyze=True):
+    """
+    Explain a captured statement and list the partitions of the transactions table it reads.
+
+    Writes are explained in a transaction that is rolled back.
+
+    Returns:
+        set[str]: The partitions Postgres searched, without those it pruned or never executed.
+    """
+    async def explain():
+        explain_engine, _ = new_sessionmaker()
+        try:
+            async with explain_engine.connect() as connection:
+                options = "ANALYZE, COSTS OFF, TIMING OFF" if analyze else "COSTS OFF"
+                result = await connection.exec_driver_sql(f"EXPLAIN ({options}) {statement}", parameters)
+                plan = [row[0] for row in result]
+                await connection.rollback()
+                return plan
+        finally:
+            await explain_engine.dispose()
+
+    scanned = set()
+    for line in asyncio.run(explain()):
+        match = SCANNED_PARTITION.search(line)
+        if match and "never executed" not in line:
+            scanned.add(match.group(1))
+    return scanned
+
+def test_lookup_by_id_searches_one_partition(history):
+    month = datetime(2022, 6, 1).date()
+    transaction_id = next(transaction_id for transaction_id, rented in history["months"].items() if rented == month)
+    response, statements = request("GET", f"/api/v1/transactions/{transaction_id}")
+    assert response.status_code == 200 and response.json()["id"] == transaction_id
+    assert scanned_partitions(*transactions_statement(statements, "SELECT")) == {partition_name(month)}
+
+def test_return_updates_one_partition(history):
+    transaction_id = history["open"][-1]
+    response, statements = request("PUT", f"/api/v1/transactions/{transaction_id}/return")
+    assert response.status_code == 200 and response.json()["returned_at"] is not None
+    assert scanned_partitions(*transactions_statement(statements, "UPDATE")) == {partition_name(history["months"][transaction_id])}
+
+def test_batch_return_updates_the_partitions_of_its_loans(history):
+    transaction_ids = history["open"]
+    response, statements = request("PUT", "/api/v1/transactions/return/batch", json={"transaction_ids": transaction_ids})
+    assert response.status_code == 200
+    assert [item["status_code"] for item in response.json()["items"]] == [200, 200]
+    expected = {partition_name(history["months"][transaction_id]) for transaction_id in transaction_ids}
+    assert scanned_partitions(*transactions_statement(statements, "UPDATE")) == expected
+
+def test_rental_time_filters_prune_the_other_months(history):
+    response, statements = request("GET", "/api/v1/transactions/?since=2022-03-01T00:00:00Z&until=2022-05-01T00:00:00Z")
+    assert response.status_code == 200
+    statement, parameters = transactions_statement(statements, "SELECT")
+    assert scanned_partitions(statement, parameters, analyze=False) == {"transactions_p202203", "transactions_p202204"}
+
+def test_archive_round_trip(history, tmp_path):
+    # Every month of 2021 is before the retention window, but March still has an open loan.
+    first_kept = datetime(2022, 1, 1).date()
+    keep_months = (current_month().year - first_kept.year) * 12 + current_month().month - first_kept.month + 1
+    archived_month = datetime(2021, 6, 1).date()
+    name = partition_name(archived_month)
+    columns = models.Transaction.__table__.columns
+    partition = table(name, *(column(c.key, c.type) for c in columns))
+    with engine.connect() as connection:
+        original = connection.execute(select(*partition.columns).order_by(partition.c.id)).all()
+        outcomes = dict(archive_partitions(connection, keep_months, str(tmp_path)))
+
+    assert len(original) == LOANS_PER_MONTH
+    assert outcomes["transactions_p202103"] == "skipped, 1 open loans"
+    assert outcomes[name] == f"archived {LOANS_PER_MONTH} rows to {tmp_path / (name + '.jsonl.gz')}"
+    with gzip.open(tmp_path / f"{name}.jsonl.gz", "rb") as archive:
+        assert archive.read() == encode_jsonl(original)
+
+    archived_ids = [transaction_id for transaction_id, month in history["months"].items() if month.year == 2021 and month.month != 3]
+    with engine.connect() as connection:
+        remaining = {month for _, month in list_partitions(connection)}
+        assert connection.scalar(text(f"SELECT to_regclass('{name}')")) is None
+        locators = models.transaction_locators
+        assert connection.scalar(select(locators.c.id).where(locators.c.id.in_(archived_ids))) is None
+    assert archived_month not in remaining
+    assert {add_months(archived_month, -3), first_kept} <= remaining
+
+    with TestClient(main.app) as client:
+        headers = auth_headers("librarian")
+        assert client.get(f"/api/v1/transactions/{archived_ids[0]}", headers=headers).status_code == 404
+        kept_id = next(transaction_id for transaction_id, month in history["months"].items() if month == first_kept)
+        assert client.get(f"/api/v1/transactions/{kept_id}", headers=headers).status_code == 200
+        assert client.put(f"/api/v1/transactions/{history['open'][0]}/return", headers=headers).status_code == 200
+
+def test_rental_without_a_partition_is_unavailable_until_the_maintainer_creates_it():
+    book_id = create_book(1)
+    name = partition_name(current_month())
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE {name}"))
+    try:
+        with TestClient(main.app) as client:
+            rent = lambda: client.post("/api/v1/transactions/rent", json={"user_id": 1, "book_id": book_id}, headers=auth_headers("member"))
+            response = rent()
+            assert response.status_code == 503, response.text
+            assert PartitionMaintainer().ensure() == [name]
+            assert rent().status_code == 200
+    finally:
+        with engine.begin() as connection:
+            ensure_partitions(connection, first_month=FIRST_TEST_MONTH)
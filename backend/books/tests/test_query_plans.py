@@ -0,0 +1,130 @@
+"""
+Tests that the loan and history filters are served by their indexes.
+
+The statements the endpoints run are captured as they are executed, then explained on the same
+database: with ``EXPLAIN QUERY PLAN`` on SQLite, and with ``EXPLAIN`` on Postgres, where
+sequential scans are disabled so that the small test tables do not make them look cheaper. On a
+partitioned transactions table, an index shows in the plans as its partitions' own indexes.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, insert, text
+import main
+from app import models
+from app.overdue import overdue_query
+from app.pagination import encode_cursor
+from app.database import TRANSACTIONS_PARTITIONED, engine
+from tests.support import auth_headers, captured_statements, create_book, new_sessionmaker
+
+USERS = 2000
+LOANS_PER_USER = 10
+
+@pytest.fixture(scope="module")
+def book_ids():
+    book_ids = [create_book(5, description="Indexed") for _ in range(200)]
+    rented_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for user_id in range(1, USERS + 1):
+        for loan in range(LOANS_PER_USER):
+            started = rented_at + timedelta(days=loan * 7, minutes=user_id)
+            rows.append({
+                "user_id": user_id,
+                "book_id": book_ids[(user_id + loan) % len(book_ids)],
+                "rented_at": started,
+                "due_at": started + timedelta(days=14),
+                # Only the last loan of each user is still open.
+                "returned_at": None if loan == LOANS_PER_USER - 1 else started + timedelta(days=5),
+            })
+    with engine.begin() as connection:
+        connection.execute(insert(models.Transaction), rows)
+        connection.execute(text("ANALYZE"))
+    yield book_ids
+    with engine.begin() as connection:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            connection.execute(delete(table))
+
+@pytest.fixture
+def clean_tables(book_ids):
+    # The rows are shared by the tests of this module, and removed after the last one.
+    yield
+
+def query_plan(statement, parameters):
+    async def explain():
+        explain_engine, _ = new_sessionmaker()
+        try:
+            async with explain_engine.connect() as connection:
+                if connection.dialect.name == "sqlite":
+                    result = await connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                    return "\n".join(row[-1] for row in result)
+                await connection.exec_driver_sql("SET enable_seqscan = off")
+                result = await connection.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+                return "\n".join(row[0] for row in result)
+        finally:
+            await explain_engine.dispose()
+
+    return asyncio.run(explain())
+
+def index_names(index):
+    if not TRANSACTIONS_PARTITIONED:
+        return {index}
+    with engine.connect() as connection:
+        return set(connection.execute(text(
+            "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = inhrelid "
+            "JOIN pg_class parent ON parent.oid = inhparent WHERE parent.relname = :index"
+        ), {"index": index}).scalars())
+
+def uses_index(plan, index):
+    return any(name in plan for name in index_names(index))
+
+def transactions_plan(path, headers=None):
+    with TestClient(main.app) as client, captured_statements() as statements:
+        response = client.get(path, headers=headers or auth_headers("librarian"))
+    assert response.status_code == 200
+    statement, parameters = next(
+        (statement, parameters) for statement, parameters in statements
+        if "FROM transactions" in statement and statement.lstrip().upper().startswith("SELECT")
+    )
+    return query_plan(statement, parameters)
+
+@pytest.mark.parametrize("query, index", [
+    ("user_id=7&active=true", "ix_transactions_active_user_id"),
+    ("user_id=7", "ix_transactions_user_id_rented_at"),
+    ("user_id=7&since=2024-03-01T00:00:00Z&until=2024-06-01T00:00:00Z", "ix_transactions_user_id_rented_at"),
+    ("book_id={book_id}&active=true", "ix_transactions_active_book_id"),
+    pytest.param("book_id={book_id}", "ix_transactions_book_id", marks=pytest.mark.skipif(
+        TRANSACTIONS_PARTITIONED, reason="the small test partitions are cheaper to merge in ID order than to sort",
+    )),
+])
+def test_transaction_filters_use_their_index(book_ids, query, index):
+    plan = transactions_plan(f"/api/v1/transactions/?{query.format(book_id=book_ids[3])}")
+    assert uses_index(plan, index), plan
+
+@pytest.mark.parametrize("query, index", [
+    ("active=true", "ix_transactions_active_user_id"),
+    ("", "ix_transactions_user_id_rented_at"),
+])
+def test_member_loans_use_their_index(book_ids, query, index):
+    plan = transactions_plan(f"/api/v1/transactions/mine?{query}", auth_headers("member", user_id=7))
+    assert uses_index(plan, index), plan
+
+def test_member_only_sees_their_own_loans(book_ids):
+    with TestClient(main.app) as client:
+        response = client.get("/api/v1/transactions/mine?active=true", headers=auth_headers("member", user_id=7))
+        assert response.status_code == 200
+        assert [(loan["user_id"], loan["returned_at"]) for loan in response.json()] == [(7, None)]
+        history = client.get("/api/v1/transactions/mine", headers=auth_headers("member", user_id=7)).json()
+        assert len(history) == LOANS_PER_USER and {loan["user_id"] for loan in history} == {7}
+        assert client.get("/api/v1/transactions/mine", headers=auth_headers("member")).status_code == 401
+
+def test_book_loans_use_the_open_loans_index(book_ids):
+    plan = transactions_plan(f"/api/v1/books/{book_ids[3]}/loans")
+    assert uses_index(plan, "ix_transactions_active_book_id"), plan
+
+def test_overdue_pages_use_the_due_date_index(book_ids):
+    with engine.connect() as connection:
+        last = connection.execute(overdue_query().order_by(models.Transaction.due_at, models.Transaction.id).limit(1).offset(9)).one()
+    plan = transactions_plan(f"/api/v1/transactions/overdue?limit=10&cursor={encode_cursor(last.id, last.due_at.isoformat())}")
+    assert uses_index(plan, "ix_transactions_active_due_at_id"), plan
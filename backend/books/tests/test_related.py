@@ -0,0 +1,34 @@
+"""
+Tests of the "readers also borrowed" table against a dense computation of the co-occurrences.
+"""
+
+import numpy as np
+import pytest
+from app.related import build_related, synthetic_borrowing
+
+def expected_neighbors(user_ids, book_ids, top_k):
+    books = np.unique(book_ids)
+    users = np.unique(user_ids)
+    borrowed = np.zeros((len(users), len(books)), np.int64)
+    borrowed[np.searchsorted(users, user_ids), np.searchsorted(books, book_ids)] = 1
+    cooccurrence = borrowed.T @ borrowed
+    np.fill_diagonal(cooccurrence, 0)
+    neighbors = {}
+    for row, book_id in enumerate(books):
+        # Best score first, then lowest book ID.
+        ranked = sorted((-score, books[column]) for column, score in enumerate(cooccurrence[row]) if score)
+        neighbors[book_id] = [(int(neighbor), int(-score)) for score, neighbor in ranked[:top_k]]
+    return neighbors
+
+@pytest.mark.parametrize("transactions, users, books, top_k, block_size", [
+    (3000, 300, 80, 5, 7),
+    (20000, 400, 300, 20, 64),
+    (500, 1000, 400, 3, 1000),
+])
+def test_neighbors_match_the_dense_computation(transactions, users, books, top_k, block_size):
+    user_ids, book_ids = synthetic_borrowing(transactions, users, books, seed=transactions)
+    related = build_related(user_ids, book_ids, top_k, block_size)
+    expected = expected_neighbors(user_ids, book_ids, top_k)
+    assert related.book_ids.tolist() == sorted(expected)
+    for book_id, neighbors in expected.items():
+        assert related.lookup(book_id, top_k) == neighbors
@@ -0,0 +1,50 @@
+"""
+Tests that list endpoints render the same JSON with and without ``FAST_JSON``.
+"""
+
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+import main
+from app import models
+from app.cache import CatalogCache
+from app.database import engine
+from tests.support import auth_headers, create_book
+
+@pytest.fixture
+def client(monkeypatch):
+    # Render rows from the database on every request, rather than entries from the cache.
+    monkeypatch.setattr(main, "catalog_cache", CatalogCache(None))
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+def render_both_ways(client, monkeypatch, path):
+    bodies = []
+    for fast_json in (False, True):
+        monkeypatch.setattr(main, "FAST_JSON", fast_json)
+        response = client.get(path, headers=auth_headers("librarian"))
+        assert response.status_code == 200
+        bodies.append(response.content)
+    return bodies
+
+def test_books_render_identically(client, monkeypatch):
+    create_book(3, description="Plain")
+    create_book(0, description="Ünïcödé \"quoted\" \\ and\nnewline", image_path="/covers/1.jpg", isbn="9780000000001")
+    default, fast = render_both_ways(client, monkeypatch, "/api/v1/books/")
+    assert default == fast
+    assert len(client.get("/api/v1/books/", headers=auth_headers("librarian")).json()) == 2
+
+def test_transactions_render_identically(client, monkeypatch):
+    book_id = create_book(1, description="Lent")
+    rented_at = datetime(2024, 2, 29, 23, 59, 59, 123456, tzinfo=timezone.utc)
+    with engine.begin() as connection:
+        connection.execute(insert(models.Transaction), [
+            {"user_id": 1, "book_id": book_id, "rented_at": rented_at, "due_at": rented_at + timedelta(days=14)},
+            {
+                "user_id": 2, "book_id": book_id, "rented_at": rented_at, "due_at": rented_at + timedelta(days=14),
+                "returned_at": rented_at + timedelta(days=20), "overdue_at": rented_at + timedelta(days=15),
+            },
+        ])
+    default, fast = render_both_ways(client, monkeypatch, "/api/v1/transactions/")
+    assert default == fast
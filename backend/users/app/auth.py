@@ -7,6 +7,8 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 from . import models, schemas
+from .cache import create_user_cache
+from .password_pool import PoolSaturatedError, create_password_hash_pool
 from .database import get_db
 
 
@@ -19,9 +21,27 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+PASSWORD_SCHEMES = [scheme.strip() for scheme in os.getenv("PASSWORD_SCHEMES", "bcrypt").split(",") if scheme.strip()]
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+
+# The first scheme hashes new passwords; hashes made with the other schemes, or with
+# different cost settings, are still accepted and get upgraded on the next login.
+pwd_context = CryptContext(
+    schemes=PASSWORD_SCHEMES,
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    argon2__time_cost=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+user_cache = create_user_cache()
+password_hash_pool = create_password_hash_pool()
+
 def verify_password(plain_password, hashed_password):
     """
     Verify a plain password against a hashed password.
@@ -47,10 +67,51 @@ def get_password_hash(password):
     """
     return pwd_context.hash(password)
 
-def authenticate_user(db: Session, username: str, password: str):
+def verify_and_update_password(plain_password, hashed_password):
+    """
+    Verify a plain password and rehash it if its hash uses outdated settings.
+
+    Args:
+        plain_password (str): The plain text password.
+        hashed_password (str): The hashed password to compare against.
+
+    Returns:
+        tuple: Whether the password is correct, and the replacement hash if the stored
+        hash should be upgraded (None otherwise).
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+async def run_password_task(func, *args):
+    """
+    Run a password hashing function on the password hashing pool.
+
+    Args:
+        func (callable): One of the module-level hashing functions.
+        *args: The arguments to call it with.
+
+    Returns:
+        The function's return value.
+
+    Raises:
+        HTTPException: If the password hashing pool is saturated.
+    """
+    try:
+        return await password_hash_pool.run(func, *args)
+    except PoolSaturatedError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent logins, please retry",
+            headers={"Retry-After": "1"},
+        )
+
+async def authenticate_user(db: Session, username: str, password: str):
     """
     Authenticate a user.
 
+    The password check runs on the password hashing pool so it does not block the event loop.
+    If the stored hash was made with an outdated scheme or cost, it is replaced with a hash
+    using the current settings.
+
     Args:
         db (Session): The database session.
         username (str): The username of the user to authenticate.
@@ -58,10 +119,19 @@ def authenticate_user(db: Session, username: str, password: str):
 
     Returns:
         User: The authenticated user if successful, False otherwise.
+
+    Raises:
+        HTTPException: If the password hashing pool is saturated.
     """
     user = db.query(models.User).filter(models.User.username == username).first()
-    if not user or not verify_password(password, user.hashed_password):
+    if not user:
+        return False
+    valid, new_hash = await run_password_task(verify_and_update_password, password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        user.hashed_password = new_hash
+        db.commit()
     return user
 
 def create_token(data: dict, expires_delta: timedelta, token_type: str):
@@ -82,6 +152,21 @@ def create_token(data: dict, expires_delta: timedelta, token_type: str):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def token_claims(user):
+    """
+    Get the claims identifying a user in their tokens.
+
+    The user ID lets the other services find the user's records, such as the books service
+    the user's loans, without looking the username up.
+
+    Args:
+        user (models.User): The user the token is issued to.
+
+    Returns:
+        dict: The payload to encode in the token.
+    """
+    return {"sub": user.username, "user_type": user.user_type.value, "user_id": user.id}
+
 def create_access_token(data: dict):
     """
     Create an access token.
@@ -118,6 +203,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     """
     Get the current user based on the provided JWT token.
 
+    The user record is served from the user cache when possible, so repeated requests
+    do not query the database each time.
+
     Args:
         token (str): The JWT token.
         db (Session): The database session.
@@ -143,11 +231,33 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         token_data = schemas.TokenData(username=username, user_type=user_type)
     except JWTError:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
+    user = user_cache.get(token_data.username)
+    if user is None:
+        invalidations = user_cache.invalidations()
+        user = db.query(models.User).filter(models.User.username == token_data.username).first()
+        if user is not None:
+            user_cache.set(user, invalidations)
     if user is None or user.user_type.value != user_type:
         raise credentials_exception
     return user
 
+async def get_current_admin(current_user: models.User = Depends(get_current_user)):
+    """
+    Get the current user, provided they are an administrator.
+
+    Args:
+        current_user (User): The current authenticated user.
+
+    Returns:
+        User: The current authenticated administrator.
+
+    Raises:
+        HTTPException: If the user is not an administrator.
+    """
+    if current_user.user_type != models.UserType.administrator:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    return current_user
+
 def verify_refresh_token(refresh_token: str):
     """
     Verify a refresh token.
@@ -0,0 +1,213 @@
+"""
+This module caches user records for the users service.
+
+Every authenticated request resolves the token's subject to a user row. The ``UserCache``
+keeps those rows for a short time so that repeated requests from the same user do not
+query the database each time. Entries live in a pluggable backend: an in-process store by
+default, or a shared key-value store such as Redis so that all workers see the same
+entries and invalidations. ``InMemoryCache`` implements the same interface as the shared
+backend and can stand in for it locally, for example in tests.
+
+Every invalidation also bumps a counter kept in the backend, so that a record read from the
+database while another request, in any worker, changed and invalidated it is not stored, or
+is dropped right after.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from . import schemas
+
+class InMemoryCache:
+    """
+    A thread-safe, bounded, in-process key-value store with per-entry expiry.
+
+    Counters written with ``incr`` are kept apart from the entries and are never evicted.
+
+    Args:
+        maxsize (int): The maximum number of entries to keep.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._counters.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+class RedisCache:
+    """
+    A key-value store backed by a Redis server, shared by every worker that connects to it.
+
+    Args:
+        url (str): The Redis connection URL, e.g. ``redis://cache:6379/0``.
+        prefix (str): A prefix for all keys written by this service.
+    """
+
+    def __init__(self, url, prefix="users:"):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("The redis package is required for the redis cache backend") from exc
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode() if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+class UserCache:
+    """
+    Caches user records by username on top of a key-value backend.
+
+    Args:
+        backend: The key-value store, or None to disable caching.
+        ttl (float): The number of seconds a user record may be served from the cache.
+    """
+
+    def __init__(self, backend, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def user_key(self, username):
+        """
+        Build the cache key of a user record.
+
+        Args:
+            username (str): The username.
+
+        Returns:
+            str: The cache key, kept apart from the invalidation counter.
+        """
+        return f"user:{username}"
+
+    def invalidations(self):
+        """
+        Read the invalidation counter, to be passed to ``set`` after the database read.
+
+        Returns:
+            int: The number of invalidations so far, shared by every worker using the backend.
+        """
+        if self.backend is None:
+            return 0
+        return int(self.backend.get("invalidations") or 0)
+
+    def get(self, username):
+        """
+        Look up a cached user.
+
+        Args:
+            username (str): The username to look up.
+
+        Returns:
+            schemas.User: The cached user, or None on a miss.
+        """
+        value = self.backend.get(self.user_key(username)) if self.backend is not None else None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return schemas.User.model_validate_json(value)
+
+    def set(self, user, invalidations):
+        """
+        Cache a user record, unless a user was invalidated since it was read.
+
+        Args:
+            user (models.User): The user to cache.
+            invalidations (int): The value ``invalidations`` returned before the record was read.
+        """
+        if self.backend is None or invalidations != self.invalidations():
+            return
+        key = self.user_key(user.username)
+        self.backend.set(key, schemas.User.model_validate(user, from_attributes=True).model_dump_json(), self.ttl)
+        # An invalidation between the check and the store may have missed the entry; writers
+        # bump the counter before deleting, so checking again catches it.
+        if invalidations != self.invalidations():
+            self.backend.delete(key)
+
+    def invalidate(self, *usernames):
+        """
+        Drop cached records so the next lookup reads the database.
+
+        Args:
+            *usernames (str): The usernames to drop.
+        """
+        if self.backend is not None:
+            self.backend.incr("invalidations")
+            for username in set(usernames):
+                self.backend.delete(self.user_key(username))
+
+    def stats(self):
+        """
+        Report the cache's hit and miss counters.
+
+        Returns:
+            dict: The hit and miss counts since the process started.
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+def create_user_cache():
+    """
+    Build the user cache configured by the environment.
+
+    ``USER_CACHE_BACKEND`` selects ``memory`` (the default), ``redis`` (using ``USER_CACHE_URL``)
+    or ``none``. ``USER_CACHE_TTL`` sets the entry lifetime in seconds and ``USER_CACHE_SIZE``
+    bounds the in-process store.
+
+    Returns:
+        UserCache: The configured cache.
+    """
+    kind = os.getenv("USER_CACHE_BACKEND", "memory").lower()
+    ttl = float(os.getenv("USER_CACHE_TTL", "60"))
+    if kind == "none":
+        backend = None
+    elif kind == "redis":
+        backend = RedisCache(os.getenv("USER_CACHE_URL", "redis://localhost:6379/0"))
+    elif kind == "memory":
+        backend = InMemoryCache(maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")))
+    else:
+        raise ValueError(f"Unknown USER_CACHE_BACKEND: {kind}")
+    return UserCache(backend, ttl=ttl)
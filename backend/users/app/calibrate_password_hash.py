@@ -0,0 +1,88 @@
+"""
+This module picks password hashing cost settings for the hardware it runs on.
+
+It times password verification at increasing costs and recommends the highest cost whose
+verify time stays within the target latency, printed as the environment variables the
+users service reads:
+
+    python -m app.calibrate_password_hash --target-ms 250
+    python -m app.calibrate_password_hash --scheme argon2 --memory-cost 65536 --target-ms 250
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from passlib.hash import argon2, bcrypt
+
+SAMPLE_PASSWORD = "correct horse battery staple"
+
+def time_verify(handler, samples):
+    """
+    Measure how long one verification takes with a configured hash handler.
+
+    Args:
+        handler: A passlib hash handler with its cost settings applied.
+        samples (int): The number of verifications to time.
+
+    Returns:
+        float: The median verify time in milliseconds.
+    """
+    hashed = handler.hash(SAMPLE_PASSWORD)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        handler.verify(SAMPLE_PASSWORD, hashed)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def calibrate(handlers, target_ms, samples):
+    """
+    Time handlers of increasing cost until one exceeds the target.
+
+    Args:
+        handlers (iterable): Pairs of (cost, handler), in increasing cost order.
+        target_ms (float): The target verify latency in milliseconds.
+        samples (int): The number of verifications to time per cost.
+
+    Returns:
+        The highest cost that verifies within the target, or the lowest cost tried if none do.
+    """
+    best = None
+    for cost, handler in handlers:
+        elapsed = time_verify(handler, samples)
+        print(f"cost {cost}: {elapsed:.1f} ms")
+        if elapsed > target_ms:
+            break
+        best = cost
+    if best is None:
+        best = cost
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pick password hashing costs that meet a target verify latency.")
+    parser.add_argument("--scheme", choices=("bcrypt", "argon2"), default="bcrypt")
+    parser.add_argument("--target-ms", type=float, default=250.0, help="target verify latency in milliseconds")
+    parser.add_argument("--samples", type=int, default=5, help="verifications timed per cost")
+    parser.add_argument("--memory-cost", type=int, default=65536, help="argon2 memory cost in KiB")
+    parser.add_argument("--parallelism", type=int, default=4, help="argon2 parallelism")
+    args = parser.parse_args(argv)
+
+    if args.scheme == "bcrypt":
+        handlers = ((rounds, bcrypt.using(rounds=rounds)) for rounds in range(4, 32))
+        rounds = calibrate(handlers, args.target_ms, args.samples)
+        print(f"BCRYPT_ROUNDS={rounds}")
+    else:
+        handlers = (
+            (time_cost, argon2.using(time_cost=time_cost, memory_cost=args.memory_cost, parallelism=args.parallelism))
+            for time_cost in range(1, 64)
+        )
+        time_cost = calibrate(handlers, args.target_ms, args.samples)
+        print("PASSWORD_SCHEMES=argon2,bcrypt")
+        print(f"ARGON2_TIME_COST={time_cost}")
+        print(f"ARGON2_MEMORY_COST={args.memory_cost}")
+        print(f"ARGON2_PARALLELISM={args.parallelism}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,34 +2,206 @@
 This module sets up the database connection and session management for the users service.
 
 It uses SQLAlchemy to create a database engine, session factory, and a base class for declarative models.
-The database URL is loaded from environment variables for security.
+The database URL and connection pool settings are loaded from environment variables.
+
+Read-only endpoints can be served by replicas listed in ``DATABASE_READ_URL`` (comma-separated).
+``get_read_db`` picks a replica in turn, skips replicas it recently failed to connect to and falls
+back to the primary when none is reachable. For ``READ_YOUR_WRITES_SECONDS`` after a user commits
+a write, their reads go to the primary so that they see their own changes despite replication lag.
+Pins are kept per process.
 """
 
+import itertools
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from fastapi import Request
+from jose import JWTError, jwt
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from .pool import engine_options, instrument_pool
 
 # Load environment variables
 load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
+SQLALCHEMY_READ_DATABASE_URLS = [url.strip() for url in os.getenv("DATABASE_READ_URL", "").split(",") if url.strip()]
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+
+class PrimarySession(Session):
+    """
+    The session class of request sessions on the primary, whose commits pin the writer to the primary.
+    """
+
+engine = instrument_pool(create_engine(SQLALCHEMY_DATABASE_URL, **engine_options()))
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=PrimarySession)
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+read_engines = [instrument_pool(create_engine(url, **engine_options())) for url in SQLALCHEMY_READ_DATABASE_URLS]
+ReadSessionLocals = [
+    sessionmaker(autocommit=False, autoflush=False, bind=read_engine) for read_engine in read_engines
+]
 
 Base = declarative_base()
 
-def get_db():
+class ReadRouter:
+    """
+    Chooses which replicas may serve a read and remembers which users must read from the primary.
+
+    Args:
+        replica_count (int): The number of configured replicas.
+        pin_seconds (float): How long a user's reads go to the primary after they commit a write.
+        retry_seconds (float): How long a replica that failed to connect is skipped.
+    """
+
+    def __init__(self, replica_count, pin_seconds, retry_seconds):
+        self.replica_count = replica_count
+        self.pin_seconds = pin_seconds
+        self.retry_seconds = retry_seconds
+        self._next = itertools.count()
+        self._down_until = [0.0] * replica_count
+        self._pins = {}
+        self._lock = threading.Lock()
+
+    def pin(self, key):
+        """
+        Send a user's reads to the primary for the pinning window.
+
+        Args:
+            key (str): The user's pin key.
+        """
+        if self.pin_seconds <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._pins) >= 10000:
+                self._pins = {pinned: until for pinned, until in self._pins.items() if until > now}
+            self._pins[key] = now + self.pin_seconds
+
+    def is_pinned(self, key):
+        """
+        Check whether a user recently wrote and must read from the primary.
+
+        Args:
+            key (str): The user's pin key, or None for anonymous requests.
+
+        Returns:
+            bool: True if the user is pinned to the primary.
+        """
+        if key is None:
+            return False
+        with self._lock:
+            return self._pins.get(key, 0.0) > time.monotonic()
+
+    def candidates(self, key):
+        """
+        List the replicas to try for a read, in order.
+
+        Replicas are rotated between calls to spread the load, and replicas that recently
+        failed are left out.
+
+        Args:
+            key (str): The user's pin key, or None for anonymous requests.
+
+        Returns:
+            list[int]: The indexes of the replicas to try; empty if the read must go to the primary.
+        """
+        if self.replica_count == 0 or self.is_pinned(key):
+            return []
+        start = next(self._next)
+        now = time.monotonic()
+        order = ((start + offset) % self.replica_count for offset in range(self.replica_count))
+        return [index for index in order if self._down_until[index] <= now]
+
+    def mark_down(self, index):
+        """
+        Skip a replica for the retry window after it failed to connect.
+
+        Args:
+            index (int): The index of the failed replica.
+        """
+        self._down_until[index] = time.monotonic() + self.retry_seconds
+
+read_router = ReadRouter(len(read_engines), READ_YOUR_WRITES_SECONDS, REPLICA_RETRY_SECONDS)
+
+@event.listens_for(PrimarySession, "after_commit")
+def pin_writer(session):
     """
-    Creates a database session and ensures it's closed after use.
+    Pin the user whose request committed a write to the primary.
+    """
+    key = session.info.get("pin_key")
+    if key is not None:
+        read_router.pin(key)
+
+def session_pin_key(request):
+    """
+    Identify the user behind a request for read-your-writes pinning.
+
+    The token is not verified here: the key only decides where a read is routed, and the
+    endpoint's own authentication still rejects invalid tokens.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        str: The subject of the request's bearer token, or None if it has none.
+    """
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.get_unverified_claims(token).get("sub")
+    except JWTError:
+        return None
+
+def get_db(request: Request):
+    """
+    Creates a database session on the primary and ensures it's closed after use.
+
+    Args:
+        request (Request): The incoming request, whose user is pinned to the primary if the session commits.
+
+    Yields:
+        Session: A SQLAlchemy database session.
+    """
+    db = SessionLocal(info={"pin_key": session_pin_key(request)})
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_read_db(request: Request):
+    """
+    Creates a database session for a read-only request and ensures it's closed after use.
+
+    The session is opened on a replica when one is configured and reachable, and on the primary
+    otherwise or while the user is pinned there after a write.
+
+    Args:
+        request (Request): The incoming request.
 
     Yields:
         Session: A SQLAlchemy database session.
     """
-    db = SessionLocal()
+    key = session_pin_key(request)
+    for index in read_router.candidates(key):
+        db = ReadSessionLocals[index]()
+        try:
+            db.connection()
+        except (DBAPIError, OSError):
+            db.close()
+            read_router.mark_down(index)
+            continue
+        try:
+            yield db
+        finally:
+            db.close()
+        return
+    db = SessionLocal(info={"pin_key": key})
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
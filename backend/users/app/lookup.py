@@ -0,0 +1,45 @@
+"""
+This module resolves many records by ID with a single query for the users service.
+
+Clients that hydrate lists of transactions would otherwise fetch every user with its own
+request. The batch lookups here take the whole set of IDs at once, query them with one
+``= ANY(array)`` on Postgres (one bind parameter however many IDs) or ``IN`` elsewhere, and
+return the rows in the order the IDs were requested along with the IDs that were not found.
+"""
+
+from sqlalchemy import ARRAY, Integer, any_, bindparam, select
+
+def id_filter(column, ids, dialect_name):
+    """
+    Build a filter matching any of the given IDs.
+
+    Args:
+        column (Column): The ID column.
+        ids (list[int]): The IDs to match.
+        dialect_name (str): The name of the database dialect the filter will run on.
+
+    Returns:
+        ColumnElement: The filter expression.
+    """
+    if dialect_name == "postgresql":
+        return column == any_(bindparam("ids", ids, type_=ARRAY(Integer)))
+    return column.in_(ids)
+
+def fetch_by_ids(db, model, ids):
+    """
+    Load the rows with the given IDs in one query.
+
+    Args:
+        db (Session): The database session.
+        model (type): The mapped class to load, which must have an ``id`` column.
+        ids (list[int]): The IDs to load. Repeated IDs are returned once.
+
+    Returns:
+        tuple[list, list[int]]: The rows found, in request order, and the IDs that were not found.
+    """
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return [], []
+    result = db.scalars(select(model).where(id_filter(model.id, ids, db.bind.dialect.name)))
+    found = {row.id: row for row in result.all()}
+    return [found[item_id] for item_id in ids if item_id in found], [item_id for item_id in ids if item_id not in found]
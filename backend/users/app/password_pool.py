@@ -0,0 +1,78 @@
+"""
+This module runs password hashing work for the users service on a dedicated worker pool.
+
+bcrypt is deliberately slow, so hashing or verifying a password on the event loop stalls
+every other request handled by the worker. ``PasswordHashPool`` moves that work onto a
+bounded thread or process pool and rejects new work once too much is already queued, so a
+login storm degrades into fast 503 responses instead of an unresponsive service.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+class PoolSaturatedError(Exception):
+    """
+    Raised when the pool already has as much queued and running work as it accepts.
+    """
+
+class PasswordHashPool:
+    """
+    A bounded executor for CPU-heavy password hashing.
+
+    The pending-work counter is only touched from the event loop thread, so it needs no lock.
+
+    Args:
+        workers (int): The number of worker threads or processes.
+        max_pending (int): The maximum number of calls that may be queued or running at once.
+        kind (str): ``"thread"`` (bcrypt releases the GIL while hashing) or ``"process"``.
+    """
+
+    def __init__(self, workers, max_pending, kind="thread"):
+        if kind == "process":
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        elif kind == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        else:
+            raise ValueError(f"Unknown password hash executor: {kind}")
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+
+    async def run(self, func, *args):
+        """
+        Run a function on the pool and wait for its result.
+
+        Args:
+            func (callable): A picklable, module-level function.
+            *args: The arguments to call it with.
+
+        Returns:
+            The function's return value.
+
+        Raises:
+            PoolSaturatedError: If the pool is already at its pending-work limit.
+        """
+        if self.pending >= self.max_pending:
+            raise PoolSaturatedError()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+def create_password_hash_pool():
+    """
+    Build the password hashing pool configured by the environment.
+
+    ``PASSWORD_HASH_WORKERS`` sets the pool size (default: the number of CPUs),
+    ``PASSWORD_HASH_MAX_PENDING`` the queue limit (default: four calls per worker) and
+    ``PASSWORD_HASH_EXECUTOR`` the pool type, ``thread`` (the default) or ``process``.
+
+    Returns:
+        PasswordHashPool: The configured pool.
+    """
+    workers = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+    max_pending = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(workers * 4)))
+    kind = os.getenv("PASSWORD_HASH_EXECUTOR", "thread").lower()
+    return PasswordHashPool(workers, max_pending, kind)
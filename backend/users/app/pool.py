@@ -0,0 +1,126 @@
+"""
+This module configures and instruments the database connection pools of the users service.
+
+Pool sizing is read from environment variables so it can be tuned per deployment, and each
+pool records how long checkouts wait for a connection so the sizing can be checked against
+real traffic. Setting ``DB_EXTERNAL_POOLER`` hands pooling to an external pooler such as
+PgBouncer instead.
+"""
+
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from sqlalchemy.pool import NullPool, QueuePool
+
+load_dotenv()
+
+# With DB_EXTERNAL_POOLER enabled, connections are opened per checkout
+# and pooling is left to an external pooler such as PgBouncer.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+DB_EXTERNAL_POOLER = os.getenv("DB_EXTERNAL_POOLER", "false").lower() == "true"
+
+class PoolStats:
+    """
+    Accumulates how long checkouts from a connection pool wait for a connection.
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._lock = threading.Lock()
+
+    def observe_wait(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+class InstrumentedPoolMixin:
+    """
+    Records the time each checkout spends waiting for (or opening) a connection.
+    """
+    stats = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.stats is not None:
+                self.stats.observe_wait(time.perf_counter() - started)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    """
+    A QueuePool that records checkout wait times.
+    """
+
+def engine_options():
+    """
+    Build the connection pool keyword arguments for an engine from the pool settings.
+
+    Returns:
+        dict: Keyword arguments for ``create_engine``.
+    """
+    if DB_EXTERNAL_POOLER:
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+def instrument_pool(engine):
+    """
+    Start collecting checkout wait statistics for an engine's pool.
+
+    Args:
+        engine (Engine): The engine to instrument.
+
+    Returns:
+        Engine: The same engine.
+    """
+    engine.pool.stats = PoolStats()
+    return engine
+
+def pool_status(engine):
+    """
+    Report the utilization and checkout wait statistics of an engine's pool.
+
+    Args:
+        engine (Engine): The engine to report on.
+
+    Returns:
+        dict: The pool's current usage and accumulated wait statistics.
+    """
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"external_pooler": True}
+    capacity = DB_POOL_SIZE + max(DB_MAX_OVERFLOW, 0)
+    stats = pool.stats or PoolStats()
+    return {
+        "external_pooler": False,
+        "size": pool.size(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "utilization": round(pool.checkedout() / capacity, 4) if capacity else 0.0,
+        "checkouts": stats.checkouts,
+        "wait_seconds_total": round(stats.wait_seconds_total, 6),
+        "wait_seconds_avg": round(stats.wait_seconds_total / stats.checkouts, 6) if stats.checkouts else 0.0,
+        "wait_seconds_max": round(stats.wait_seconds_max, 6),
+    }
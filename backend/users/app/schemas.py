@@ -5,7 +5,7 @@ These schemas are used to validate incoming data and to define the structure of
 They provide a layer of type checking and data validation between the API and the database models.
 """
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from .models import UserType
 from datetime import datetime
 from typing import Optional
@@ -41,6 +41,24 @@ class User(UserBase):
     class Config:
         orm_mode = True
 
+# The most IDs a batch lookup may request.
+MAX_BATCH_GET_IDS = 5000
+
+class BatchGetRequest(BaseModel):
+    """
+    Pydantic model for looking up many records by ID at once.
+    """
+    ids: list[int] = Field(..., min_length=1, max_length=MAX_BATCH_GET_IDS)
+
+class UserBatch(BaseModel):
+    """
+    Pydantic model for the result of a batch user lookup.
+
+    ``items`` follows the order of the requested IDs; IDs without a user are listed in ``missing``.
+    """
+    items: list[User]
+    missing: list[int]
+
 class Token(BaseModel):
     """
     Pydantic model for token data.
@@ -58,4 +76,29 @@ class TokenData(BaseModel):
     This model is used for decoding and validating token data.
     """
     username: Optional[str] = None
-    user_type: Optional[str] = None
\ No newline at end of file
+    user_type: Optional[str] = None
+
+class CacheStats(BaseModel):
+    """
+    Pydantic model for cache hit and miss counters.
+    """
+    hits: int
+    misses: int
+
+class PoolStatus(BaseModel):
+    """
+    Pydantic model for the usage and checkout wait statistics of a database connection pool.
+
+    Only ``external_pooler`` is set when pooling is delegated to an external pooler.
+    """
+    external_pooler: bool
+    size: Optional[int] = None
+    max_overflow: Optional[int] = None
+    checked_out: Optional[int] = None
+    checked_in: Optional[int] = None
+    overflow: Optional[int] = None
+    utilization: Optional[float] = None
+    checkouts: Optional[int] = None
+    wait_seconds_total: Optional[float] = None
+    wait_seconds_avg: Optional[float] = None
+    wait_seconds_max: Optional[float] = None
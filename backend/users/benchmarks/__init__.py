@@ -0,0 +1,18 @@
+"""
+Benchmarks of the users service.
+
+Each module is a command that seeds a synthetic dataset and reports timings:
+
+    python -m benchmarks.login --workers 1 2 4
+    python -m benchmarks.serialization --rows 100 1000
+
+Benchmarks use the database named by ``DATABASE_URL``, like the service. When it is not set,
+they use a SQLite file in the working directory, so that they run from a checkout without setup.
+"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+os.environ.setdefault("DATABASE_URL", "sqlite:///./benchmark.db")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-of-at-least-32-bytes")
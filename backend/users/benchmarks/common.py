@@ -0,0 +1,68 @@
+"""
+Helpers shared by the benchmarks: timing reports and a local server.
+"""
+
+import multiprocessing
+import socket
+import statistics
+import time
+
+def percentile(samples, fraction):
+    """
+    Get a percentile of timing samples.
+
+    Args:
+        samples (list[float]): The samples.
+        fraction (float): The percentile, between 0 and 1.
+
+    Returns:
+        float: The sample at that percentile.
+    """
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def report(label, samples, elapsed=None):
+    """
+    Print the latency distribution of timed operations, and their throughput if the wall time is given.
+
+    Args:
+        label (str): What was timed.
+        samples (list[float]): The duration of each operation, in seconds.
+        elapsed (float): The wall time of the whole run, in seconds.
+    """
+    line = (
+        f"{label:<32} n={len(samples):<7} mean={statistics.fmean(samples) * 1000:8.3f}ms "
+        f"p50={percentile(samples, 0.5) * 1000:8.3f}ms p95={percentile(samples, 0.95) * 1000:8.3f}ms "
+        f"p99={percentile(samples, 0.99) * 1000:8.3f}ms"
+    )
+    if elapsed:
+        line += f" {len(samples) / elapsed:10.1f}/s"
+    print(line)
+
+def start_server(target, *args):
+    """
+    Run a server function in a fresh child process on a free local port and wait until it accepts connections.
+
+    The child is spawned rather than forked, so that it reads its configuration from the
+    environment when it imports the service.
+
+    Args:
+        target (callable): A module-level function called with the port and ``args``.
+        *args: More arguments for ``target``.
+
+    Returns:
+        tuple[multiprocessing.Process, str]: The server process and its base URL.
+    """
+    with socket.socket() as probe_socket:
+        probe_socket.bind(("127.0.0.1", 0))
+        port = probe_socket.getsockname()[1]
+    server = multiprocessing.get_context("spawn").Process(target=target, args=(port, *args))
+    server.start()
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return server, f"http://127.0.0.1:{port}"
+        except ConnectionRefusedError:
+            if not server.is_alive():
+                raise RuntimeError("The benchmark server failed to start")
+            time.sleep(0.05)
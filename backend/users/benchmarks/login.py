@@ -0,0 +1,153 @@
+"""
+Benchmark of login throughput with password checks on the event loop and on worker pools.
+
+A user is seeded, then the users service is started in a child process once per configuration
+and concurrent clients log in through ``POST /api/v1/token``. The configurations are the
+password hashing pool with each number of ``--workers``, and ``inline``, which checks passwords
+on the event loop as the service did before the pool existed. While the logins run, a probe
+keeps fetching ``/openapi.json``, which needs neither a password check nor a query: its latency
+shows how long every other request waits for the event loop. The database pool is sized to the
+number of clients so that it does not limit the logins; attempts that fail anyway, such as those
+rejected with 503 because the hashing pool was saturated, are counted by status.
+
+    python -m benchmarks.login --workers 1 2 4 --rounds 10 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import collections
+import os
+import sys
+import time
+import httpx
+from benchmarks.common import report, start_server
+
+USERNAME = "benchmark-login"
+PASSWORD = "correct horse battery staple"
+
+def seed_user(rounds):
+    """
+    Create the benchmark user, or reset its password hash to the given cost.
+
+    Args:
+        rounds (int): The bcrypt cost of the hash.
+    """
+    os.environ["BCRYPT_ROUNDS"] = str(rounds)
+    from app import auth, models
+    from app.database import SessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        user = db.query(models.User).filter(models.User.username == USERNAME).first()
+        if user is None:
+            user = models.User(username=USERNAME, email=f"{USERNAME}@example.com", user_type=models.UserType.member)
+            db.add(user)
+        user.hashed_password = auth.get_password_hash(PASSWORD)
+        db.commit()
+
+def serve(port, workers, executor, max_pending, rounds, connections):
+    os.environ["BCRYPT_ROUNDS"] = str(rounds)
+    os.environ["DB_POOL_SIZE"] = str(connections)
+    if workers:
+        os.environ["PASSWORD_HASH_WORKERS"] = str(workers)
+        os.environ["PASSWORD_HASH_EXECUTOR"] = executor
+        if max_pending:
+            os.environ["PASSWORD_HASH_MAX_PENDING"] = str(max_pending)
+    import uvicorn
+    import main
+    from app import auth
+
+    if not workers:
+        async def run_inline(func, *args):
+            return func(*args)
+
+        auth.password_hash_pool.run = run_inline
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+async def probe(client, stop, interval=0.05):
+    """
+    Fetch a page without password checks or queries at a steady pace until stopped.
+
+    Args:
+        client (httpx.AsyncClient): The client of the server.
+        stop (asyncio.Event): Set to end the probe.
+        interval (float): The pause between two calls, in seconds.
+
+    Returns:
+        list[float]: The latency of each call, in seconds.
+    """
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/openapi.json")
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+    return latencies
+
+async def log_in(base_url, logins, concurrency):
+    """
+    Log in from concurrent clients.
+
+    Args:
+        base_url (str): The URL of the server.
+        logins (int): The total number of login attempts.
+        concurrency (int): The number of attempts in flight at once.
+
+    Returns:
+        tuple[list[float], collections.Counter, float, list[float]]: The latency of each successful
+        login, the number of failed attempts by status code, the wall time in seconds and the
+        latencies of the probe.
+    """
+    remaining = iter(range(logins))
+    latencies = []
+    failed = collections.Counter()
+    form = {"username": USERNAME, "password": PASSWORD}
+
+    async def worker(client):
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await client.post("/api/v1/token", data=form)
+            if response.status_code != 200:
+                failed[response.status_code] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        await client.get("/openapi.json")
+        stop = asyncio.Event()
+        probing = asyncio.create_task(probe(client, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        return latencies, failed, elapsed, await probing
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare login throughput with password checks inline and on worker pools.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1], help="pool sizes to try")
+    parser.add_argument("--executor", choices=("thread", "process"), default="thread", help="kind of password hashing pool")
+    parser.add_argument("--max-pending", type=int, help="queue limit of the pool (default: the service default)")
+    parser.add_argument("--rounds", type=int, default=10, help="bcrypt cost of the seeded password")
+    parser.add_argument("--logins", type=int, default=200, help="login attempts per configuration")
+    parser.add_argument("--concurrency", type=int, default=32, help="login attempts in flight at once")
+    args = parser.parse_args(argv)
+
+    seed_user(args.rounds)
+    print(f"{os.cpu_count()} CPUs, bcrypt cost {args.rounds}, {args.concurrency} concurrent clients")
+    for workers in [0, *sorted(set(args.workers))]:
+        label = f"{workers} {args.executor} workers" if workers else "inline"
+        server, base_url = start_server(serve, workers, args.executor, args.max_pending, args.rounds, args.concurrency)
+        try:
+            latencies, failed, elapsed, probe_latencies = asyncio.run(log_in(base_url, args.logins, args.concurrency))
+        finally:
+            server.terminate()
+            server.join()
+        report(f"logins, {label}", latencies, elapsed)
+        for status, count in sorted(failed.items()):
+            print(f"  {count} attempts failed with {status}")
+        report("  probe during logins", probe_latencies)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,29 @@
 import json
-from fastapi import FastAPI, Depends, HTTPException, status
+from typing import Optional
+from fastapi import FastAPI, Depends, Header, HTTPException, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from app import models, schemas, auth
-from app.database import engine, get_db
+from app.database import engine, get_db, get_read_db, read_engines
+from app.lookup import fetch_by_ids
+from app.metrics import MetricsMiddleware, instrument_engine, is_scrape_authorized, register_pools, render_metrics
+from app.pool import pool_status
+from app.serialization import DEFAULT_RESPONSE_CLASS, FAST_JSON, rows_response
 
 
 models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+app = FastAPI(default_response_class=DEFAULT_RESPONSE_CLASS)
+
+# Every engine requests may use, keyed by the pool name reported in the statistics.
+request_engines = {"primary": engine}
+request_engines.update((f"replica-{index}", read_engine) for index, read_engine in enumerate(read_engines))
+
+for request_engine in request_engines.values():
+    instrument_engine(request_engine)
+register_pools(request_engines)
+app.add_middleware(MetricsMiddleware)
 
 # Define the allowed origins
 origins = [
@@ -74,17 +88,17 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         schemas.Token: The access and refresh tokens.
 
     Raises:
-        HTTPException: If the authentication fails.
+        HTTPException: If the authentication fails or the service is too busy to check the password.
     """
-    user = auth.authenticate_user(db, form_data.username, form_data.password)
+    user = await auth.authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = auth.create_access_token(data={"sub": user.username, "user_type": user.user_type.value})
-    refresh_token = auth.create_refresh_token(data={"sub": user.username, "user_type": user.user_type.value})
+    access_token = auth.create_access_token(data=auth.token_claims(user))
+    refresh_token = auth.create_refresh_token(data=auth.token_claims(user))
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 @app.post("/api/v1/token/refresh", response_model=schemas.Token)
@@ -127,8 +141,8 @@ async def refresh_token(refresh_token: str, db: Session = Depends(get_db)):
             detail="User not found or user type mismatch",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = auth.create_access_token(data={"sub": user.username, "user_type": user.user_type.value})
-    new_refresh_token = auth.create_refresh_token(data={"sub": user.username, "user_type": user.user_type.value})
+    access_token = auth.create_access_token(data=auth.token_claims(user))
+    new_refresh_token = auth.create_refresh_token(data=auth.token_claims(user))
     return {"access_token": access_token, "refresh_token": new_refresh_token, "token_type": "bearer"}
 
 @app.get("/api/v1/users/me", response_model=schemas.User)
@@ -144,11 +158,69 @@ async def read_users_me(current_user: schemas.User = Depends(auth.get_current_us
     """
     return current_user
 
+@app.get("/api/v1/cache/stats", response_model=schemas.CacheStats)
+def read_cache_stats(current_user: schemas.User = Depends(auth.get_current_admin)):
+    """
+    Get the hit and miss counters of the user cache.
+
+    Only administrators may read them.
+
+    Args:
+        current_user (schemas.User): The current authenticated administrator.
+
+    Returns:
+        schemas.CacheStats: The user cache counters for this process.
+    """
+    return auth.user_cache.stats()
+
+@app.get("/api/v1/db/stats", response_model=dict[str, schemas.PoolStatus])
+def read_db_stats(current_user: schemas.User = Depends(auth.get_current_admin)):
+    """
+    Get connection pool usage and checkout wait statistics.
+
+    Only administrators may read them.
+
+    Args:
+        current_user (schemas.User): The current authenticated administrator.
+
+    Returns:
+        dict[str, schemas.PoolStatus]: The statistics of each database pool, keyed by pool name.
+    """
+    return {name: pool_status(request_engine) for name, request_engine in request_engines.items()}
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics(authorization: Optional[str] = Header(default=None)):
+    """
+    Expose request, database and connection pool metrics in the Prometheus text format.
+
+    Scrapers authenticate with the ``METRICS_TOKEN`` bearer token rather than a user token.
+
+    Args:
+        authorization (Optional[str]): The Authorization header of the scrape.
+
+    Returns:
+        Response: The current metrics.
+
+    Raises:
+        HTTPException: If the scrape does not present the metrics token.
+    """
+    if not is_scrape_authorized(authorization):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    content, media_type = render_metrics()
+    return Response(content=content, media_type=media_type)
+
 @app.get("/api/v1/users/", response_model=list[schemas.User])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user)):
+def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db), current_user: schemas.User = Depends(auth.get_current_user)):
     """
     Get a list of users.
 
+    With ``FAST_JSON`` enabled, the list is rendered with orjson without validating the rows
+    against the response model.
+
     Args:
         skip (int): The number of users to skip.
         limit (int): The maximum number of users to return.
@@ -159,10 +231,28 @@ def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), c
         list[schemas.User]: A list of user entries.
     """
     users = db.query(models.User).offset(skip).limit(limit).all()
+    if FAST_JSON:
+        return rows_response(users, schemas.User)
     return users
 
+@app.post("/api/v1/users/batch-get", response_model=schemas.UserBatch)
+def batch_get_users(lookup: schemas.BatchGetRequest, db: Session = Depends(get_read_db), current_user: schemas.User = Depends(auth.get_current_user)):
+    """
+    Look up many users by ID with a single query.
+
+    Args:
+        lookup (schemas.BatchGetRequest): The IDs of the users to look up.
+        db (Session): The database session.
+        current_user (schemas.User): The current authenticated user.
+
+    Returns:
+        schemas.UserBatch: The users found, in the order requested, and the IDs without a user.
+    """
+    users, missing = fetch_by_ids(db, models.User, lookup.ids)
+    return {"items": users, "missing": missing}
+
 @app.get("/api/v1/users/{user_id}", response_model=schemas.User)
-def read_user(user_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(auth.get_current_user)):
+def read_user(user_id: int, db: Session = Depends(get_read_db), current_user: schemas.User = Depends(auth.get_current_user)):
     """
     Get a specific user by ID.
 
@@ -202,11 +292,13 @@ def update_user(user_id: int, user: schemas.UserCreate, db: Session = Depends(ge
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
+    previous_username = db_user.username
     for key, value in user.dict(exclude={"password"}).items():
         setattr(db_user, key, value)
     if user.password:
         db_user.hashed_password = auth.get_password_hash(user.password)
     db.commit()
+    auth.user_cache.invalidate(previous_username, db_user.username)
     db.refresh(db_user)
     return db_user
 
@@ -229,6 +321,8 @@ def delete_user(user_id: int, db: Session = Depends(get_db), current_user: schem
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
+    username = db_user.username
     db.delete(db_user)
     db.commit()
+    auth.user_cache.invalidate(username)
     return db_user
\ No newline at end of file